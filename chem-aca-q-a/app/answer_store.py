@@ -0,0 +1,235 @@
+"""SQLite store of the annotators' answers.
+
+Every answer is one row keyed by (session, question), written with a single upsert, so a
+click costs one small WAL append however many answers have been collected. It replaces
+the `human_answers_<session>.csv` file per visitor that was re-read and rewritten on
+every click. SQLite locking makes the store safe to share between worker processes.
+"""
+import csv
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'human_answers.sqlite')
+
+# Contribution of one answer row to the counters of its question
+_STAT_TERMS = {
+    'answered': '1',
+    'correct': '{row}.correct',
+    'selected_a': "{row}.selected = 'A'",
+    'selected_b': "{row}.selected = 'B'",
+    'selected_c': "{row}.selected = 'C'",
+    'selected_d': "{row}.selected = 'D'",
+    'quality_yes': "COALESCE({row}.quality = 'Yes', 0)",
+    'quality_no': "COALESCE({row}.quality = 'No', 0)",
+    'quality_unrated': "COALESCE({row}.quality NOT IN ('Yes', 'No'), 1)",
+}
+STAT_COLUMNS = tuple(_STAT_TERMS)
+
+def _stat_update(row: str, sign: str) -> str:
+    assignments = ", ".join(f"{column} = {column} {sign} ({term.format(row=row)})" for column, term in _STAT_TERMS.items())
+    # Not INSERT OR IGNORE: the conflict policy of the triggering upsert would override it
+    return f"""INSERT INTO question_stats (question_index) SELECT {row}.question_index
+            WHERE NOT EXISTS (SELECT 1 FROM question_stats WHERE question_index = {row}.question_index);
+        UPDATE question_stats SET {assignments} WHERE question_index = {row}.question_index;"""
+
+# Per-question counters kept current by triggers, so aggregates never rescan the answers
+STATS_SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS question_stats (
+        question_index INTEGER PRIMARY KEY,
+        {", ".join(f"{column} INTEGER NOT NULL DEFAULT 0" for column in STAT_COLUMNS)}
+    );
+    CREATE TRIGGER IF NOT EXISTS answers_stats_insert AFTER INSERT ON answers BEGIN
+        {_stat_update('NEW', '+')}
+    END;
+    CREATE TRIGGER IF NOT EXISTS answers_stats_update AFTER UPDATE ON answers BEGIN
+        {_stat_update('OLD', '-')}
+        {_stat_update('NEW', '+')}
+    END;
+    CREATE TRIGGER IF NOT EXISTS answers_stats_delete AFTER DELETE ON answers BEGIN
+        {_stat_update('OLD', '-')}
+    END;
+"""
+
+class AnswerStore:
+    """Answers of the annotation app, one row per session and question.
+
+    Answering the same question again in a session (e.g. after going back in the browser)
+    replaces the earlier answer. Connections are per thread, as in `DOIRegistry`.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        folder = os.path.dirname(db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS answers (
+                    session_id TEXT NOT NULL,
+                    question_index INTEGER NOT NULL,
+                    question_key TEXT NOT NULL,
+                    selected TEXT NOT NULL,
+                    correct INTEGER NOT NULL,
+                    quality TEXT,
+                    answered_at REAL NOT NULL,
+                    PRIMARY KEY (session_id, question_index)
+                );
+                CREATE INDEX IF NOT EXISTS answers_question ON answers (question_index);
+                CREATE TABLE IF NOT EXISTS assignments (
+                    session_id TEXT NOT NULL,
+                    question_index INTEGER NOT NULL,
+                    assigned_at REAL NOT NULL,
+                    PRIMARY KEY (session_id, question_index)
+                );
+                CREATE TABLE IF NOT EXISTS questions (
+                    question_index INTEGER PRIMARY KEY,
+                    question_key TEXT NOT NULL,
+                    doi TEXT
+                );
+            """)
+            created = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'question_stats'").fetchone() is None
+            conn.executescript(STATS_SCHEMA)
+            if created:
+                self.rebuild_stats(conn)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # With WAL, NORMAL only syncs at checkpoints: a commit is a single append to the log
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def record_answer(self, session_id: str, question_index: int, question_key: str, selected: str,
+                      correct: bool, quality: Optional[str] = None, answered_at: Optional[float] = None) -> None:
+        """Insert an answer, or replace the session's earlier answer to the same question."""
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT INTO answers (session_id, question_index, question_key, selected, correct, quality, answered_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (session_id, question_index) DO UPDATE SET
+                    selected = excluded.selected, correct = excluded.correct,
+                    quality = excluded.quality, answered_at = excluded.answered_at
+            """, (session_id, question_index, question_key, selected, int(bool(correct)), quality,
+                  answered_at if answered_at is not None else time.time()))
+
+    def record_answers(self, rows: Iterable[Tuple[str, int, str, str, bool, Optional[str], float]]) -> int:
+        """Upsert many (session_id, question_index, question_key, selected, correct, quality, answered_at)
+        rows in one transaction. Returns the number of rows written."""
+        rows = [(session_id, index, key, selected, int(bool(correct)), quality, answered_at)
+                for session_id, index, key, selected, correct, quality, answered_at in rows]
+        with self._connect() as conn:
+            conn.executemany("""
+                INSERT INTO answers (session_id, question_index, question_key, selected, correct, quality, answered_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (session_id, question_index) DO UPDATE SET
+                    selected = excluded.selected, correct = excluded.correct,
+                    quality = excluded.quality, answered_at = excluded.answered_at
+            """, rows)
+        return len(rows)
+
+    def export_csv(self, path: str) -> int:
+        """Write every answer to one CSV, ordered by session and time. Returns the number of rows."""
+        cursor = self._connect().execute("SELECT * FROM answers ORDER BY session_id, answered_at")
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([column[0] for column in cursor.description])
+            count = 0
+            for row in cursor:
+                writer.writerow(row)
+                count += 1
+        return count
+
+    def session_score(self, session_id: str) -> Tuple[int, int]:
+        """(correct, answered) of a session."""
+        row = self._connect().execute(
+            "SELECT COALESCE(SUM(correct), 0), COUNT(*) FROM answers WHERE session_id = ?", (session_id,)).fetchone()
+        return int(row[0]), int(row[1])
+
+    def record_assignments(self, session_id: str, question_indices: List[int]) -> None:
+        """Record the questions handed to a session, so that every worker can balance coverage."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany("INSERT OR IGNORE INTO assignments (session_id, question_index, assigned_at) VALUES (?, ?, ?)",
+                             [(session_id, index, now) for index in question_indices])
+
+    def assignment_counts(self) -> Dict[int, int]:
+        """Number of sessions that were given or answered each question."""
+        rows = self._connect().execute("""
+            SELECT question_index, COUNT(*) FROM (
+                SELECT session_id, question_index FROM assignments
+                UNION SELECT session_id, question_index FROM answers
+            ) GROUP BY question_index
+        """)
+        return dict(rows.fetchall())
+
+    def rebuild_stats(self, conn: Optional[sqlite3.Connection] = None) -> None:
+        """Recompute the per-question counters from the answers (only needed for stores created before them)."""
+        conn = conn or self._connect()
+        with conn:
+            conn.execute("DELETE FROM question_stats")
+            conn.execute(f"""
+                INSERT INTO question_stats (question_index, {", ".join(STAT_COLUMNS)})
+                SELECT question_index, {", ".join(f"SUM({term.format(row='answers')})" for term in _STAT_TERMS.values())}
+                FROM answers GROUP BY question_index
+            """)
+
+    def register_questions(self, questions: Iterable[Tuple[int, str, str]]) -> None:
+        """Store (question_index, question_key, doi) of the served dataset, for per-DOI aggregates."""
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO questions (question_index, question_key, doi) VALUES (?, ?, ?)",
+                             list(questions))
+
+    def _rows(self, sql: str, params: Sequence = ()) -> List[Dict]:
+        cursor = self._connect().execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def overall_stats(self) -> Dict:
+        """Totals of all counters, plus the number of sessions that answered anything."""
+        totals = self._rows(f"""SELECT COUNT(*) AS questions, {", ".join(f"COALESCE(SUM({c}), 0) AS {c}" for c in STAT_COLUMNS)}
+                                FROM question_stats WHERE answered > 0""")[0]
+        totals['sessions'] = self._connect().execute("SELECT COUNT(DISTINCT session_id) FROM answers").fetchone()[0]
+        return totals
+
+    def question_stats(self, question_index: Optional[int] = None, limit: int = 100, offset: int = 0) -> List[Dict]:
+        """Counters of one question, or of the most answered ones."""
+        select = f"""SELECT s.question_index, q.question_key, q.doi, {", ".join(f"s.{c}" for c in STAT_COLUMNS)}
+                     FROM question_stats s LEFT JOIN questions q USING (question_index)"""
+        if question_index is not None:
+            return self._rows(select + " WHERE s.question_index = ?", (question_index,))
+        return self._rows(select + " WHERE s.answered > 0 ORDER BY s.answered DESC, s.question_index LIMIT ? OFFSET ?",
+                          (limit, offset))
+
+    def doi_stats(self, doi: Optional[str] = None, limit: int = 100, offset: int = 0) -> List[Dict]:
+        """Counters summed over the questions of one DOI, or of the most answered DOIs."""
+        select = f"""SELECT q.doi, COUNT(*) AS questions, {", ".join(f"SUM(s.{c}) AS {c}" for c in STAT_COLUMNS)}
+                     FROM question_stats s JOIN questions q USING (question_index) WHERE s.answered > 0"""
+        if doi is not None:
+            return self._rows(select + " AND q.doi = ? GROUP BY q.doi", (doi,))
+        return self._rows(select + " GROUP BY q.doi ORDER BY answered DESC, q.doi LIMIT ? OFFSET ?", (limit, offset))
+
+    def assignments_since(self, rowid: int) -> List[Tuple[int, str, int]]:
+        """(rowid, session_id, question_index) of the assignments recorded after `rowid`, in order."""
+        return self._connect().execute(
+            "SELECT rowid, session_id, question_index FROM assignments WHERE rowid > ? ORDER BY rowid", (rowid,)).fetchall()
+
+    def last_assignment(self) -> int:
+        return self._connect().execute("SELECT COALESCE(MAX(rowid), 0) FROM assignments").fetchone()[0]
+
+    def annotation_counts(self) -> Dict[int, int]:
+        """Number of sessions that answered each question."""
+        rows = self._connect().execute("SELECT question_index, COUNT(*) FROM answers GROUP BY question_index")
+        return dict(rows.fetchall())
+
+    def session_answers(self, session_id: str) -> List[Dict]:
+        cursor = self._connect().execute(
+            "SELECT * FROM answers WHERE session_id = ? ORDER BY answered_at", (session_id,))
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -0,0 +1,66 @@
+"""Live JSON aggregates of the annotations, read from the counters the answer store keeps
+current on every answer.
+
+    GET /api/stats                  overall human accuracy and quality votes
+    GET /api/questions?limit&offset most answered questions
+    GET /api/questions/<index>      one question, with the benchmarked models' answers
+    GET /api/dois?limit&offset      most answered DOIs
+    GET /api/dois/<doi>             one DOI
+    GET /api/models                 human-vs-model accuracy and agreement
+"""
+from flask import Blueprint, abort, current_app, jsonify, request
+
+from .model_answers import human_majority
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+def _state():
+    return current_app.extensions['annotation']
+
+def _page():
+    return min(request.args.get('limit', 100, type=int), 1000), request.args.get('offset', 0, type=int)
+
+def _with_rates(stats):
+    stats['accuracy'] = stats['correct'] / stats['answered'] if stats['answered'] else None
+    rated = stats['quality_yes'] + stats['quality_no']
+    stats['makes_sense'] = stats['quality_yes'] / rated if rated else None
+    return stats
+
+@api.route('/stats')
+def overall():
+    return jsonify(_with_rates(_state().store.overall_stats()))
+
+@api.route('/questions')
+def questions():
+    limit, offset = _page()
+    return jsonify([_with_rates(stats) for stats in _state().store.question_stats(limit=limit, offset=offset)])
+
+@api.route('/questions/<int:question_index>')
+def question(question_index):
+    state = _state()
+    if not 0 <= question_index < len(state.index):
+        abort(404)
+    entry = state.index[question_index]
+    rows = state.store.question_stats(question_index)
+    stats = _with_rates(rows[0]) if rows else {'question_index': question_index, 'answered': 0}
+    stats.update(question_key=entry.key, doi=entry.doi, answer=entry.answer,
+                 human_majority=human_majority(stats) if rows else None,
+                 models=state.model_answers.for_question(entry.key))
+    return jsonify(stats)
+
+@api.route('/dois')
+def dois():
+    limit, offset = _page()
+    return jsonify([_with_rates(stats) for stats in _state().store.doi_stats(limit=limit, offset=offset)])
+
+@api.route('/dois/<path:doi>')
+def doi(doi):
+    rows = _state().store.doi_stats(doi)
+    if not rows:
+        abort(404)
+    return jsonify(_with_rates(rows[0]))
+
+@api.route('/models')
+def models():
+    state = _state()
+    return jsonify(state.model_answers.agreement(state.store.question_stats(limit=-1)))
@@ -1,88 +1,192 @@
-from flask import Flask, render_template, request, session, redirect, url_for
-import pandas as pd
+"""Annotation app: visitors answer ten questions and rate whether each makes sense.
+
+Development server (from chem-aca-q-a/):
+    python -m app.app
+
+Production, with several worker processes:
+    export CHEM_QA_SECRET_KEY=$(python -c "import secrets; print(secrets.token_hex(32))")
+    gunicorn -w 4 -b 0.0.0.0:8000 'app.wsgi:app'
+    # or: uvicorn app.wsgi:app --interface wsgi --workers 4
+
+Workers share everything through the session cookie (signed with the shared secret) and
+the SQLite answer store, so any worker can serve any request.
+
+Request latencies per endpoint are exported in the Prometheus text format at /metrics.
+Each worker reports its own requests.
+"""
+from flask import Blueprint, Flask, Response, current_app, g, render_template, request, session, redirect, url_for
 import os
 import json
-import random
+import secrets
+import threading
+import time
 import uuid
 
-app = Flask(__name__)
-app.secret_key = str(os.urandom(16).hex())
+from scripts.tracing import registry
+
+from .answer_store import AnswerStore
+from .api import api
+from .model_answers import ModelAnswers
+from .question_index import QuestionIndex
+
+DATASET_PATH = "data/chem_mqa_dataset.json"
+SECRET_KEY_PATH = "data/.flask_secret"
+QUESTIONS_PER_SESSION = 10
+
+bp = Blueprint('annotation', __name__)
+
+def load_secret_key(path=SECRET_KEY_PATH):
+    """The session signing key shared by all workers.
+
+    Taken from CHEM_QA_SECRET_KEY if set. Otherwise the first worker to start generates
+    one into `path` (created exclusively, so concurrent workers cannot race) and the
+    others read it.
+    """
+    key = os.environ.get('CHEM_QA_SECRET_KEY')
+    if key:
+        return key
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        for _ in range(50):
+            with open(path, 'r') as f:
+                key = f.read().strip()
+            if key:
+                return key
+            time.sleep(0.1)  # Another worker is still writing it
+        raise RuntimeError(f"Secret key file {path} is empty")
+    key = secrets.token_hex(32)
+    with os.fdopen(fd, 'w') as f:
+        f.write(key)
+    return key
+
+class AnnotationState:
+    """Per-worker state: the question index and the shared answer store.
+
+    Each worker balances coverage with its own index. At every session start it first
+    applies the assignments the other workers recorded since its last look, so the
+    workers draw as if they shared one index.
+    """
+
+    def __init__(self, questions, store, model_answers):
+        self.store = store
+        self.model_answers = model_answers
+        self.last_rowid = store.last_assignment()
+        # Keys resolved and options paired once; sessions draw the least-annotated questions first
+        self.index = QuestionIndex(questions, store.assignment_counts())
+        store.register_questions((i, entry.key, entry.doi) for i, entry in enumerate(self.index.questions))
+        self.own_sessions = set()
+        self.lock = threading.Lock()
 
-with open("data/chem_mqa_dataset.json", "r") as f:
-    questions = json.load(f)
+    def pull_assignments(self):
+        """Count the assignments other workers recorded since the last pull."""
+        with self.lock:
+            seen = set()
+            for rowid, session_id, question_index in self.store.assignments_since(self.last_rowid):
+                self.last_rowid = rowid
+                if session_id in self.own_sessions:
+                    seen.add(session_id)  # Already counted when this worker drew it
+                else:
+                    self.index.assign(question_index)
+            # A session's assignments are committed together, so none of them is pulled again
+            self.own_sessions -= seen
 
-def initialize_dataframe(path):
-    pd.DataFrame(columns=['Question', 'Selected', 'Correct', 'QuestionKey', 'QuestionIndex', 'QuestionQuality']).to_csv(path, index=False)
+    def start_session(self, session_id):
+        """Draw the questions of a new session and record the assignment for the other workers."""
+        self.pull_assignments()
+        question_indices = self.index.sample(QUESTIONS_PER_SESSION)
+        with self.lock:
+            self.own_sessions.add(session_id)
+        self.store.record_assignments(session_id, question_indices)
+        return question_indices
 
-@app.route('/')
+def state():
+    return current_app.extensions['annotation']
+
+def start_timer():
+    g.request_start = time.perf_counter_ns()
+
+def record_request(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        registry.observe('http_request', start, time.perf_counter_ns() - start,
+                         {'endpoint': request.endpoint or 'unmatched', 'method': request.method,
+                          'status': response.status_code})
+    return response
+
+def metrics():
+    return Response(registry.prometheus_text(), mimetype='text/plain; version=0.0.4')
+
+def create_app(dataset_path=None, db_path=None, secret_key=None, results_db_path=None):
+    """Build the annotation app.
+
+    Args:
+        dataset_path (str): Questions JSON (default: CHEM_QA_DATASET or data/chem_mqa_dataset.json).
+        db_path (str): Answer store (default: CHEM_QA_ANSWER_DB or data/human_answers.sqlite).
+        secret_key (str): Session signing key (default: see `load_secret_key`).
+        results_db_path (str): Model results store the /api endpoints compare with
+            (default: CHEM_QA_RESULTS_DB or results/results.sqlite).
+    """
+    app = Flask(__name__, static_folder='templates/static')
+    app.secret_key = secret_key or load_secret_key()
+
+    with open(dataset_path or os.environ.get('CHEM_QA_DATASET', DATASET_PATH), "r") as f:
+        questions = json.load(f)
+    db_path = db_path or os.environ.get('CHEM_QA_ANSWER_DB')
+    store = AnswerStore(db_path) if db_path else AnswerStore()
+    results_db_path = results_db_path or os.environ.get('CHEM_QA_RESULTS_DB')
+    model_answers = ModelAnswers(results_db_path) if results_db_path else ModelAnswers()
+    app.extensions['annotation'] = AnnotationState(questions, store, model_answers)
+    app.register_blueprint(bp)
+    app.register_blueprint(api)
+    app.before_request(start_timer)
+    app.after_request(record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics)
+    return app
+
+@bp.route('/')
 def home():
     session.clear()
     session['user_id'] = str(uuid.uuid4())  # Generate a unique session ID for each user
-    csv_path = f'data/human_answers_{session["user_id"]}.csv'
-    initialize_dataframe(csv_path)  # Initialize a new CSV file for this user
-    
-    random_indices = random.sample(range(len(questions)), 10)
-    session['question_indices'] = random_indices
+
+    session['question_indices'] = state().start_session(session['user_id'])
     session['current_index'] = 0
     return render_template('index.html')
 
-@app.route('/question', methods=['GET', 'POST'])
+@bp.route('/question', methods=['GET', 'POST'])
 def question():
-    csv_path = f'data/human_answers_{session["user_id"]}.csv'
-    
-    def find_question_key(data):
-        for key in data:
-            if key.startswith('Question'):
-                return key
-        return None
-
     question_indices = session.get('question_indices', [])
     current_index = session.get('current_index', 0)
+    if current_index >= len(question_indices):
+        return redirect(url_for('.home'))
     question_index = question_indices[current_index]
-    question_key = find_question_key(questions[question_index])
+    entry = state().index[question_index]
 
     if request.method == 'POST':
         selected_option = request.form.get('option')
         question_quality = request.form.get('question_quality', 'Not Answered')
-        
+
         if selected_option:
-            df = pd.read_csv(csv_path)
-            update_dict = {
-                'Selected': selected_option,
-                'Correct': selected_option == questions[question_index][question_key]['Answer'],
-                'QuestionQuality': question_quality
-            }
-
-            if question_index in df['QuestionIndex'].values:
-                df.loc[df['QuestionIndex'] == question_index, list(update_dict.keys())] = list(update_dict.values())
-            else:
-                new_row = pd.DataFrame([{
-                    'Question': question_key,
-                    'Selected': selected_option,
-                    'Correct': selected_option == questions[question_index][question_key]['Answer'],
-                    'QuestionQuality': question_quality,
-                    'QuestionIndex': question_index
-                }])
-                df = pd.concat([df, new_row], ignore_index=True)
-            df.to_csv(csv_path, index=False)
+            state().store.record_answer(session['user_id'], question_index, entry.key, selected_option,
+                                        selected_option == entry.answer, question_quality)
 
             if current_index + 1 < len(question_indices):
                 session['current_index'] += 1
-                return redirect(url_for('question'))
+                return redirect(url_for('.question'))
             else:
-                return redirect(url_for('finish'))
+                return redirect(url_for('.finish'))
         else:
-            return render_template('question.html', question=questions[question_index][question_key],
+            return render_template('question.html', question=entry.question, options=entry.options,
                                    question_index=question_index, error="Please select an option and provide feedback on the question.")
 
-    return render_template('question.html', question=questions[question_index][question_key], question_index=question_index)
+    return render_template('question.html', question=entry.question, options=entry.options, question_index=question_index)
 
-@app.route('/finish', methods=['GET'])
+@bp.route('/finish', methods=['GET'])
 def finish():
-    csv_path = f'data/human_answers_{session["user_id"]}.csv'
-    df = pd.read_csv(csv_path)
-    correct_count = df['Correct'].sum()
+    if 'user_id' not in session:
+        return redirect(url_for('.home'))
+    correct_count, _ = state().store.session_score(session['user_id'])
     return render_template('finish.html', score=correct_count)
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,81 @@
+"""Merge the per-visitor `human_answers_<session>.csv` files of the old app into the answer store.
+
+    python -m app.consolidate --data data --export data/human_answers.csv
+
+Files are parsed in parallel and written in one transaction. A question answered more
+than once in a session keeps its last answer. Consolidating the same files again
+changes nothing, so the command can run while old files are still being collected.
+With `--export`, all annotations are also written to one CSV for analysis tools.
+"""
+import argparse
+import csv
+import glob
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from .answer_store import DEFAULT_DB_PATH, AnswerStore
+
+SESSION_FILE = re.compile(r'human_answers_(?P<session>[0-9a-fA-F-]+)\.csv$')
+
+AnswerRow = Tuple[str, int, str, str, bool, Optional[str], float]
+
+def read_session_file(path: str) -> Tuple[str, List[AnswerRow]]:
+    """The answers of one session file, one per question (the last one if re-submitted).
+
+    The old files have no timestamps: answers get the file's modification time, spaced by a
+    millisecond per row so that they keep their order.
+    """
+    match = SESSION_FILE.search(os.path.basename(path))
+    session_id = match.group('session') if match else os.path.splitext(os.path.basename(path))[0]
+    modified = os.path.getmtime(path)
+    answers = {}
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    for position, row in enumerate(rows):
+        try:
+            question_index = int(float(row['QuestionIndex']))
+        except (KeyError, TypeError, ValueError):
+            continue
+        selected = (row.get('Selected') or '').strip()
+        if not selected:
+            continue
+        question_key = row.get('QuestionKey') or row.get('Question') or f"Question_{question_index + 1}"
+        correct = str(row.get('Correct', '')).strip().lower() in ('true', '1')
+        answered_at = modified - (len(rows) - position) * 1e-3
+        answers[question_index] = (session_id, question_index, question_key, selected, correct,
+                                   row.get('QuestionQuality') or None, answered_at)
+    return path, list(answers.values())
+
+def consolidate(paths: List[str], store: AnswerStore, workers: Optional[int] = None) -> Tuple[int, int]:
+    """Read the session files in parallel and upsert their answers.
+
+    Returns:
+        Tuple[int, int]: Number of answers written and of files that held none.
+    """
+    rows: List[AnswerRow] = []
+    empty = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path, answers in pool.map(read_session_file, paths, chunksize=max(1, len(paths) // 64)):
+            rows.extend(answers)
+            empty += not answers
+    return store.record_answers(rows), empty
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge human_answers_*.csv files into the answer store.")
+    parser.add_argument('--data', type=str, default='data', help='Folder of the human_answers_*.csv files')
+    parser.add_argument('--db', type=str, default=DEFAULT_DB_PATH, help='Answer store')
+    parser.add_argument('--workers', type=int, default=None, help='Parsing processes (default: one per CPU)')
+    parser.add_argument('--export', type=str, help='Also write all annotations to this CSV')
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.data, 'human_answers_*.csv')))
+    store = AnswerStore(args.db)
+    written, empty = consolidate(paths, store, args.workers)
+    print(f"Consolidated {written} answers from {len(paths)} files ({empty} without answers) into {args.db}")
+    if args.export:
+        print(f"Exported {store.export_csv(args.export)} answers to {args.export}")
+
+if __name__ == '__main__':
+    main()
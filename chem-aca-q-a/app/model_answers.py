@@ -0,0 +1,90 @@
+"""Benchmarked models' multiple-choice answers, for comparison with the annotators.
+
+The answers are read once from the results store (`python -m scripts.results_store
+ingest`) and kept in memory by question key. One read-only connection stays open, and
+the answers are read again only when SQLite's `data_version` says another connection
+has committed to the store, so the live endpoints never rescan it per request.
+"""
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from scripts.results_store import DEFAULT_DB_PATH
+
+OPTIONS = ('A', 'B', 'C', 'D')
+
+def human_majority(stats: Dict) -> Optional[str]:
+    """Most selected option of a question's counters (None if nobody answered it)."""
+    counts = [stats[f"selected_{option.lower()}"] for option in OPTIONS]
+    if not any(counts):
+        return None
+    return OPTIONS[counts.index(max(counts))]
+
+class ModelAnswers:
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._inode: Optional[int] = None
+        self._version = None
+        self._answers: Dict[str, Dict[str, Tuple[str, Optional[bool]]]] = {}
+
+    def _store_version(self) -> Optional[Tuple[int, int]]:
+        """(file inode, data_version) of the store, or None if there is none yet. Called
+        with the lock held; the connection is shared by the app's threads under it."""
+        try:
+            inode = os.stat(self.db_path).st_ino
+        except FileNotFoundError:
+            return None
+        if self._conn is None or inode != self._inode:
+            # A store rebuilt from scratch is a new file; the old connection would not see it
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True,
+                                         check_same_thread=False, timeout=30)
+            self._inode = inode
+        return inode, self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def answers(self) -> Dict[str, Dict[str, Tuple[str, Optional[bool]]]]:
+        """{question key: {model: (answer, correct)}} of the `mcq` task."""
+        with self._lock:
+            version = self._store_version()
+            if version != self._version:
+                answers: Dict[str, Dict[str, Tuple[str, Optional[bool]]]] = {}
+                if version is not None:
+                    columns = {row[1] for row in self._conn.execute("PRAGMA table_info(results)")}
+                    # Quantized runs are not the model's published answers; stores from before
+                    # runs had a precision hold none
+                    full_precision = " AND COALESCE(precision, 'fp32') = 'fp32'" if 'precision' in columns else ""
+                    rows = self._conn.execute(
+                        "SELECT model, question_id, answer, correct FROM results WHERE task = 'mcq'" + full_precision)
+                    for model, question_id, answer, correct in rows:
+                        answers.setdefault(question_id, {})[model] = (answer, None if correct is None else bool(correct))
+                self._answers, self._version = answers, version
+            return self._answers
+
+    def for_question(self, question_key: str) -> List[Dict]:
+        return [{'model': model, 'answer': answer, 'correct': correct}
+                for model, (answer, correct) in sorted(self.answers().get(question_key, {}).items())]
+
+    def agreement(self, question_stats: Iterable[Dict]) -> List[Dict]:
+        """Per model, on the questions both it and the annotators answered: its accuracy, the
+        annotators' accuracy, and how often it picked the annotators' majority answer."""
+        answers = self.answers()
+        totals: Dict[str, Dict] = {}
+        for stats in question_stats:
+            majority = human_majority(stats)
+            for model, (answer, correct) in answers.get(stats['question_key'], {}).items():
+                total = totals.setdefault(model, {'model': model, 'questions': 0, 'model_correct': 0,
+                                                  'human_answers': 0, 'human_correct': 0, 'agreements': 0})
+                total['questions'] += 1
+                total['model_correct'] += bool(correct)
+                total['human_answers'] += stats['answered']
+                total['human_correct'] += stats['correct']
+                total['agreements'] += answer == majority
+        for total in totals.values():
+            total['model_accuracy'] = total['model_correct'] / total['questions']
+            total['human_accuracy'] = total['human_correct'] / max(total['human_answers'], 1)
+            total['agreement'] = total['agreements'] / total['questions']
+        return sorted(totals.values(), key=lambda total: total['model_accuracy'], reverse=True)
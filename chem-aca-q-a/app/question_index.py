@@ -0,0 +1,122 @@
+"""Startup-time index of the questions served by the annotation app.
+
+Each dataset entry (`{"Question_N": {...}, "doi": ...}`) is resolved once into an
+`IndexedQuestion` tuple with the key already found and the options already paired with
+their letters. Request handlers then index a list instead of scanning entry keys.
+
+Sessions draw the least-assigned questions first and, among equally covered ones,
+prefer DOIs the session does not have yet. Questions are kept in buckets by how often
+they have been handed out. Drawing from the lowest bucket and moving a question up one
+bucket costs O(1) per question, so coverage of the dataset grows evenly instead of by
+chance.
+"""
+import random
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+OPTIONS = ('A', 'B', 'C', 'D')
+
+class IndexedQuestion(NamedTuple):
+    key: str
+    doi: str
+    question: str
+    options: Tuple[Tuple[str, str], ...]
+    answer: str
+
+def index_entry(entry: Dict) -> IndexedQuestion:
+    key = next(key for key in entry if key.startswith('Question'))
+    details = entry[key]
+    return IndexedQuestion(key, entry.get('doi', ''), details['Question'],
+                           tuple((option, details[option]) for option in OPTIONS), details['Answer'])
+
+class QuestionIndex:
+    """Questions by position, with least-assigned-first sampling.
+
+    Args:
+        entries (Sequence[Dict]): The dataset entries.
+        counts (Optional[Dict[int, int]]): Earlier assignments per question index, e.g. from
+            `AnswerStore.assignment_counts`.
+        seed (Optional[int]): Seed of the tie-breaking between equally covered questions.
+    """
+
+    def __init__(self, entries: Sequence[Dict], counts: Optional[Dict[int, int]] = None, seed: Optional[int] = None):
+        self.questions: List[IndexedQuestion] = [index_entry(entry) for entry in entries]
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._levels: List[List[int]] = []
+        self._level = [0] * len(self.questions)
+        self._position = [0] * len(self.questions)
+        counts = counts or {}
+        for index in range(len(self.questions)):
+            self._insert(index, counts.get(index, 0))
+        self._lowest = min(self._level, default=0)
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def __getitem__(self, index: int) -> IndexedQuestion:
+        return self.questions[index]
+
+    def _insert(self, index: int, level: int) -> None:
+        while len(self._levels) <= level:
+            self._levels.append([])
+        bucket = self._levels[level]
+        self._level[index] = level
+        self._position[index] = len(bucket)
+        bucket.append(index)
+
+    def _remove(self, index: int) -> None:
+        """Swap-remove `index` from its bucket."""
+        bucket = self._levels[self._level[index]]
+        last = bucket.pop()
+        if last != index:
+            bucket[self._position[index]] = last
+            self._position[last] = self._position[index]
+
+    def assign(self, index: int) -> None:
+        """Count one more assignment of question `index`."""
+        with self._lock:
+            self._assign(index)
+
+    def _assign(self, index: int) -> None:
+        self._remove(index)
+        self._insert(index, self._level[index] + 1)
+        while not self._levels[self._lowest]:
+            self._lowest += 1
+
+    def sample(self, k: int) -> List[int]:
+        """Draw `k` distinct questions from the least-assigned ones and count them as assigned.
+
+        Within a coverage level the draw is random, and questions from DOIs not drawn yet
+        come first.
+        """
+        with self._lock:
+            chosen: List[int] = []
+            dois = set()
+            for bucket in self._levels[self._lowest:]:
+                if len(chosen) == k:
+                    break
+                candidates = self._candidates(bucket, k - len(chosen))
+                for distinct_dois in (True, False):
+                    for index in candidates:
+                        if len(chosen) == k:
+                            break
+                        doi = self.questions[index].doi
+                        if index in chosen or (distinct_dois and doi in dois):
+                            continue
+                        chosen.append(index)
+                        dois.add(doi)
+            for index in chosen:
+                self._assign(index)
+            return chosen
+
+    def _candidates(self, bucket: List[int], needed: int) -> List[int]:
+        """Random members of a bucket: all of a small one, a few times `needed` of a large one."""
+        if len(bucket) <= 4 * needed:
+            return self._rng.sample(bucket, len(bucket))
+        return [bucket[position] for position in self._rng.sample(range(len(bucket)), 4 * needed)]
+
+    def coverage(self) -> Dict[int, int]:
+        """Number of questions per assignment count."""
+        with self._lock:
+            return {level: len(bucket) for level, bucket in enumerate(self._levels) if bucket}
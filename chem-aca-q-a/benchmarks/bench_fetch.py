@@ -0,0 +1,72 @@
+"""Pages/sec and PDFs/sec of the fetch layer against a local fixture site.
+
+`FixtureSiteServer` serves the saved HTML pages and slowly streamed PDFs on localhost, so
+this checks the `Fetcher` without touching a publisher: it exits 1 if more responses were
+in progress on the host than `--max-per-host` allows (streamed PDF bodies included), or if
+the pooled session opened a connection per request instead of reusing them.
+
+Run from chem-aca-q-a/:
+    python -m benchmarks.bench_fetch --pdfs 40 --threads 16 --max-per-host 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.stubs import FixtureSiteServer
+from scripts.fetch import Fetcher
+from scripts.pdf_utils import stream_pdf
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "html")
+
+def bench_pages(fetcher, base_url, iterations, threads):
+    urls = [f"{base_url}/html/{name}" for _ in range(iterations) for name in sorted(os.listdir(FIXTURE_DIR))]
+    start = time.perf_counter()
+    responses = fetcher.map(fetcher.get, urls, max_workers=threads)
+    elapsed = time.perf_counter() - start
+    failed = sum(response.status_code != 200 for response in responses)
+    return len(urls) / elapsed, failed
+
+def bench_pdfs(fetcher, base_url, count, threads, out_dir):
+    def download(i):
+        return stream_pdf(f"{base_url}/pdf/{i}.pdf", os.path.join(out_dir, f"{i}.pdf"), fetcher)
+
+    start = time.perf_counter()
+    saved = fetcher.map(download, range(count), max_workers=threads)
+    elapsed = time.perf_counter() - start
+    return count / elapsed, count - sum(saved)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pooled fetcher against a local fixture site.")
+    parser.add_argument('--iterations', type=int, default=10, help='Passes over the saved HTML pages')
+    parser.add_argument('--pdfs', type=int, default=40, help='PDFs to download')
+    parser.add_argument('--threads', type=int, default=16, help='Threads issuing requests')
+    parser.add_argument('--max-per-host', type=int, default=4, help="Fetcher's per-host concurrency cap")
+    args = parser.parse_args()
+
+    ok = True
+    with FixtureSiteServer(FIXTURE_DIR) as site, tempfile.TemporaryDirectory() as out_dir:
+        fetcher = Fetcher(max_per_host=args.max_per_host, retries=0)
+        for label, run in (
+            ('pages', lambda: bench_pages(fetcher, site.base_url, args.iterations, args.threads)),
+            ('pdfs', lambda: bench_pdfs(fetcher, site.base_url, args.pdfs, args.threads, out_dir)),
+        ):
+            site.reset()
+            rate, failed = run()
+            print(f"{label:6s} {rate:8.1f}/sec  {site.requests} request(s) over {site.connections} connection(s), "
+                  f"peak {site.peak_active} in progress, {failed} failed")
+            if site.peak_active > args.max_per_host:
+                print(f"  FAIL: {site.peak_active} responses in progress at once, the cap is {args.max_per_host}")
+                ok = False
+            if site.connections > args.max_per_host:
+                print(f"  FAIL: {site.connections} connections opened, expected at most {args.max_per_host}")
+                ok = False
+            if failed:
+                print(f"  FAIL: {failed} {label} not fetched")
+                ok = False
+        fetcher.close()
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Pages/sec of the scraper parse step on saved HTML fixtures.
+
+Run from chem-aca-q-a/:
+    python -m benchmarks.bench_parse --iterations 50 --workers 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from scripts.scraper_specs import SCRAPERS, parse_article, parse_listing
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "html")
+
+def load_fixtures():
+    """(spec name, parse function, html, url) for every saved listing/article page."""
+    fixtures = []
+    for file_name in sorted(os.listdir(FIXTURE_DIR)):
+        name, kind = os.path.splitext(file_name)[0].rsplit('_', 1)
+        if name not in SCRAPERS:
+            continue
+        with open(os.path.join(FIXTURE_DIR, file_name), 'rb') as f:
+            html = f.read()
+        fn = parse_listing if kind == 'listing' else parse_article
+        fixtures.append((name, fn, html, f"https://{name}.example.org/listing"))
+    return fixtures
+
+def bench_inline(fixtures, iterations, parser):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for name, fn, html, url in fixtures:
+            fn(name, html, url, parser)
+    return iterations * len(fixtures) / (time.perf_counter() - start)
+
+def bench_pool(fixtures, iterations, parser, workers):
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Warm the workers up so that process start-up is not counted
+        list(pool.map(abs, range(workers)))
+        start = time.perf_counter()
+        futures = [pool.submit(fn, name, html, url, parser) for _ in range(iterations) for name, fn, html, url in fixtures]
+        for future in futures:
+            future.result()
+    return len(futures) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scraper HTML parsing on saved fixtures.")
+    parser.add_argument('--iterations', type=int, default=20, help='Passes over the fixture set')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processes in the parse pool')
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    for name, fn, html, url in fixtures:
+        result = fn(name, html, url)
+        found = len(result[0]) if fn is parse_listing else int(result is not None)
+        print(f"{name:10s} {fn.__name__:14s} {len(html) / 1024:6.1f} KiB  {found} link(s)")
+
+    print("-" * 50)
+    for backend in ('html.parser', 'lxml'):
+        print(f"{backend:12s} inline:            {bench_inline(fixtures, args.iterations, backend):8.1f} pages/sec")
+    print(f"{'lxml':12s} pool ({args.workers} workers): {bench_pool(fixtures, args.iterations, 'lxml', args.workers):8.1f} pages/sec")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+"""Throughput, latency and memory of the evaluation and extraction pipelines on stub backends.
+
+Every target runs the real script code in its own process, against a fake OpenAI server,
+tiny random-weight HuggingFace checkpoints and synthetic questions/PDFs (see `stubs.py`).
+Nothing touches the network, so numbers are comparable between runs on the same machine.
+
+    python -m benchmarks.bench_pipelines                      # run and compare with baseline.json
+    python -m benchmarks.bench_pipelines --update-baseline    # record this machine's numbers
+    python -m benchmarks.bench_pipelines --targets hf_mcq pdf_extract --runs 5
+
+Each target reports items/sec (questions, pipeline calls, PDFs or filter passes, see
+`unit`), p50/p99 latency per item, peak RSS of its process and model tokens/sec (tokens
+fed to the HuggingFace model, or prompt + completion tokens served by the fake OpenAI
+server). The exit status is 1 if any metric is worse than the baseline by more than the
+tolerance (`--latency-tolerance` for the p50/p99 latencies, which are the noisiest). Only a
+baseline recorded on the same machine, compared with at least `MIN_GATING_RUNS` runs per
+target, can fail the run; otherwise regressions are printed as warnings.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from .stubs import (FakeOpenAIServer, build_tiny_models, install_fake_api_keys, write_pdf_fixtures,
+                    write_question_fixture)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# Metric -> whether larger is better
+METRICS = {
+    'items_per_sec': True,
+    'p50_ms': False,
+    'p99_ms': False,
+    'peak_rss_mib': False,
+    'tokens_per_sec': True,
+}
+LATENCY_METRICS = ('p50_ms', 'p99_ms')
+# Fewer runs per target than this only warn: the best of one or two runs is mostly noise
+MIN_GATING_RUNS = 3
+
+class Recorder:
+    """Per-item latencies and model token counts of one target run."""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.tokens = 0
+
+    def timed(self, fn: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+        return wrapper
+
+    def pipeline(self, load: Callable) -> Callable:
+        """Wrap a pipeline loader so that every call is timed and every token fed to the model is counted."""
+        def loader(*args, **kwargs):
+            classifier = load(*args, **kwargs)
+
+            def count(module, args, kwargs):
+                input_ids = kwargs.get('input_ids', args[0] if args else None)
+                if input_ids is not None:
+                    self.tokens += int(input_ids.numel())
+
+            classifier.model.register_forward_pre_hook(count, with_kwargs=True)
+            return TimedPipeline(classifier, self)
+        return loader
+
+class TimedPipeline:
+    def __init__(self, classifier, recorder: Recorder):
+        self.classifier = classifier
+        self.call = recorder.timed(classifier)
+
+    def __call__(self, *args, **kwargs):
+        return self.call(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.classifier, name)
+
+def _huggingface_target(module_name: str, unit: str, **main_kwargs):
+    def target(workdir: str, models: Dict[str, str], recorder: Recorder, options: Dict) -> Dict:
+        import importlib
+        module = importlib.import_module(module_name)
+        module.model_types = {modality: [models[modality]] for modality in module.model_types if modality in models}
+        module.load_pipeline = recorder.pipeline(module.load_pipeline)
+        start = time.perf_counter()
+        module.main(**main_kwargs)
+        return {'seconds': time.perf_counter() - start, 'items': len(recorder.latencies), 'unit': unit}
+    return target
+
+def target_gpt4(workdir, models, recorder, options):
+    os.chdir(os.path.join(workdir, 'run'))
+    from scripts import benchmark_gpt_4, llm
+    # Calls run concurrently on the client's loop, so each request reports its own latency
+    llm.get_client().add_listener(lambda spec, completion, item: recorder.latencies.append(completion.latency))
+    start = time.perf_counter()
+    benchmark_gpt_4.main()
+    return {'seconds': time.perf_counter() - start, 'items': len(recorder.latencies), 'unit': 'question'}
+
+def _filter_target(command: str, *arguments: str):
+    def target(workdir, models, recorder, options):
+        data_file = os.path.join(workdir, 'data', 'chem_mqa_dataset.json')
+        argv = ['filter.py', command, '--data_file', data_file, *arguments]
+        if command == 'check':
+            argv += ['--result_file', os.path.join(workdir, 'data', 'model_results.json')]
+        run = lambda: runpy.run_path(os.path.join(ROOT, 'filter.py'), run_name='__main__')
+        sys.argv = argv
+        # One untimed pass so that importing nltk, wordcloud and matplotlib is not counted
+        run()
+        run = recorder.timed(run)
+        start = time.perf_counter()
+        for _ in range(options['filter_repeats']):
+            run()
+        return {'seconds': time.perf_counter() - start, 'items': len(recorder.latencies), 'unit': 'pass'}
+    return target
+
+def target_pdf_extract(workdir, models, recorder, options):
+    os.chdir(os.path.join(workdir, 'run'))
+    from scripts import pdf_utils
+    output_folder = os.path.join(workdir, 'text')
+    csv_path = os.path.join(workdir, 'data', 'articles.csv')
+    os.makedirs(output_folder, exist_ok=True)
+    os.makedirs(os.path.join(workdir, 'data', 'all_output'), exist_ok=True)
+    convert = recorder.timed(pdf_utils.convert_pdf_to_text)
+    pdf_folder = os.path.join(workdir, 'pdfs')
+    start = time.perf_counter()
+    for file_name in sorted(os.listdir(pdf_folder)):
+        convert(os.path.join(pdf_folder, file_name), output_folder, csv_path)
+    return {'seconds': time.perf_counter() - start, 'items': len(recorder.latencies), 'unit': 'pdf'}
+
+TARGETS = {
+    'gpt4': target_gpt4,
+    'hf_mcq': _huggingface_target('scripts.benchmark_huggingface_MCQ', 'call'),
+    'hf_binary': _huggingface_target('scripts.benchmark_huggingface_binary', 'call', save_files=1),
+    'filter': _filter_target('filter', '--include_keywords', 'catalyst', 'zeolite'),
+    'filter_wordcloud': _filter_target('wordcloud', '--output_file', 'wordcloud', '--format', 'png'),
+    'filter_check': _filter_target('check'),
+    'pdf_extract': target_pdf_extract,
+}
+
+def run_child(target: str, workdir: str, models: Dict[str, str], options: Dict, output: str) -> None:
+    """Body of the per-target process: run the target and write its raw measurements to `output`."""
+    install_fake_api_keys()
+    sys.path.insert(0, ROOT)
+    os.chdir(workdir)
+    recorder = Recorder()
+    try:
+        result = TARGETS[target](workdir, models, recorder, options)
+    except (ImportError, LookupError) as e:
+        # A missing optional dependency or data package (e.g. nltk stopwords) skips the target
+        reason = next((line.strip() for line in str(e).splitlines() if line.strip('* ')), '')
+        result = {'skipped': f"{type(e).__name__}: {reason}"}
+    result['latencies'] = recorder.latencies
+    result['model_tokens'] = recorder.tokens
+    result['peak_rss_mib'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    with open(output, 'w') as f:
+        json.dump(result, f)
+
+def prepare_fixtures(folder: str, questions: int, pdfs: int) -> Dict[str, str]:
+    """Write the shared fixtures once: questions, model results, PDFs and tiny checkpoints."""
+    data_dir = os.path.join(folder, 'data')
+    write_question_fixture(os.path.join(data_dir, 'chem_mqa_dataset.json'), questions)
+    shutil.copy(os.path.join(data_dir, 'chem_mqa_dataset.json'), os.path.join(data_dir, 'all_questions_gpt_4.json'))
+    with open(os.path.join(data_dir, 'chem_mqa_dataset.json')) as f:
+        dataset = json.load(f)
+    model_results = [{'model_name': 'bench', **{key: {'generated_answer': details['Answer']}
+                                                for entry in dataset for key, details in entry.items()
+                                                if key.startswith('Question')}}]
+    with open(os.path.join(data_dir, 'model_results.json'), 'w') as f:
+        json.dump(model_results, f)
+    write_pdf_fixtures(os.path.join(folder, 'pdfs'), pdfs)
+    return build_tiny_models(os.path.join(folder, 'models'))
+
+def run_target(target: str, fixtures: str, models: Dict[str, str], options: Dict, server: FakeOpenAIServer,
+               verbose: bool = False) -> Dict:
+    """Run one target in a fresh working folder and process, and summarise its measurements."""
+    workdir = tempfile.mkdtemp(prefix=f"{target}-", dir=fixtures)
+    shutil.copytree(os.path.join(fixtures, 'data'), os.path.join(workdir, 'data'))
+    shutil.copytree(os.path.join(fixtures, 'pdfs'), os.path.join(workdir, 'pdfs'))
+    os.makedirs(os.path.join(workdir, 'run'))
+    # benchmark_gpt_4 saves to ../results/GPT4_Answers/../data/, i.e. results/data/
+    os.makedirs(os.path.join(workdir, 'results', 'data'))
+    output = os.path.join(workdir, 'measurements.json')
+
+    env = dict(os.environ, OPENAI_BASE_URL=server.base_url, OPENAI_API_KEY='sk-benchmark',
+               CHEM_QA_TOKEN_CACHE=os.path.join(workdir, 'cache', 'tokens'),
+               CHEM_QA_LLM_CACHE=os.path.join(workdir, 'cache', 'llm.sqlite'),
+               CHEM_QA_LLM_LEDGER=os.path.join(workdir, 'results', 'llm_ledger.sqlite'), HF_HUB_OFFLINE='1',
+               TRANSFORMERS_OFFLINE='1', MPLBACKEND='Agg', PYTHONPATH=ROOT)
+    env.pop('CHEM_QA_MODEL_SERVER', None)
+    command = [sys.executable, '-m', 'benchmarks.bench_pipelines', '--child', target, '--workdir', workdir,
+               '--child-output', output, '--models', json.dumps(models), '--options', json.dumps(options)]
+    server.reset()
+    with open(os.path.join(workdir, 'log.txt'), 'w') as log:
+        completed = subprocess.run(command, cwd=ROOT, env=env, stdout=None if verbose else log,
+                                   stderr=None if verbose else subprocess.STDOUT)
+    if completed.returncode != 0 or not os.path.exists(output):
+        with open(os.path.join(workdir, 'log.txt')) as log:
+            tail = log.read()[-2000:]
+        return {'error': f"exit status {completed.returncode}\n{tail}"}
+
+    with open(output) as f:
+        raw = json.load(f)
+    if 'skipped' in raw:
+        return {'skipped': raw['skipped']}
+    latencies = np.array(raw['latencies']) * 1000
+    tokens = raw['model_tokens'] or server.prompt_tokens + server.completion_tokens
+    seconds = max(raw['seconds'], 1e-9)
+    return {
+        'unit': raw['unit'],
+        'items': raw['items'],
+        'seconds': raw['seconds'],
+        'items_per_sec': raw['items'] / seconds,
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+        'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+        'peak_rss_mib': raw['peak_rss_mib'],
+        'tokens': tokens,
+        'tokens_per_sec': tokens / seconds if tokens else None,
+        'openai_requests': server.requests,
+    }
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float,
+            latency_tolerance: float) -> List[str]:
+    """Regressions of `results` against `baseline`: metrics worse by more than `tolerance`
+    (a fraction), or `latency_tolerance` for the latency percentiles."""
+    regressions = []
+    for target, result in results.items():
+        reference = baseline.get(target)
+        if not reference or 'items' not in result:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            value, expected = result.get(metric), reference.get(metric)
+            if value is None or not expected:
+                continue
+            change = (value - expected) / expected
+            allowed = latency_tolerance if metric in LATENCY_METRICS else tolerance
+            if (-change if higher_is_better else change) > allowed:
+                regressions.append(f"{target}: {metric} {value:.2f} vs baseline {expected:.2f} ({change:+.0%})")
+    return regressions
+
+def print_results(results: Dict[str, Dict]) -> None:
+    fmt = lambda value, spec: format(value, spec) if value is not None else '-'
+    print(f"{'target':18s} {'items':>7s} {'unit':>9s} {'items/s':>9s} {'p50 ms':>9s} {'p99 ms':>9s} "
+          f"{'RSS MiB':>8s} {'tokens/s':>10s}")
+    for target, result in results.items():
+        if 'items' not in result:
+            status = 'skipped' if 'skipped' in result else 'ERROR'
+            reason = (result.get('skipped') or result.get('error', '')).strip().splitlines()
+            print(f"{target:18s} {status}: {reason[-1] if reason else ''}")
+            continue
+        print(f"{target:18s} {result['items']:7d} {result['unit']:>9s} {fmt(result['items_per_sec'], '9.1f')} "
+              f"{fmt(result['p50_ms'], '9.2f')} {fmt(result['p99_ms'], '9.2f')} {fmt(result['peak_rss_mib'], '8.0f')} "
+              f"{fmt(result['tokens_per_sec'], '10.0f')}")
+
+def best_run(runs: List[Dict]) -> Dict:
+    """Best value of each metric over the successful runs, the least disturbed by other load on the machine."""
+    measured = [run for run in runs if 'items' in run]
+    if not measured:
+        return runs[-1]
+    best = dict(measured[0])
+    for metric, higher_is_better in METRICS.items():
+        values = [run[metric] for run in measured if run[metric] is not None]
+        if values:
+            best[metric] = max(values) if higher_is_better else min(values)
+    best['runs'] = len(measured)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipelines on stub backends.")
+    parser.add_argument('--targets', nargs='+', choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument('--questions', type=int, default=200, help='Synthetic questions in the dataset fixture')
+    parser.add_argument('--pdfs', type=int, default=10, help='Synthetic papers for the PDF extraction target')
+    parser.add_argument('--filter-repeats', type=int, default=20, help='Passes of each filter.py subcommand')
+    parser.add_argument('--openai-latency', type=float, default=0.0, help='Seconds the fake OpenAI server waits per request')
+    parser.add_argument('--runs', type=int, default=3, help='Runs per target; the best value of each metric is reported')
+    parser.add_argument('--baseline', type=str, default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true', help='Store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='Allowed relative regression per metric')
+    parser.add_argument('--latency-tolerance', type=float, default=1.0,
+                        help='Allowed relative regression of the p50/p99 latencies')
+    parser.add_argument('--output', type=str, help='Also write the results to this JSON file')
+    parser.add_argument('--keep', action='store_true', help='Keep the fixture and working folders')
+    parser.add_argument('--verbose', action='store_true', help='Show the output of the targets')
+    parser.add_argument('--child', choices=list(TARGETS), help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    parser.add_argument('--child-output', help=argparse.SUPPRESS)
+    parser.add_argument('--models', help=argparse.SUPPRESS)
+    parser.add_argument('--options', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.workdir, json.loads(args.models), json.loads(args.options), args.child_output)
+        return
+
+    options = {'filter_repeats': args.filter_repeats}
+    # The workloads are part of the baseline: numbers for another workload are not comparable
+    workload = {'questions': args.questions, 'pdfs': args.pdfs, 'filter_repeats': args.filter_repeats,
+                'openai_latency': args.openai_latency}
+    fixtures = tempfile.mkdtemp(prefix='chem-qa-bench-')
+    results: Dict[str, Dict] = {}
+    try:
+        print(f"Preparing fixtures in {fixtures}")
+        models = prepare_fixtures(fixtures, args.questions, args.pdfs)
+        with FakeOpenAIServer(latency=args.openai_latency) as server:
+            for target in args.targets:
+                print(f"Running {target}...", flush=True)
+                results[target] = best_run([run_target(target, fixtures, models, options, server, args.verbose)
+                                            for _ in range(args.runs)])
+    finally:
+        if args.keep:
+            print(f"Kept working folders in {fixtures}")
+        else:
+            shutil.rmtree(fixtures, ignore_errors=True)
+
+    print_results(results)
+    machine = {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()}
+    report = {'machine': machine,
+              'workload': workload, 'targets': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    failed = [target for target, result in results.items() if 'error' in result]
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({**report, 'targets': {t: r for t, r in results.items() if 'items' in r}}, f, indent=4)
+        print(f"Baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('workload') != workload:
+            print(f"Baseline was recorded for workload {baseline.get('workload')}, not {workload}; not comparing")
+        else:
+            regressions = compare(results, baseline['targets'], args.tolerance, args.latency_tolerance)
+            gating = True
+            if baseline.get('machine') != machine:
+                print(f"Baseline was recorded on {baseline.get('machine')}, not {machine}; "
+                      f"regressions are only warnings (--update-baseline to record this machine)")
+                gating = False
+            if args.runs < MIN_GATING_RUNS:
+                print(f"Only {args.runs} run(s) per target; regressions are only warnings "
+                      f"(--runs {MIN_GATING_RUNS} or more to gate)")
+                gating = False
+            for regression in regressions:
+                print(f"{'REGRESSION' if gating else 'warning: regression'} {regression}")
+            if regressions and gating:
+                sys.exit(1)
+            if not regressions:
+                print(f"No regression beyond {args.tolerance:.0%} of the baseline "
+                      f"({args.latency_tolerance:.0%} for latencies)")
+    else:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to record one")
+    if failed:
+        print(f"Failed targets: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
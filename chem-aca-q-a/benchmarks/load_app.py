@@ -0,0 +1,76 @@
+"""Load test of the annotation app: simulated annotators answering their ten questions.
+
+Start the app the way it is deployed, then point the load test at it (from chem-aca-q-a/):
+    gunicorn -w 4 -b 127.0.0.1:8000 'app.wsgi:app'
+    python -m benchmarks.load_app --url http://127.0.0.1:8000 --users 40 --sessions 3
+
+Every virtual user holds its own cookie jar and loops over full sessions: the home page,
+then GET and POST of each question, then the score page. Requests/sec over the run and
+latency percentiles per endpoint are reported. The exit status is 1 if any request failed.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import aiohttp
+import numpy as np
+
+async def run_user(url: str, sessions: int, latencies: Dict[str, List[float]], errors: List[str], seed: int) -> None:
+    rng = random.Random(seed)
+    async with aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True)) as client:
+
+        async def request(name: str, method: str, path: str, **kwargs) -> str:
+            start = time.perf_counter()
+            try:
+                async with client.request(method, url + path, allow_redirects=False, **kwargs) as response:
+                    await response.read()
+                    if response.status >= 400:
+                        errors.append(f"{name}: HTTP {response.status}")
+                    return response.headers.get('Location', '')
+            except aiohttp.ClientError as e:
+                errors.append(f"{name}: {e}")
+                return ''
+            finally:
+                latencies[name].append(time.perf_counter() - start)
+
+        for _ in range(sessions):
+            await request('home', 'GET', '/')
+            location = '/question'
+            while location.endswith('/question'):
+                await request('question', 'GET', '/question')
+                location = await request('answer', 'POST', '/question', data={
+                    'option': rng.choice('ABCD'), 'question_quality': rng.choice(['Yes', 'No'])})
+            await request('finish', 'GET', '/finish')
+
+async def load_test(url: str, users: int, sessions: int):
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: List[str] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_user(url.rstrip('/'), sessions, latencies, errors, seed) for seed in range(users)))
+    return time.perf_counter() - start, latencies, errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the annotation app with simulated annotators.")
+    parser.add_argument('--url', type=str, default='http://127.0.0.1:8000')
+    parser.add_argument('--users', type=int, default=40, help='Concurrent annotators')
+    parser.add_argument('--sessions', type=int, default=3, help='Ten-question sessions per annotator')
+    args = parser.parse_args()
+
+    seconds, latencies, errors = asyncio.run(load_test(args.url, args.users, args.sessions))
+    total = sum(len(values) for values in latencies.values())
+    print(f"{total} requests in {seconds:.2f}s: {total / seconds:.1f} requests/sec, "
+          f"{args.users * args.sessions / seconds:.2f} sessions/sec")
+    for name, values in latencies.items():
+        values = np.array(values) * 1000
+        print(f"{name:10s} {len(values):6d} requests  p50 {np.percentile(values, 50):7.1f} ms  "
+              f"p99 {np.percentile(values, 99):7.1f} ms")
+    if errors:
+        print(f"{len(errors)} failed requests, e.g. {errors[0]}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+"""Deterministic stand-ins for the external backends of the pipelines.
+
+- `FakeOpenAIServer`: a local HTTP server speaking the chat-completions API. Answers are a
+  hash of the prompt, so repeated runs get the same replies, and token usage is counted
+  from whitespace-separated words.
+- `build_tiny_models`: randomly initialised (seeded) BERT/GPT-2 checkpoints of a few
+  hundred kilobytes for the question-answering, zero-shot and text-generation pipelines.
+- `write_question_fixture` and `write_pdf_fixtures`: synthetic questions and papers.
+- `FixtureSiteServer`: a publisher site on localhost serving the saved HTML pages and
+  slowly streamed PDFs, counting connections and concurrent responses.
+- `install_fake_api_keys`: the `api_keys.api_keys` module the scripts import their key from.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+WORDS = (
+    "catalyst zeolite ligand palladium oxidation reduction enzyme kinetics substrate solvent yield "
+    "selectivity adsorption desorption surface nanoparticle polymer monomer reaction temperature "
+    "pressure acid base buffer electrode electrolyte battery lithium cobalt nickel copper iron "
+    "platinum hydrogen oxygen nitrogen carbon dioxide methane ethanol benzene toluene chloride "
+    "sulfate phosphate membrane protein peptide spectroscopy chromatography crystal lattice "
+    "bond energy barrier transition state mechanism rate constant equilibrium concentration "
+    "the a of in on with by for from to is are was were which that this these under over"
+).split()
+
+def _digest(text: str) -> int:
+    return int(hashlib.sha1(text.encode('utf-8')).hexdigest(), 16)
+
+def count_tokens(text: str) -> int:
+    return len(text.split())
+
+PAPER_RESPONSE = {
+    "Title": "Benchmark Paper", "Abstract": "Synthetic abstract.", "Journal": "Benchmark Journal",
+    "Relevant fields": ["catalysis"], "Authors": ["A. Author", "B. Author"], "Keywords": ["catalyst", "zeolite"],
+    "Institute of Origin": "Benchmark Institute", "DOI": "https://doi.org/10.0000/bench", "Funding": "None",
+    "Methods": "Synthetic methods.", "Results": "Synthetic results.", "Experiment details": "Synthetic details.",
+}
+
+def fake_completion(messages: List[Dict[str, str]]) -> str:
+    """The reply of the fake model: paper JSON for extraction prompts, a label (or, for
+    batched judge prompts, a JSON object of numbered labels) for judge prompts, a letter
+    otherwise."""
+    prompt = "\n".join(message.get('content', '') for message in messages)
+    if 'JSON format' in prompt:
+        return json.dumps(PAPER_RESPONSE)
+    if "'True' or 'False'" in prompt and 'JSON object' in prompt:
+        items = re.findall(r'^(\d+)\. (.*)$', prompt, flags=re.MULTILINE)
+        return json.dumps({number: ('True', 'False')[_digest(item) % 2] for number, item in items})
+    if "'True' or 'False'" in prompt:
+        return ('True', 'False')[_digest(prompt) % 2]
+    return 'ABCD'[_digest(prompt) % 4]
+
+class FakeOpenAIServer:
+    """Chat-completions endpoint on localhost, with per-request token accounting.
+
+    Point an `openai.OpenAI` client at it with `OPENAI_BASE_URL=server.base_url`.
+
+    Args:
+        latency (float): Seconds each completion sleeps, to mimic network time.
+    """
+
+    def __init__(self, latency: float = 0.0, host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.reset()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self._send(404, {'error': {'message': f"Unknown path {self.path}"}})
+                    return
+                if server.latency:
+                    time.sleep(server.latency)
+                messages = body.get('messages', [])
+                content = fake_completion(messages)
+                prompt_tokens = sum(count_tokens(message.get('content', '')) for message in messages)
+                completion_tokens = count_tokens(content)
+                server.record(prompt_tokens, completion_tokens)
+                self._send(200, {
+                    'id': f"chatcmpl-{server.requests}", 'object': 'chat.completion', 'created': 0,
+                    'model': body.get('model', 'fake'),
+                    'choices': [{'index': 0, 'finish_reason': 'stop',
+                                 'message': {'role': 'assistant', 'content': content}}],
+                    'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                              'total_tokens': prompt_tokens + completion_tokens},
+                })
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}/v1"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def record(self, prompt_tokens: int, completion_tokens: int) -> None:
+        with self.lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def reset(self) -> None:
+        with self.lock:
+            self.requests = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class FixtureSiteServer:
+    """A publisher site on localhost for the fetch layer (HTTP/1.1, keep-alive).
+
+    `/html/<file>` serves a saved page of `fixtures/html`. `/pdf/<name>.pdf` streams a
+    synthetic PDF of `pdf_size` bytes in `chunks` pieces, `chunk_delay` seconds apart, so
+    that downloads overlap. The server records how many TCP connections were opened and
+    the peak number of responses in progress at once.
+
+    Args:
+        html_dir (str): Folder of the saved pages.
+        pdf_size (int): Bytes per PDF.
+        chunks (int): Pieces each PDF is written in.
+        chunk_delay (float): Seconds between pieces.
+    """
+
+    def __init__(self, html_dir: str, pdf_size: int = 256 * 1024, chunks: int = 8, chunk_delay: float = 0.01,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.html_dir = html_dir
+        self.pdf = b'%PDF-1.4\n' + b'0' * (pdf_size - 9)
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+        self.lock = threading.Lock()
+        self.reset()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with server.lock:
+                    server.connections += 1
+
+            def do_GET(self):
+                with server.lock:
+                    server.requests += 1
+                    server.active += 1
+                    server.peak_active = max(server.peak_active, server.active)
+                try:
+                    if self.path.startswith('/pdf/'):
+                        self._stream(server.pdf, 'application/pdf')
+                    elif self.path.startswith('/html/'):
+                        path = os.path.join(server.html_dir, os.path.basename(self.path))
+                        if not os.path.exists(path):
+                            self._send(404, b'Not found', 'text/plain')
+                            return
+                        with open(path, 'rb') as f:
+                            self._send(200, f.read(), 'text/html')
+                    else:
+                        self._send(404, b'Not found', 'text/plain')
+                finally:
+                    with server.lock:
+                        server.active -= 1
+
+            def _send(self, status, data, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, data, content_type):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                step = -(-len(data) // server.chunks)
+                for start in range(0, len(data), step):
+                    self.wfile.write(data[start:start + step])
+                    self.wfile.flush()
+                    time.sleep(server.chunk_delay)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.connections = 0
+            self.requests = 0
+            self.active = 0
+            self.peak_active = 0
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def install_fake_api_keys(key: str = 'sk-benchmark') -> None:
+    """Register an `api_keys.api_keys` module so the scripts import without real credentials."""
+    package = types.ModuleType('api_keys')
+    module = types.ModuleType('api_keys.api_keys')
+    module.key_openai = key
+    package.api_keys = module
+    sys.modules['api_keys'] = package
+    sys.modules['api_keys.api_keys'] = module
+
+def _sentence(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+def write_question_fixture(path: str, questions: int, seed: int = 0) -> None:
+    """A dataset JSON shaped like `chem_mqa_dataset.json`, one question per entry."""
+    rng = random.Random(seed)
+    entries = []
+    for i in range(questions):
+        details = {'Context': _sentence(rng, 40), 'Question': _sentence(rng, 12) + "?",
+                   'A': _sentence(rng, 4), 'B': _sentence(rng, 4), 'C': _sentence(rng, 4), 'D': _sentence(rng, 4),
+                   'Answer': rng.choice('ABCD'), 'Source': _sentence(rng, 10)}
+        entries.append({f"Question_{i + 1}": details, 'doi': f"10.0000/bench.{i}"})
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(entries, f)
+
+def write_pdf_fixtures(folder: str, papers: int, pages: int = 4, seed: int = 0) -> List[str]:
+    """Multi-page papers with Abstract and References headings, as the extraction expects."""
+    import fitz
+
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i in range(papers):
+        doc = fitz.open()
+        for page_number in range(pages):
+            page = doc.new_page()
+            lines = ["Abstract" if page_number == 0 else f"Section {page_number}"]
+            lines += [_sentence(rng, 12) for _ in range(45)]
+            if page_number == pages - 1:
+                lines += ["References"] + [_sentence(rng, 8) for _ in range(5)]
+            page.insert_text((40, 40), "\n".join(lines), fontsize=8)
+        path = os.path.join(folder, f"bench{i:03d}.pdf")
+        doc.save(path)
+        doc.close()
+        paths.append(path)
+    return paths
+
+def build_tiny_models(folder: str, seed: int = 0) -> Dict[str, str]:
+    """Seeded random-weight checkpoints, one per pipeline modality, sharing a word-level vocabulary.
+
+    Returns:
+        Dict[str, str]: Checkpoint folder per modality.
+    """
+    import torch
+    from transformers import (BertConfig, BertForQuestionAnswering, BertForSequenceClassification,
+                              BertTokenizerFast, GPT2Config, GPT2LMHeadModel)
+
+    os.makedirs(folder, exist_ok=True)
+    vocab_path = os.path.join(folder, 'vocab.txt')
+    specials = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]']
+    letters = [chr(c) for c in range(ord('a'), ord('z') + 1)] + list("0123456789.,?!:;()-'")
+    with open(vocab_path, 'w') as f:
+        f.write("\n".join(specials + sorted(set(WORDS)) + letters + ['true', 'false', 'example']) + "\n")
+    tokenizer = BertTokenizerFast(vocab_file=vocab_path)
+
+    torch.manual_seed(seed)
+    encoder = dict(vocab_size=tokenizer.vocab_size, hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                   intermediate_size=64, max_position_embeddings=512)
+    labels = {0: 'entailment', 1: 'neutral', 2: 'contradiction'}
+    models = {
+        'zero-shot-classification': BertForSequenceClassification(
+            BertConfig(**encoder, id2label=labels, label2id={v: k for k, v in labels.items()})),
+        'question-answering': BertForQuestionAnswering(BertConfig(**encoder)),
+        'text-generation': GPT2LMHeadModel(GPT2Config(
+            vocab_size=tokenizer.vocab_size, n_embd=32, n_layer=2, n_head=2, n_positions=1024,
+            bos_token_id=tokenizer.cls_token_id, eos_token_id=tokenizer.sep_token_id,
+            pad_token_id=tokenizer.pad_token_id)),
+    }
+    models['text-generation'].generation_config.max_new_tokens = 4
+    models['text-generation'].generation_config.pad_token_id = tokenizer.pad_token_id
+
+    paths = {}
+    for modality, model in models.items():
+        path = os.path.join(folder, modality)
+        model.save_pretrained(path)
+        tokenizer.save_pretrained(path)
+        paths[modality] = path
+    return paths
@@ -8,6 +8,8 @@ from nltk.corpus import stopwords
 from wordcloud import WordCloud
 from io import StringIO
 
+from scripts.tracing import traced
+
 def load_dataset(file_path):
     with open(file_path, 'r') as file:
         return json.load(file)
@@ -97,6 +99,7 @@ def check_correct_answers(result_data, question_data):
         print(f"Correct Answers: {results['correct']}/{results['total']} ({results['accuracy']})")
         print("-" * 50)
         
+@traced("filter_questions")
 def filter_questions(data, include_keywords=None, exclude_keywords=None, fields=None, max_results=None, case_sensitive=False, output_format='json'):
     """
     Filter questions based on inclusion or exclusion of keywords in specified fields and limit the number of results.
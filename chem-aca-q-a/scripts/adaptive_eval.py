@@ -0,0 +1,113 @@
+"""Early-stopping evaluation for screening many models.
+
+Questions are asked in a stratified random order (every prefix has about the dataset's
+mix of gold answers, so a model that always answers "B" cannot look good early). A
+running Wilson interval of the accuracy is checked every `check_every` answers. The
+model stops as soon as the interval is decided:
+
+- below the threshold (e.g. chance, 0.25),
+- above the threshold (if `stop_above`),
+- entirely below the lower bound of the best model screened so far.
+
+Checking the interval repeatedly would inflate the error rate, so each check uses a
+Bonferroni-corrected confidence level over the planned number of checks. The overall
+chance that any decision is wrong stays below `alpha`.
+"""
+import math
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.stats import norm
+
+@dataclass
+class ScreeningRule:
+    """When an adaptive evaluation may stop.
+
+    Attributes:
+        threshold (float): Accuracy the model is screened against.
+        alpha (float): Overall error rate of the stop decisions.
+        min_questions (int): Answers before the first check.
+        check_every (int): Answers between checks.
+        stop_above (bool): Also stop once the model is known to beat the threshold.
+    """
+    threshold: float = 0.25
+    alpha: float = 0.05
+    min_questions: int = 100
+    check_every: int = 50
+    stop_above: bool = True
+
+    def z(self, total: int) -> float:
+        """Critical value of each check, Bonferroni-corrected for the checks a run of `total` questions makes."""
+        checks = 1 + max(0, math.ceil((total - self.min_questions) / self.check_every))
+        return float(norm.ppf(1 - self.alpha / (2 * checks)))
+
+def wilson_interval(correct: int, n: int, z: float) -> Tuple[float, float]:
+    """Wilson score interval of a binomial proportion."""
+    if n == 0:
+        return 0.0, 1.0
+    p = correct / n
+    denominator = 1 + z ** 2 / n
+    centre = (p + z ** 2 / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denominator
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+def stratified_order(strata: Sequence, seed: int = 0) -> np.ndarray:
+    """Random order of indices in which every prefix holds each stratum in proportion.
+
+    Each stratum is shuffled, its members are spread evenly over [0, 1) with a random
+    offset, and all members are then sorted by that position.
+    """
+    rng = np.random.default_rng(seed)
+    strata = np.asarray(strata)
+    positions = np.empty(len(strata))
+    for stratum in np.unique(strata):
+        members = rng.permutation(np.flatnonzero(strata == stratum))
+        positions[members] = (np.arange(len(members)) + rng.random()) / len(members)
+    return np.argsort(positions, kind='stable')
+
+def screen(answer: Callable[[int], bool], order: Sequence[int], rule: ScreeningRule,
+           leader_lower: Optional[float] = None) -> Dict:
+    """Ask questions in `order` until the accuracy interval is decided.
+
+    Args:
+        answer (Callable[[int], bool]): Asks the model question `index`; returns whether it was right.
+        order (Sequence[int]): Question indices, typically from `stratified_order`.
+        rule (ScreeningRule): Stopping rule.
+        leader_lower (Optional[float]): Lower bound of the best model so far.
+
+    Returns:
+        Dict: `answered`, `correct`, `accuracy`, the final interval (`ci_low`, `ci_high`),
+        `total` and `stopped` (`below threshold`, `above threshold`, `behind leader` or
+        `exhausted`).
+    """
+    z = rule.z(len(order))
+    correct = 0
+    answered = 0
+    stopped = 'exhausted'
+    for index in order:
+        correct += bool(answer(int(index)))
+        answered += 1
+        if answered < rule.min_questions or (answered - rule.min_questions) % rule.check_every:
+            continue
+        low, high = wilson_interval(correct, answered, z)
+        if high < rule.threshold:
+            stopped = 'below threshold'
+        elif leader_lower is not None and high < leader_lower:
+            stopped = 'behind leader'
+        elif rule.stop_above and low > rule.threshold:
+            stopped = 'above threshold'
+        else:
+            continue
+        break
+
+    low, high = wilson_interval(correct, answered, z)
+    return {
+        'answered': answered,
+        'total': len(order),
+        'correct': correct,
+        'accuracy': correct / max(answered, 1),
+        'ci_low': low,
+        'ci_high': high,
+        'stopped': stopped,
+    }
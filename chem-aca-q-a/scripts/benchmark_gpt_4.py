@@ -1,10 +1,10 @@
 import os
 import json
 
-from api_keys.api_keys import key_openai
-from openai import OpenAI
+from .llm import BudgetExceeded, get_client
+from .telemetry import completion_telemetry
 
-client = OpenAI(api_key=key_openai)
+MODEL = "openai:gpt-4-1106-preview"
 
 output_dir = "../results/GPT4_Answers"
 os.makedirs(output_dir, exist_ok=True)
@@ -16,40 +16,42 @@ def evaluate_questions_with_gpt4(questions, output_filename):
     results = []
     correct_count = 0
 
-    for question_data in questions:
-        for question_id, details in question_data.items():
-            if question_id.startswith("Question"):
-                prompt = f"You can only respond to this prompt with one letter, nothing else. This is a multiple-choice question. You must answer the following question by simply printing one of the following letters (A, B, C, or D). You shall not write anything else except the letter in your following response, no text whatsoever except for the letter. {details['Context']} {details['Question']} Choices: A: {details['A']}, B: {details['B']}, C: {details['C']}, D: {details['D']}."
-                
-                messages = [
-                    {"role": "system", "content": "You are a multiple-choice question answering machine - you only answer with a letter out of A, B, C, and D, nothing else is outputted by you."},
-                    {"role": "user", "content": prompt}
-                ]
-
-                try:
-                    completion = client.chat.completions.create(
-                        model="gpt-4-1106-preview",
-                        messages=messages,
-                        temperature=0
-                    )
-
-                    generated_answer = completion.choices[0].message.content
-                    
-                    print(f"{details['Context']} {details['Question']} Choices: A: {details['A']}, B: {details['B']}, C: {details['C']}, D: {details['D']} \n {generated_answer}")
-
-                    is_correct = generated_answer.upper() == details['Answer'].upper()
-                    if is_correct:
-                        correct_count += 1
-
-                    results.append({
-                        'question_id': question_id,
-                        'prompt': prompt,
-                        'generated_answer': generated_answer,
-                        'is_correct': is_correct
-                    })
-
-                except Exception as e:
-                    print(f"Error with question {question_id}: {e}")
+    entries = [(question_id, details) for question_data in questions
+               for question_id, details in question_data.items() if question_id.startswith("Question")]
+    prompts = [f"You can only respond to this prompt with one letter, nothing else. This is a multiple-choice question. You must answer the following question by simply printing one of the following letters (A, B, C, or D). You shall not write anything else except the letter in your following response, no text whatsoever except for the letter. {details['Context']} {details['Question']} Choices: A: {details['A']}, B: {details['B']}, C: {details['C']}, D: {details['D']}."
+               for _, details in entries]
+    conversations = [[
+        {"role": "system", "content": "You are a multiple-choice question answering machine - you only answer with a letter out of A, B, C, and D, nothing else is outputted by you."},
+        {"role": "user", "content": prompt}
+    ] for prompt in prompts]
+    # All questions go out concurrently, within the provider's rate limits
+    completions = get_client().complete_many(MODEL, conversations, items=[question_id for question_id, _ in entries],
+                                             temperature=0, return_exceptions=True)
+    # Out of budget: stop before a partial answer set overwrites the results file
+    over_budget = next((completion for completion in completions if isinstance(completion, BudgetExceeded)), None)
+    if over_budget is not None:
+        raise over_budget
+
+    for (question_id, details), prompt, completion in zip(entries, prompts, completions):
+        if isinstance(completion, Exception):
+            print(f"Error with question {question_id}: {completion}")
+            continue
+
+        generated_answer = completion.text
+
+        print(f"{details['Context']} {details['Question']} Choices: A: {details['A']}, B: {details['B']}, C: {details['C']}, D: {details['D']} \n {generated_answer}")
+
+        is_correct = generated_answer.upper() == details['Answer'].upper()
+        if is_correct:
+            correct_count += 1
+
+        results.append({
+            'question_id': question_id,
+            'prompt': prompt,
+            'generated_answer': generated_answer,
+            'is_correct': is_correct,
+            **completion_telemetry(completion)
+        })
 
     with open(os.path.join(output_dir, output_filename), 'w') as f:
         json.dump(results, f, indent=4)
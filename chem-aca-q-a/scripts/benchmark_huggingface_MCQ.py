@@ -1,12 +1,21 @@
+import argparse
 import os
 import json
 import matplotlib.pyplot as plt
 import numpy as np
 import csv
-from transformers import pipeline
 from tqdm import tqdm
 import torch
 
+from .adaptive_eval import ScreeningRule, screen, stratified_order
+from .packed_dataset import load_packed
+from .model_server import RemotePipeline, build_pipeline, server_address
+from .quantization import compare_precisions, quantize_pipeline, record_comparison
+from .results_store import result_stem
+from .significance import bootstrap_counts_ci, pairwise_tests, write_pairwise_csv
+from .telemetry import TELEMETRY_FIELDS, timed_call
+from .tracing import traced
+
 """TODO
 - We need to save the model's answer.
 - Read how they are parsing their answers / how they query the models with multiple choice questions.
@@ -63,8 +72,103 @@ model_types = {
     ]
 }
 
-def evaluate_model(model_name, modality, questions):
-    classifier = pipeline(modality, model=model_name, device=device)
+# CPU inference precision per model ("fp32" if absent). "int8" dynamically quantizes the linear layers;
+# opt in with --int8 MODEL. Quantized runs are saved under their own result files.
+model_precisions = {}
+# Questions on which a quantized model is also run in fp32 to measure its accuracy delta
+PRECISION_CHECK_QUESTIONS = 200
+
+# Hypothesis the zero-shot-classification pipeline builds for every candidate label
+HYPOTHESIS_TEMPLATE = "This example is {}."
+
+def build_prompt(details):
+    prompt = f"{details['Context']} {details['Question']}"
+    choices = [details['A'], details['B'], details['C'], details['D']]
+    return prompt, choices
+
+def build_completion_prompt(prompt, choices):
+    options = ['A', 'B', 'C', 'D']
+    return prompt + "".join([f"{options[i]}) {choices[i]}\n" for i in range(len(options))])
+
+def tokenizer_inputs(modality, questions):
+    """Every input the pipeline of `modality` will tokenize, in a stable order.
+
+    The question-answering pipeline needs offset mappings and is not cached.
+    """
+    inputs = []
+    for question_data in questions:
+        for question_id, details in question_data.items():
+            if question_id.startswith("Question"):
+                prompt, choices = build_prompt(details)
+                if modality == "zero-shot-classification":
+                    inputs.extend((prompt, HYPOTHESIS_TEMPLATE.format(choice)) for choice in choices)
+                elif modality == "text-generation":
+                    inputs.append(build_completion_prompt(prompt, choices))
+    return inputs
+
+@traced("model_load", "model_name", "modality", "precision")
+def load_pipeline(model_name, modality, questions, precision="fp32"):
+    """Build the pipeline at the given precision, sharing pre-tokenized inputs with models that use the same tokenizer.
+
+    If CHEM_QA_MODEL_SERVER is set, the warm pipeline of the model server is used instead of loading one here.
+    """
+    inputs = None
+    if modality in ("zero-shot-classification", "text-generation"):
+        inputs = tokenizer_inputs(modality, questions)
+    if server_address():
+        return RemotePipeline(model_name, modality, precision, inputs)
+    return build_pipeline(model_name, modality, precision, inputs)
+
+def check_precision(model_name, modality, questions, precision, report_path):
+    """Run a model at fp32 and at `precision` on the same questions and record the accuracy delta and speed-up.
+
+    The checkpoint is loaded once: after the fp32 run its pipeline is quantized in place (a
+    model server keeps one warm pipeline per precision instead).
+
+    Returns:
+        The pipeline at `precision`, for the full evaluation.
+    """
+    subset = [questions[i] for i in range(min(PRECISION_CHECK_QUESTIONS, len(questions)))]
+    pipelines = {}
+
+    def run(mode):
+        if mode == "fp32" or server_address():
+            pipelines[mode] = load_pipeline(model_name, modality, questions, mode)
+        else:
+            pipelines[mode] = quantize_pipeline(pipelines["fp32"], mode)
+        return evaluate_model(model_name, modality, subset, mode, pipelines[mode])[3]
+
+    record_comparison(report_path, compare_precisions(run, model_name, modality, precision, len(subset)))
+    return pipelines[precision]
+
+def answer_question(classifier, modality, prompt, choices):
+    """Ask one question and return the model's letter (anything else means unparsable) and the call's telemetry."""
+    if modality == "question-answering":
+        result, telemetry = timed_call(classifier, question=prompt, context=" ".join(choices))
+        return max(choices, key=lambda choice: result['answer'] in choice), telemetry
+
+    elif modality == "zero-shot-classification":
+        result, telemetry = timed_call(classifier, prompt,
+            candidate_labels=choices,
+            hypothesis_template=HYPOTHESIS_TEMPLATE,
+        )
+        max_score_index = result['scores'].index(max(result['scores']))
+        return ['A', 'B', 'C', 'D'][max_score_index], telemetry
+
+    elif modality == "text-generation":
+        completion_prompt = build_completion_prompt(prompt, choices)
+
+        max_choice_length = max(len(choice) for choice in choices)
+        max_length = max_choice_length + 10
+
+        result, telemetry = timed_call(classifier, completion_prompt, max_length=max_length, num_return_sequences=1)
+        return result[0]['generated_text'][0], telemetry
+
+@traced("evaluate_model", "model_name", "modality", "precision")
+def evaluate_model(model_name, modality, questions, precision="fp32", classifier=None):
+    """Ask every question; `classifier` is a pipeline already loaded at `precision` (loaded here if None)."""
+    if classifier is None:
+        classifier = load_pipeline(model_name, modality, questions, precision)
     results = []
     correct_count = 0
     wrong_count = 0
@@ -73,31 +177,11 @@ def evaluate_model(model_name, modality, questions):
     for question_data in tqdm(questions, desc="Processing Questions"):
         for question_id, details in question_data.items():
             if question_id.startswith("Question"):
-                prompt = f"{details['Context']} {details['Question']}"
-                choices = [details['A'], details['B'], details['C'], details['D']]
+                prompt, choices = build_prompt(details)
                 expected_answer = details['Answer']
 
                 try:
-                    if modality == "question-answering":
-                        result = classifier(question=prompt, context=" ".join(choices))
-                        generated_answer = max(choices, key=lambda choice: result['answer'] in choice)
-                    
-                    elif modality == "zero-shot-classification":
-                        result = classifier(prompt,
-                            candidate_labels=choices,
-                        )
-                        max_score_index = result['scores'].index(max(result['scores']))
-                        generated_answer = ['A', 'B', 'C', 'D'][max_score_index]
-
-                    elif modality == "text-generation":
-                        options = ['A', 'B', 'C', 'D']
-                        completion_prompt = prompt + "".join([f"{options[i]}) {choices[i]}\n" for i in range(len(options))])
-
-                        max_choice_length = max(len(choice) for choice in choices)
-                        max_length = max_choice_length + 10
-
-                        result = classifier(completion_prompt, max_length=max_length, num_return_sequences=1)
-                        generated_answer = result[0]['generated_text'][0]
+                    generated_answer, telemetry = answer_question(classifier, modality, prompt, choices)
 
                     if generated_answer not in ['A', 'B', 'C', 'D']:
                         generated_answer = 'Unparsable'
@@ -112,7 +196,8 @@ def evaluate_model(model_name, modality, questions):
                         'prompt': prompt,
                         'generated_answer': generated_answer,
                         'is_correct': generated_answer == expected_answer,
-                        'is_unparsable': generated_answer == 'Unparsable'
+                        'is_unparsable': generated_answer == 'Unparsable',
+                        **telemetry
                     })
 
                 except Exception as e:
@@ -120,9 +205,53 @@ def evaluate_model(model_name, modality, questions):
 
     return correct_count, wrong_count, unparsable_count, results
 
+def screen_models(dataset, threshold=None, alpha=0.05, seed=0):
+    """Adaptive screening of every model: stop asking once its accuracy interval is decided.
+
+    The threshold defaults to the accuracy of always giving the most common gold answer.
+    """
+    if threshold is None:
+        threshold = float(np.bincount(dataset.answers[dataset.answers >= 0]).max() / len(dataset))
+    rule = ScreeningRule(threshold=threshold, alpha=alpha)
+    order = stratified_order(dataset.answers, seed)
+    screening = {'threshold': rule.threshold, 'alpha': rule.alpha, 'models': []}
+
+    for modality, models in model_types.items():
+        leader_lower = None
+        for model_name in models:
+            precision = model_precisions.get(model_name, "fp32")
+            try:
+                classifier = load_pipeline(model_name, modality, dataset, precision)
+            except Exception as e:
+                print(f"Failed to load model {model_name} due to: {e}")
+                continue
+
+            def answer(index):
+                details = dataset.record(index)
+                prompt, choices = build_prompt(details)
+                try:
+                    return answer_question(classifier, modality, prompt, choices)[0] == details['Answer']
+                except Exception as e:
+                    print(f"Error with question {dataset.field(index, 'question_id')}: {e}")
+                    return False
+
+            result = screen(answer, order, rule, leader_lower)
+            result.update(model_name=model_name, modality=modality, precision=precision)
+            screening['models'].append(result)
+            print(f"{model_name}: {result['correct']}/{result['answered']} correct, "
+                  f"CI [{result['ci_low']:.3f}, {result['ci_high']:.3f}], stopped: {result['stopped']}")
+            if result['stopped'] != 'behind leader' and (leader_lower is None or result['ci_low'] > leader_lower):
+                leader_lower = result['ci_low']
+
+    answered = sum(result['answered'] for result in screening['models'])
+    total = sum(result['total'] for result in screening['models'])
+    print(f"Screening asked {answered} of {total} questions ({answered / max(total, 1):.1%})")
+    with open('./results/HuggingFace/screening.json', 'w') as f:
+        json.dump(screening, f, indent=4)
+    return screening
+
 def main():
-    with open("./data/chem_mqa_dataset.json", "r") as f:
-        dataset = json.load(f)
+    dataset = load_packed("./data/chem_mqa_dataset.json")
 
     overall_stats = {}
     os.makedirs('./results/HuggingFace', exist_ok=True)
@@ -130,21 +259,28 @@ def main():
 
     for modality, models in model_types.items():
         modality_results = []
+        modality_correct = {}
         for model_name in tqdm(models, desc=f"Evaluating models for {modality}"):
             try:
-                print(f"Evaluating {model_name} with modality {modality}")
-                correct_count, wrong_count, unparsable_count, results = evaluate_model(model_name, modality, dataset)
+                precision = model_precisions.get(model_name, "fp32")
+                print(f"Evaluating {model_name} with modality {modality} at {precision}")
+                classifier = None
+                if precision != "fp32":
+                    classifier = check_precision(model_name, modality, dataset, precision, "./results/HuggingFace/precision_report.json")
+                correct_count, wrong_count, unparsable_count, results = evaluate_model(model_name, modality, dataset, precision, classifier)
                 modality_results.append({
                     'model_name': model_name,
+                    'precision': precision,
                     'correct': correct_count,
                     'wrong': wrong_count,
                     'unparsable': unparsable_count
                 })
+                modality_correct[model_name] = {result['question_id']: result['is_correct'] for result in results}
 
                 # Save individual model results to CSV
-                csv_filename = f"./results/HuggingFace/{model_name.replace('/', '_')}_results.csv"
+                csv_filename = f"./results/HuggingFace/{result_stem(model_name, precision)}_results.csv"
                 with open(csv_filename, 'w', newline='') as csvfile:
-                    fieldnames = ['question_id', 'prompt', 'generated_answer', 'is_correct', 'is_unparsable']
+                    fieldnames = ['question_id', 'prompt', 'generated_answer', 'is_correct', 'is_unparsable'] + TELEMETRY_FIELDS
                     writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
 
                     writer.writeheader()
@@ -157,27 +293,28 @@ def main():
 
         overall_stats[modality] = modality_results
 
-        # Plotting and saving results with standard deviation
-        labels = [res['model_name'].split('/')[-1] for res in modality_results]
-        corrects = np.array([res['correct'] for res in modality_results])
-        wrongs = np.array([res['wrong'] for res in modality_results])
-        unparsables = np.array([res['unparsable'] for res in modality_results])
-
-        mean_correct = np.mean(corrects)
-        mean_wrongs = np.mean(wrongs)
-        mean_unparsables = np.mean(unparsables)
+        # Paired tests between the models of this modality on the questions they all answered
+        if len(modality_correct) > 1:
+            shared = set.intersection(*(set(answers) for answers in modality_correct.values()))
+            question_ids = sorted(shared)
+            correct = np.array([[modality_correct[model][q] for model in modality_correct] for q in question_ids], dtype=bool)
+            write_pairwise_csv(f"./results/HuggingFace/{modality}_significance.csv", list(modality_correct),
+                               pairwise_tests(correct.reshape(len(question_ids), len(modality_correct))))
 
-        std_dev_correct = np.std(corrects)
-        std_dev_wrongs = np.std(wrongs)
-        std_dev_unparsables = np.std(unparsables)
+        # Plotting with per-model 95% bootstrap confidence intervals
+        labels = [res['model_name'].split('/')[-1] for res in modality_results]
+        counts = np.array([[res['correct'], res['wrong'], res['unparsable']] for res in modality_results]).reshape(-1, 3)
+        lower, upper = bootstrap_counts_ci(counts)
+        errors = np.stack([counts - lower, upper - counts])
+        corrects, wrongs, unparsables = counts.T
 
         x = np.arange(len(labels))  # the label locations
         width = 0.25  # the width of the bars
 
         fig, ax = plt.subplots()
-        rects1 = ax.bar(x - width, corrects, width, label='Correct', color='green', yerr=std_dev_correct)
-        rects2 = ax.bar(x, wrongs, width, label='Wrong', color='red', yerr=std_dev_wrongs)
-        rects3 = ax.bar(x + width, unparsables, width, label='Unparsable', color='blue', yerr=std_dev_unparsables)
+        rects1 = ax.bar(x - width, corrects, width, label='Correct', color='green', yerr=errors[:, :, 0])
+        rects2 = ax.bar(x, wrongs, width, label='Wrong', color='red', yerr=errors[:, :, 1])
+        rects3 = ax.bar(x + width, unparsables, width, label='Unparsable', color='blue', yerr=errors[:, :, 2])
 
         ax.set_ylabel('Counts')
         ax.set_title(f'Performance of {modality} Models')
@@ -195,4 +332,18 @@ def main():
         json.dump(overall_stats, f, indent=4)
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Benchmark HuggingFace models on the multiple-choice questions.")
+    parser.add_argument('--screen', action='store_true', help='Adaptive early-stopping screening instead of full runs')
+    parser.add_argument('--threshold', type=float, help='Screening threshold (default: majority-answer accuracy)')
+    parser.add_argument('--alpha', type=float, default=0.05, help='Overall error rate of the screening decisions')
+    parser.add_argument('--int8', type=str, nargs='+', default=[], metavar='MODEL',
+                        help='Models to run dynamically quantized to INT8 instead of fp32')
+    args = parser.parse_args()
+    model_precisions.update({model_name: "int8" for model_name in args.int8})
+
+    if args.screen:
+        dataset = load_packed("./data/chem_mqa_dataset.json")
+        os.makedirs('./results/HuggingFace', exist_ok=True)
+        screen_models(dataset, args.threshold, args.alpha)
+    else:
+        main()
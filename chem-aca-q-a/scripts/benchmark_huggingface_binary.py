@@ -1,19 +1,23 @@
+import argparse
 import json
 import csv
 from tqdm import tqdm
-from transformers import pipeline
 import torch
 import os
 import logging
 
-from api_keys.api_keys import key_openai
-from openai import OpenAI
+from .judge import judge_responses
+from .llm import BudgetExceeded
+from .packed_dataset import load_packed
+from .model_server import RemotePipeline, build_pipeline, server_address
+from .quantization import compare_precisions, quantize_pipeline, record_comparison
+from .results_store import result_stem
+from .telemetry import timed_call
+from .tracing import traced
 
 # Setting up logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
-client = OpenAI(api_key=key_openai)
-
 device = 0 if torch.cuda.is_available() else -1
 logging.debug(f"Using device: {device}")
 
@@ -53,103 +57,160 @@ model_types = {
 }
 
 def gpt_evaluate(question, model_answer):
-    full_prompt = [
-        {"role": "system", "content": "Classify the response as 'True' or 'False'."},
-        {"role": "user", "content": f"Question: {question}. Model's response: {model_answer}"},
-    ]
-    try:
-        completion = client.chat.completions.create(
-                        model="gpt-3.5-turbo",
-                        prompt=full_prompt,
-                        max_tokens=5,
-                        temperature=0.0
-                    )
-        return completion.choices[0].message.content.strip().lower()
-    
-    except Exception as e:
-        logging.error(f"GPT evaluation failed: {str(e)}")
-        return None
+    """Judge a single response; `evaluate_model` judges all of a model's responses in batches instead."""
+    return judge_responses([(str(question), model_answer)])[0]
+
+# CPU inference precision per model ("fp32" if absent). "int8" dynamically quantizes the linear layers;
+# opt in with --int8 MODEL. Quantized runs are saved under their own result files.
+model_precisions = {}
+# Questions on which a quantized model is also run in fp32 to measure its accuracy delta
+PRECISION_CHECK_QUESTIONS = 200
+
+# Hypothesis the zero-shot-classification pipeline builds for every candidate label
+HYPOTHESIS_TEMPLATE = "This example is {}."
+BINARY_LABELS = ["true", "false"]
+
+def build_prompt(details):
+    return f"{details['Context']} {details['Question']}. Is the following statement true or false?"
+
+def tokenizer_inputs(modality, questions):
+    """Every input the pipeline of `modality` will tokenize, once each, in a stable order.
+
+    The prompt is the same for the four choices of a question, so one cached entry serves all four calls.
+    """
+    inputs = []
+    for question_data in questions:
+        for question_id, details in question_data.items():
+            if question_id.startswith("Question"):
+                prompt = build_prompt(details)
+                if modality == "zero-shot-classification":
+                    inputs.extend((prompt, HYPOTHESIS_TEMPLATE.format(label)) for label in BINARY_LABELS)
+                elif modality == "text-generation":
+                    inputs.append(prompt)
+    return list(dict.fromkeys(inputs))
+
+@traced("model_load", "model_name", "modality", "precision")
+def load_pipeline(model_name, modality, questions, precision="fp32"):
+    """Build the pipeline at the given precision, sharing pre-tokenized inputs with models that use the same tokenizer.
+
+    If CHEM_QA_MODEL_SERVER is set, the warm pipeline of the model server is used instead of loading one here.
+    """
+    inputs = tokenizer_inputs(modality, questions)
+    if server_address():
+        return RemotePipeline(model_name, modality, precision, inputs)
+    return build_pipeline(model_name, modality, precision, inputs)
+
+def check_precision(model_name, modality, questions, precision, report_path):
+    """Run a model at fp32 and at `precision` on the same questions and record the accuracy delta and speed-up.
+
+    The checkpoint is loaded once: after the fp32 run its pipeline is quantized in place (a
+    model server keeps one warm pipeline per precision instead).
 
-def evaluate_model(model_name, modality, questions):
+    Returns:
+        The pipeline at `precision`, for the full evaluation.
+    """
+    subset = [questions[i] for i in range(min(PRECISION_CHECK_QUESTIONS, len(questions)))]
+    pipelines = {}
+
+    def run(mode):
+        if mode == "fp32" or server_address():
+            pipelines[mode] = load_pipeline(model_name, modality, questions, mode)
+        else:
+            pipelines[mode] = quantize_pipeline(pipelines["fp32"], mode)
+        return evaluate_model(model_name, modality, subset, mode, pipelines[mode])[3]
+
+    record_comparison(report_path, compare_precisions(run, model_name, modality, precision, len(subset)))
+    return pipelines[precision]
+
+@traced("evaluate_model", "model_name", "modality", "precision")
+def evaluate_model(model_name, modality, questions, precision="fp32", classifier=None):
+    """Ask every choice of every question; `classifier` is a pipeline already loaded at `precision` (loaded here if None)."""
     logging.debug(f"Starting evaluation for model {model_name} with modality {modality}")
     try:
-        classifier = pipeline(modality, model=model_name, device=device)
+        if classifier is None:
+            classifier = load_pipeline(model_name, modality, questions, precision)
     except Exception as e:
         logging.error(f"Error initializing model {model_name} with modality {modality}: {e}")
         return 0, 0, 0, [], []
 
     results = []
     gpt_results = []
-    correct_count = 0
-    wrong_count = 0
-    unparsable_count = 0
+    counts = {'correct': 0, 'wrong': 0, 'unparsable': 0}
+
+    def score(question_id, option_label, prompt, expected_answer, generated_answer, telemetry):
+        correct_answer = "true" if option_label == expected_answer else "false"
+        is_correct = generated_answer == correct_answer
+
+        logging.debug(f"Model {model_name}: Question {question_id}, Choice {option_label}, Generated Answer: {generated_answer}, Is Correct: {is_correct}")
+
+        if generated_answer not in ["true", "false"]:
+            generated_answer = 'Unparsable'
+            counts['unparsable'] += 1
+        elif is_correct:
+            counts['correct'] += 1
+        else:
+            counts['wrong'] += 1
+
+        results.append({
+            'question_id': question_id,
+            'choice_label': option_label,
+            'prompt': prompt,
+            'generated_answer': generated_answer,
+            'is_correct': is_correct,
+            **telemetry
+        })
+
+    # Text-generation answers are free text: they are collected here and judged in batches after the loop
+    to_judge = []
 
     for question_data in tqdm(questions, desc="Processing Questions"):
         for question_id, details in question_data.items():
             if question_id.startswith("Question"):
                 logging.debug(f"The question: \n {details}")
                 logging.debug("="*50)
-                context = details['Context']
-                question = details['Question']
                 expected_answer = details['Answer']
 
                 for option_label, choice in zip(['A', 'B', 'C', 'D'], [details['A'], details['B'], details['C'], details['D']]):
-                    prompt = f"{context} {question}. Is the following statement true or false?"
-                    choices = ["true", "false"]
+                    prompt = build_prompt(details)
+                    choices = BINARY_LABELS
 
                     try:                        
                         if modality == "zero-shot-classification":
-                            result = classifier(prompt, candidate_labels=choices)
+                            result, telemetry = timed_call(classifier, prompt, candidate_labels=choices,
+                                                           hypothesis_template=HYPOTHESIS_TEMPLATE)
                             max_score_index = result['scores'].index(max(result['scores']))
-                            generated_answer = choices[max_score_index]
+                            score(question_id, option_label, prompt, expected_answer, choices[max_score_index], telemetry)
 
                         elif modality == "text-generation":
-                            result = classifier(prompt, num_return_sequences=1)
-                            generated_answer = result[0]['generated_text'][0]
-                            gpt_classification = gpt_evaluate(details, choice + " is " + generated_answer)
-                            logging.debug(f"Model {model_name}: GPT-4 Classification for Question {question_id}, Choice {option_label}: {gpt_classification}")
-
-
-                            gpt_results.append({
-                                'question_id': question_id,
-                                'choice_label': option_label,
-                                'prompt': prompt,
-                                'generated_answer': generated_answer,
-                                'gpt_classification': gpt_classification
-                            })
-                        
-                        print(f"Result: {result}")
-
-                        correct_answer = "true" if option_label == expected_answer else "false"
-                        is_correct = generated_answer == correct_answer
-
-                        logging.debug(f"Model {model_name}: Question {question_id}, Choice {option_label}, Generated Answer: {generated_answer}, Is Correct: {is_correct}")
+                            result, telemetry = timed_call(classifier, prompt, num_return_sequences=1)
+                            to_judge.append((question_id, option_label, prompt, expected_answer,
+                                             choice + " is " + result[0]['generated_text'], telemetry))
 
-                        if generated_answer not in ["true", "false"]:
-                            generated_answer = 'Unparsable'
-                            unparsable_count += 1
-                        elif is_correct:
-                            correct_count += 1
-                        else:
-                            wrong_count += 1
-
-                        results.append({
-                            'question_id': question_id,
-                            'choice_label': option_label,
-                            'prompt': prompt,
-                            'generated_answer': generated_answer,
-                            'is_correct': is_correct
-                        })
+                        print(f"Result: {result}")
 
                     except Exception as e:
                         logging.error(f"Error processing question {question_id} in model {model_name}: {e}")
 
+    if to_judge:
+        verdicts = judge_responses([(prompt, response) for _, _, prompt, _, response, _ in to_judge])
+        for (question_id, option_label, prompt, expected_answer, response, telemetry), verdict in zip(to_judge, verdicts):
+            logging.debug(f"Model {model_name}: GPT Classification for Question {question_id}, Choice {option_label}: {verdict}")
+            gpt_results.append({
+                'question_id': question_id,
+                'choice_label': option_label,
+                'prompt': prompt,
+                'generated_answer': response,
+                'gpt_classification': verdict,
+                **telemetry
+            })
+            score(question_id, option_label, prompt, expected_answer, verdict, telemetry)
+
+    correct_count, wrong_count, unparsable_count = counts['correct'], counts['wrong'], counts['unparsable']
     return correct_count, wrong_count, unparsable_count, results, gpt_results
 
 def main(save_files=1):
     logging.debug("Loading dataset")
-    with open("./data/chem_mqa_dataset.json", "r") as f:
-        dataset = json.load(f)
+    dataset = load_packed("./data/chem_mqa_dataset.json")
 
     overall_stats = {}
     if save_files:
@@ -159,20 +220,27 @@ def main(save_files=1):
         modality_results = []
         for model_name in tqdm(models, desc=f"Evaluating models for {modality}"):
             try:
-                correct_count, wrong_count, unparsable_count, results, gpt_results = evaluate_model(model_name, modality, dataset)
+                precision = model_precisions.get(model_name, "fp32")
+                classifier = None
+                if precision != "fp32" and save_files:
+                    classifier = check_precision(model_name, modality, dataset, precision, "./results/Binary/precision_report.json")
+                correct_count, wrong_count, unparsable_count, results, gpt_results = evaluate_model(model_name, modality, dataset, precision, classifier)
                 modality_results.append({
                     'model_name': model_name,
+                    'precision': precision,
                     'correct': correct_count,
                     'wrong': wrong_count,
                     'unparsable': unparsable_count
                 })
 
                 if save_files:
-                    csv_filename = f"./results/Binary/{model_name.replace('/', '_')}_results.csv"
-                    gpt_csv_filename = f"./results/Binary/{model_name.replace('/', '_')}_gpt4_results.csv"
+                    csv_filename = f"./results/Binary/{result_stem(model_name, precision)}_results.csv"
+                    gpt_csv_filename = f"./results/Binary/{result_stem(model_name, precision)}_gpt4_results.csv"
                     save_results(csv_filename, results)
                     save_results(gpt_csv_filename, gpt_results)
 
+            except BudgetExceeded:
+                raise
             except Exception as e:
                 logging.error(f"Failed to evaluate model {model_name} due to: {e}")
 
@@ -182,6 +250,7 @@ def main(save_files=1):
         with open('./results/Binary/overall_stats.json', 'w') as f:
             json.dump(overall_stats, f, indent=4)
 
+@traced("save_results")
 def save_results(filename, data):
     logging.debug(f"Saving results to {filename}")
     with open(filename, 'w', newline='') as csvfile:
@@ -192,4 +261,9 @@ def save_results(filename, data):
             writer.writerow(result)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark HuggingFace models on the true/false choice questions.")
+    parser.add_argument('--int8', type=str, nargs='+', default=[], metavar='MODEL',
+                        help='Models to run dynamically quantized to INT8 instead of fp32')
+    args = parser.parse_args()
+    model_precisions.update({model_name: "int8" for model_name in args.int8})
     main(1)
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""Ledger of every LLM call: tokens, latency and cost, by model, script and paper/question.
+
+The shared client (`llm.get_client`) appends one row per completion to
+`results/llm_ledger.sqlite` (or `$CHEM_QA_LLM_LEDGER`). SQLite in WAL mode takes appends
+from any thread or process. A trigger keeps daily totals per model and script current,
+so rollups and the budget check read a few rows however long the ledger grows.
+
+    python -m scripts.cost_ledger                        # totals by model
+    python -m scripts.cost_ledger --by script day --since 2024-06-01
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+DEFAULT_LEDGER_PATH = os.environ.get('CHEM_QA_LLM_LEDGER', os.path.join(os.path.dirname(__file__), '..', 'results', 'llm_ledger.sqlite'))
+
+ROLLUP_KEYS = ('model', 'script', 'day')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY,
+    at REAL NOT NULL,
+    day TEXT NOT NULL,
+    model TEXT NOT NULL,
+    script TEXT NOT NULL,
+    item TEXT,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    latency REAL NOT NULL,
+    cost REAL NOT NULL,
+    cached INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS calls_item ON calls (item);
+CREATE TABLE IF NOT EXISTS daily_totals (
+    day TEXT NOT NULL,
+    model TEXT NOT NULL,
+    script TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    cached INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    latency REAL NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, model, script)
+);
+CREATE TRIGGER IF NOT EXISTS calls_total AFTER INSERT ON calls BEGIN
+    INSERT INTO daily_totals (day, model, script) SELECT new.day, new.model, new.script
+        WHERE NOT EXISTS (SELECT 1 FROM daily_totals WHERE day = new.day AND model = new.model AND script = new.script);
+    UPDATE daily_totals SET calls = calls + 1, cached = cached + new.cached,
+        prompt_tokens = prompt_tokens + new.prompt_tokens, completion_tokens = completion_tokens + new.completion_tokens,
+        latency = latency + new.latency, cost = cost + new.cost
+        WHERE day = new.day AND model = new.model AND script = new.script;
+END;
+"""
+
+def current_script() -> str:
+    """Name of the running program, e.g. `q_a_4` for `python -m scripts.q_a_4`."""
+    return os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0] or 'python'
+
+class CostLedger:
+    """Append-only record of LLM calls; every thread gets its own connection.
+
+    Args:
+        db_path (str): SQLite file of the ledger.
+        script (Optional[str]): Script the calls are booked to (default: the running program).
+    """
+
+    def __init__(self, db_path: str = DEFAULT_LEDGER_PATH, script: Optional[str] = None):
+        self.db_path = db_path
+        self.script = script or current_script()
+        self._local = threading.local()
+        folder = os.path.dirname(db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def record(self, spec: str, completion, item: Optional[str] = None) -> None:
+        """Append one call. `completion` is an `llm.Completion`; the signature is that of
+        an `LLMClient` listener."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT INTO calls (at, day, model, script, item, prompt_tokens, completion_tokens, latency, cost, cached) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         (now, time.strftime('%Y-%m-%d', time.gmtime(now)), spec, self.script, item,
+                          completion.prompt_tokens, completion.completion_tokens, completion.latency,
+                          completion.cost, int(completion.cached)))
+
+    def rollup(self, by: Sequence[str] = ('model',), since: Optional[str] = None, **filters) -> List[Dict]:
+        """Totals grouped by any of model, script and day (UTC), most expensive first.
+
+        Args:
+            by (Sequence[str]): Grouping keys.
+            since (Optional[str]): First day to include, `YYYY-MM-DD`.
+            **filters: Exact matches on model, script or day.
+        """
+        unknown = set(by) - set(ROLLUP_KEYS) or set(filters) - set(ROLLUP_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown rollup keys {sorted(unknown)}; use {ROLLUP_KEYS}")
+        conditions, parameters = [], []
+        if since:
+            conditions.append("day >= ?")
+            parameters.append(since)
+        for key, value in filters.items():
+            conditions.append(f"{key} = ?")
+            parameters.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        keys = ', '.join(by)
+        rows = self._connect().execute(
+            f"SELECT {keys + ',' if keys else ''} SUM(calls), SUM(cached), SUM(prompt_tokens), SUM(completion_tokens), "
+            f"SUM(latency), SUM(cost) FROM daily_totals {where} {'GROUP BY ' + keys if keys else ''} "
+            f"ORDER BY SUM(cost) DESC", parameters).fetchall()
+        totals = []
+        for row in rows:
+            calls, cached, prompt_tokens, completion_tokens, latency, cost = row[len(by):]
+            if not calls:
+                continue
+            totals.append({**dict(zip(by, row)), 'calls': calls, 'cached': cached, 'prompt_tokens': prompt_tokens,
+                           'completion_tokens': completion_tokens, 'mean_latency': latency / calls, 'cost': cost})
+        return totals
+
+    def total_cost(self, since: Optional[str] = None, **filters) -> float:
+        totals = self.rollup(by=(), since=since, **filters)
+        return totals[0]['cost'] if totals else 0.0
+
+    def item_cost(self, item: str) -> float:
+        """Cost of all calls booked to one paper or question."""
+        return self._connect().execute("SELECT COALESCE(SUM(cost), 0) FROM calls WHERE item = ?", (item,)).fetchone()[0]
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll up the LLM cost ledger.")
+    parser.add_argument('--db', type=str, default=DEFAULT_LEDGER_PATH, help='Ledger file')
+    parser.add_argument('--by', nargs='+', choices=ROLLUP_KEYS, default=['model'], help='Grouping keys')
+    parser.add_argument('--since', type=str, help='First day (YYYY-MM-DD, UTC)')
+    args = parser.parse_args()
+
+    ledger = CostLedger(args.db, script='cost_ledger')
+    totals = ledger.rollup(args.by, args.since)
+    for row in totals:
+        label = '  '.join(str(row[key]) for key in args.by)
+        print(f"{label:50s} {row['calls']:8d} calls ({row['cached']} cached)  "
+              f"{row['prompt_tokens']:10d} + {row['completion_tokens']:9d} tokens  "
+              f"{row['mean_latency'] * 1000:8.1f} ms/call  ${row['cost']:.4f}")
+    print(f"Total: ${sum(row['cost'] for row in totals):.4f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import csv
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+FIELDNAMES = [
+    'DOI', 'Title', 'Abstract', 'Journal', 'Relevant fields',
+    'Authors', 'Keywords', 'Institute of Origin', 'Funding',
+    'Methods', 'Results', 'Experiment details'
+]
+
+_registries: Dict[str, "DOIRegistry"] = {}
+_registries_lock = threading.Lock()
+
+# File extensions dropped from saved papers' names; anything else after a dot is part of the DOI
+PAPER_EXTENSIONS = ('.pdf', '.txt')
+
+def doi_key(doi: str) -> str:
+    """Normalise a DOI, DOI URL or saved paper path to the key used for deduplication.
+
+    PDFs are saved under the last path segment of their DOI (e.g. `s13765-023-00816-z.pdf`
+    or `acsomega.3c01234`), while the CSV stores the full `https://doi.org/...` URL; all
+    map to the same key. Only a `.pdf`/`.txt` extension is removed, since DOI suffixes
+    may themselves contain dots.
+    """
+    key = doi.strip().rstrip('/').rsplit('/', 1)[-1]
+    stem, extension = os.path.splitext(key)
+    if extension.lower() in PAPER_EXTENSIONS:
+        key = stem
+    return key.lower()
+
+class DOIRegistry:
+    """SQLite-backed set of processed DOIs with atomic check-and-insert.
+
+    Each DOI is a primary key, so `claim` is a single `INSERT OR IGNORE` and costs
+    constant time no matter how many papers have been crawled. SQLite's file locking
+    makes the registry safe to share between processes; every thread gets its own
+    connection.
+    """
+
+    def __init__(self, db_path: str, seed_csv: Optional[str] = None):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._export_lock = threading.Lock()
+        folder = os.path.dirname(db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS articles (
+                doi TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                record TEXT
+            )""")
+        if seed_csv:
+            self.import_csv(seed_csv)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def __contains__(self, doi: str) -> bool:
+        row = self._connect().execute("SELECT 1 FROM articles WHERE doi = ?", (doi_key(doi),)).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    def claim(self, doi: str) -> bool:
+        """Atomically reserve a DOI for processing.
+
+        Returns:
+            bool: True if the caller now owns the DOI, False if it was already claimed or done.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute("INSERT OR IGNORE INTO articles (doi, status) VALUES (?, 'claimed')", (doi_key(doi),))
+        return cursor.rowcount == 1
+
+    def complete(self, doi: str, record: Dict[str, str]) -> None:
+        """Mark a claimed DOI as done and store its CSV row."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO articles (doi, status, record) VALUES (?, 'done', ?) "
+                "ON CONFLICT(doi) DO UPDATE SET status = 'done', record = excluded.record",
+                (doi_key(doi), json.dumps(record)),
+            )
+
+    def release(self, doi: str) -> None:
+        """Drop a claim that did not complete so that a later run can retry it."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM articles WHERE doi = ? AND status = 'claimed'", (doi_key(doi),))
+
+    def release_stale_claims(self) -> int:
+        """Release claims left behind by a crashed run. Call before starting a new crawl."""
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM articles WHERE status = 'claimed'")
+        return cursor.rowcount
+
+    def import_csv(self, csv_path: str) -> int:
+        """Mark every DOI of an existing articles CSV as done."""
+        if not os.path.exists(csv_path):
+            return 0
+        with open(csv_path, 'r', newline='', encoding='utf-8') as csvfile:
+            rows = [(doi_key(row['DOI']), json.dumps(row)) for row in csv.DictReader(csvfile) if row.get('DOI')]
+        with self._connect() as conn:
+            cursor = conn.executemany("INSERT OR IGNORE INTO articles (doi, status, record) VALUES (?, 'done', ?)", rows)
+        return cursor.rowcount
+
+    def export_csv(self, csv_path: str) -> int:
+        """Write all completed records to `csv_path`, replacing it atomically.
+
+        Returns:
+            int: The number of rows written.
+        """
+        rows = self._connect().execute("SELECT record FROM articles WHERE status = 'done' ORDER BY rowid").fetchall()
+        tmp_path = f"{csv_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._export_lock:
+            with open(tmp_path, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES, extrasaction='ignore')
+                writer.writeheader()
+                for (record,) in rows:
+                    writer.writerow(json.loads(record))
+            os.replace(tmp_path, csv_path)
+        return len(rows)
+
+def registry_path(csv_path: str) -> str:
+    """The SQLite file that backs the registry for a given articles CSV."""
+    return os.path.splitext(csv_path)[0] + ".sqlite"
+
+def get_registry(csv_path: str) -> DOIRegistry:
+    """Return the process-wide registry for `csv_path`, seeding it from the CSV on first use."""
+    with _registries_lock:
+        registry = _registries.get(csv_path)
+        if registry is None:
+            path = registry_path(csv_path)
+            registry = DOIRegistry(path, seed_csv=None if os.path.exists(path) else csv_path)
+            _registries[csv_path] = registry
+        return registry
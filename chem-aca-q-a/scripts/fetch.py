@@ -0,0 +1,195 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .scheduler import PolitenessScheduler
+
+DEFAULT_HEADERS = {
+    "User-Agent": "chem-aca-q-a/0.1 (+https://github.com/BlueVelvetSackOfGoldPotatoes/chem-aca-q-a)"
+}
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+def _release_on_close(response: requests.Response, semaphore: threading.BoundedSemaphore) -> None:
+    """Release `semaphore` once, when `response` is closed (`with response:` closes it)."""
+    close = response.close
+    # Acquired by the first close only
+    once = threading.Lock()
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            if once.acquire(blocking=False):
+                semaphore.release()
+    response.close = close_and_release
+
+class Fetcher:
+    """Shared HTTP client for the scrapers.
+
+    One `requests.Session` keeps connections alive and pools them per host, so listing
+    pages, article pages and PDFs from the same publisher reuse a TCP/TLS connection.
+    A semaphore per host caps how many requests run against it at once.
+
+    Args:
+        max_per_host (int): Default number of concurrent requests per host.
+        pool_size (int): Connections kept alive per host.
+        timeout (float): Per-request timeout in seconds.
+        retries (int): Retries for connection errors and 429/5xx responses.
+        host_limits (Dict[str, int]): Per-host overrides of `max_per_host`.
+        scheduler (Optional[PolitenessScheduler]): Paces requests per host and supplies the
+            per-host concurrency of hosts without an entry in `host_limits`.
+    """
+
+    def __init__(self, max_per_host: int = 4, pool_size: int = 10, timeout: float = 30.0, retries: int = 3,
+                 host_limits: Optional[Dict[str, int]] = None, headers: Optional[Dict[str, str]] = None,
+                 scheduler: Optional[PolitenessScheduler] = None):
+        self.max_per_host = max_per_host
+        self.scheduler = scheduler
+        self.timeout = timeout
+        self.host_limits = dict(host_limits or {})
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=("GET", "HEAD"))
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def set_host_limit(self, host: str, limit: int) -> None:
+        """Change the concurrency budget of a host. Takes effect for hosts not yet contacted."""
+        with self._lock:
+            self.host_limits[host.lower()] = limit
+            self._semaphores.pop(host.lower(), None)
+
+    def _semaphore(self, url: str) -> threading.BoundedSemaphore:
+        host = host_of(url)
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                default = self.scheduler.policy(host).concurrency if self.scheduler else self.max_per_host
+                semaphore = threading.BoundedSemaphore(self.host_limits.get(host, default))
+                self._semaphores[host] = semaphore
+            return semaphore
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """GET `url` through the pooled session, waiting for a free slot on its host.
+
+        With `stream=True` the body is still to be read when this returns, so the slot is
+        held until the response is closed. Use the response as a context manager (or call
+        `close()`) so that the host's other requests can go ahead.
+
+        Raises:
+            DisallowedByRobots: If a scheduler is set and robots.txt forbids the URL.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        semaphore = self._semaphore(url)
+        semaphore.acquire()
+        try:
+            if self.scheduler:
+                self.scheduler.wait(url, self.session)
+            response = self.session.get(url, **kwargs)
+        except BaseException:
+            semaphore.release()
+            raise
+        if not kwargs.get("stream"):
+            semaphore.release()
+            return response
+        _release_on_close(response, semaphore)
+        return response
+
+    def map(self, fn: Callable, items: Iterable, max_workers: int = 5) -> List:
+        """Run `fn` over `items` on a thread pool and return the results in order."""
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(fn, items))
+
+    def close(self) -> None:
+        self.session.close()
+
+_default_fetcher: Optional[Fetcher] = None
+_default_lock = threading.Lock()
+
+def get_fetcher() -> Fetcher:
+    """Return the process-wide fetcher, creating it with default settings on first use."""
+    global _default_fetcher
+    with _default_lock:
+        if _default_fetcher is None:
+            _default_fetcher = Fetcher()
+        return _default_fetcher
+
+def configure_fetcher(**kwargs) -> Fetcher:
+    """Replace the process-wide fetcher, e.g. to change per-host limits before a crawl."""
+    global _default_fetcher
+    with _default_lock:
+        if _default_fetcher is not None:
+            _default_fetcher.close()
+        _default_fetcher = Fetcher(**kwargs)
+        return _default_fetcher
+
+class AsyncFetcher:
+    """asyncio counterpart of `Fetcher` built on aiohttp.
+
+    Use as an async context manager:
+
+        async with AsyncFetcher(max_per_host=4) as fetcher:
+            pages = await fetcher.fetch_all(urls)
+    """
+
+    def __init__(self, max_per_host: int = 4, max_total: int = 100, timeout: float = 30.0,
+                 host_limits: Optional[Dict[str, int]] = None, headers: Optional[Dict[str, str]] = None):
+        self.max_per_host = max_per_host
+        self.max_total = max_total
+        self.timeout = timeout
+        self.host_limits = dict(host_limits or {})
+        self.headers = headers or DEFAULT_HEADERS
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.session = None
+
+    async def __aenter__(self) -> "AsyncFetcher":
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(limit=self.max_total, limit_per_host=self.max_per_host, keepalive_timeout=30)
+        self.session = aiohttp.ClientSession(connector=connector, headers=self.headers,
+                                             timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.session.close()
+
+    def _semaphore(self, url: str) -> asyncio.Semaphore:
+        host = host_of(url)
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.host_limits.get(host, self.max_per_host))
+            self._semaphores[host] = semaphore
+        return semaphore
+
+    async def get(self, url: str, **kwargs) -> Optional[bytes]:
+        """Return the body of `url`, or None on a non-200 status."""
+        async with self._semaphore(url):
+            async with self.session.get(url, **kwargs) as response:
+                if response.status != 200:
+                    print(f"Error {response.status} while fetching {url}")
+                    return None
+                return await response.read()
+
+    async def fetch_all(self, urls: Iterable[str]) -> List[Optional[bytes]]:
+        """Fetch many URLs concurrently within the per-host limits. Results keep the input order."""
+        return await asyncio.gather(*(self.get(url) for url in urls))
+
+def fetch_all(urls: Iterable[str], **kwargs) -> List[Optional[bytes]]:
+    """Synchronous entry point to `AsyncFetcher.fetch_all`."""
+    async def run():
+        async with AsyncFetcher(**kwargs) as fetcher:
+            return await fetcher.fetch_all(urls)
+    return asyncio.run(run())
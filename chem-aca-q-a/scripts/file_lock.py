@@ -0,0 +1,25 @@
+"""Exclusive lock across processes, for caches that several workers may build at once.
+
+    with file_lock(out_dir + ".lock"):
+        if not up_to_date(out_dir):
+            build(out_dir)
+
+The lock is `fcntl.flock` on a small file next to what it guards; the kernel drops it
+when the holder exits, so a crashed worker never leaves it held.
+"""
+import fcntl
+import os
+from contextlib import contextmanager
+from typing import Iterator
+
+@contextmanager
+def file_lock(lock_path: str) -> Iterator[None]:
+    folder = os.path.dirname(lock_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(lock_path, 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,190 @@
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import requests
+
+from .fetch import Fetcher
+
+@dataclass
+class StopConditions:
+    """When a scraper should stop walking a listing.
+
+    Attributes:
+        max_seen (Optional[int]): Stop paging after this many consecutive articles that were
+            already downloaded in an earlier run. Listings are newest-first, so a run of known
+            articles means the rest of the listing is old content.
+        max_pages (Optional[int]): Never fetch more than this many listing pages per link.
+    """
+    max_seen: Optional[int] = None
+    max_pages: Optional[int] = None
+
+class CrawlFrontier:
+    """Persistent record of what earlier crawls have already seen.
+
+    Stores the ETag/Last-Modified validators of every listing page whose articles were all
+    downloaded, with the page's next link and article count, so re-scrapes can use
+    conditional GETs and still page past an unchanged page. Also stores the status of every article ('done' or 'failed'), so known
+    articles are skipped. Backed by SQLite like `DOIRegistry`, and safe to share between
+    the scraper threads.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        folder = os.path.dirname(db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                next_url TEXT,
+                articles INTEGER NOT NULL DEFAULT 0
+            )""")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(pages)")}
+            # Frontiers written before next_url/articles were stored
+            if 'next_url' not in columns:
+                conn.execute("ALTER TABLE pages ADD COLUMN next_url TEXT")
+            if 'articles' not in columns:
+                conn.execute("ALTER TABLE pages ADD COLUMN articles INTEGER NOT NULL DEFAULT 0")
+            conn.execute("""CREATE TABLE IF NOT EXISTS articles (
+                url TEXT PRIMARY KEY,
+                journal TEXT,
+                status TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def validators(self, url: str) -> Dict[str, str]:
+        """Conditional-request headers for a previously fetched page."""
+        row = self._connect().execute("SELECT etag, last_modified FROM pages WHERE url = ?", (url,)).fetchone()
+        headers = {}
+        if row and row[0]:
+            headers['If-None-Match'] = row[0]
+        if row and row[1]:
+            headers['If-Modified-Since'] = row[1]
+        return headers
+
+    def record_page(self, url: str, response: requests.Response, next_url: Optional[str], articles: int) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, fetched_at, next_url, articles) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, response.headers.get('ETag'), response.headers.get('Last-Modified'), time.time(), next_url,
+                 articles),
+            )
+
+    def forget_page(self, url: str) -> None:
+        """Drop a page's validators so that the next crawl fetches it in full."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+
+    def page_summary(self, url: str) -> Tuple[Optional[str], int]:
+        """(next link, article count) of a page as recorded by the last crawl."""
+        row = self._connect().execute("SELECT next_url, articles FROM pages WHERE url = ?", (url,)).fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+
+    def article_status(self, url: str) -> Optional[str]:
+        row = self._connect().execute("SELECT status FROM articles WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def mark_article(self, url: str, status: str, journal: Optional[str] = None) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO articles (url, journal, status, updated_at) VALUES (?, ?, ?, ?)",
+                (url, journal, status, time.time()),
+            )
+
+class ListingCrawl:
+    """Bookkeeping for one scraper walking one listing link.
+
+    Works without a frontier too, in which case nothing is skipped and only
+    `StopConditions.max_pages` applies.
+    """
+
+    def __init__(self, frontier: Optional[CrawlFrontier], stop: Optional[StopConditions] = None, journal_name: Optional[str] = None):
+        self.frontier = frontier
+        self.stop = stop or StopConditions()
+        self.journal_name = journal_name
+        self.pages = 0
+        self.seen_streak = 0
+        self.skipped = 0
+        self.page_failures = 0
+
+    def fetch_page(self, fetcher: Fetcher, url: str) -> Optional[requests.Response]:
+        """GET a listing page, conditionally if it was fetched in full before.
+
+        Returns:
+            requests.Response: The response; a 304 is handled with `page_unchanged`.
+        """
+        headers = self.frontier.validators(url) if self.frontier else {}
+        response = fetcher.get(url, headers=headers)
+        self.pages += 1
+        self.page_failures = 0
+        return response
+
+    def page_unchanged(self, url: str) -> Optional[str]:
+        """Account for a page that answered 304: all its articles were downloaded before.
+
+        Returns:
+            Optional[str]: The page's next link as recorded by the last crawl, or None if
+                there is none or the scraper should stop.
+        """
+        next_url, articles = self.frontier.page_summary(url) if self.frontier else (None, 0)
+        print(f"{url} unchanged since the last crawl")
+        self.seen_streak += articles
+        self.skipped += articles
+        return next_url if self._keep_going() else None
+
+    def should_skip(self, article_url: str) -> bool:
+        """True if the article was downloaded by an earlier crawl. Also tracks the run of known articles."""
+        if self.frontier and self.frontier.article_status(article_url) == 'done':
+            self.seen_streak += 1
+            self.skipped += 1
+            return True
+        self.seen_streak = 0
+        return False
+
+    def article_done(self, article_url: str, ok: bool) -> None:
+        if not ok:
+            self.page_failures += 1
+        if self.frontier:
+            self.frontier.mark_article(article_url, 'done' if ok else 'failed', self.journal_name)
+
+    def page_done(self, url: str, response: requests.Response, next_url: Optional[str], articles: int) -> bool:
+        """Store the page's validators once its articles are handled.
+
+        The validators are only kept if every article on the page was downloaded; otherwise
+        a 304 on the next crawl would hide the failed ones, so the page is fetched in full.
+
+        Returns:
+            bool: True if the scraper should go on to the next page.
+        """
+        if self.frontier:
+            if self.page_failures:
+                self.frontier.forget_page(url)
+            else:
+                self.frontier.record_page(url, response, next_url, articles)
+        return self._keep_going()
+
+    def _keep_going(self) -> bool:
+        if self.stop.max_seen is not None and self.seen_streak >= self.stop.max_seen:
+            print(f"Stopping: {self.seen_streak} already-seen articles in a row")
+            return False
+        if self.stop.max_pages is not None and self.pages >= self.stop.max_pages:
+            print(f"Stopping: reached {self.pages} listing pages")
+            return False
+        return True
@@ -0,0 +1,151 @@
+"""True/False judge of free-text model answers, many answers per request.
+
+The binary benchmark generates every text-generation answer first and then judges them
+all at once:
+
+    verdicts = judge_responses([(question, "B is " + answer), ...])   # 'true', 'false' or None
+
+Identical (question, response) pairs are judged once. Verdicts are kept in
+`cache/judge.sqlite` (or `$CHEM_QA_JUDGE_CACHE`; empty disables it), so a re-run or a
+model that repeats another's answer costs nothing. The remaining pairs go out in
+numbered batches of `BATCH_SIZE`, answered as one JSON object per batch. All batches run
+concurrently through the shared LLM client. A batch whose reply cannot be parsed leaves
+its items without a verdict. A batch refused by the spending budget raises
+`BudgetExceeded`, once the verdicts of the other batches are cached.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .llm import BudgetExceeded, LLMError, get_client
+
+JUDGE_MODEL = "openai:gpt-3.5-turbo"
+BATCH_SIZE = 25
+# Reply tokens per judged item ('"12": "False", ') plus the braces
+TOKENS_PER_VERDICT = 8
+
+DEFAULT_CACHE_PATH = os.environ.get('CHEM_QA_JUDGE_CACHE', os.path.join(os.path.dirname(__file__), '..', 'cache', 'judge.sqlite'))
+
+SYSTEM_PROMPT = ("Classify each model response as 'True' or 'False'. Reply with a JSON object that maps "
+                 "every item number to \"True\" or \"False\", and nothing else.")
+
+Pair = Tuple[str, str]
+
+class VerdictCache:
+    """Verdicts by (judge model, question, response) hash; every thread gets its own connection."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        folder = os.path.dirname(db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, verdict TEXT NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, str]:
+        found = {}
+        conn = self._connect()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = conn.execute(f"SELECT key, verdict FROM verdicts WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+            found.update(rows)
+        return found
+
+    def put_many(self, verdicts: Dict[str, str]) -> None:
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO verdicts VALUES (?, ?)", verdicts.items())
+
+_caches: Dict[str, VerdictCache] = {}
+_caches_lock = threading.Lock()
+
+def get_cache(db_path: str = DEFAULT_CACHE_PATH) -> Optional[VerdictCache]:
+    if not db_path:
+        return None
+    with _caches_lock:
+        if db_path not in _caches:
+            _caches[db_path] = VerdictCache(db_path)
+        return _caches[db_path]
+
+def pair_key(model: str, pair: Pair) -> str:
+    return hashlib.sha256(json.dumps([model, *pair]).encode('utf-8')).hexdigest()
+
+def batch_messages(pairs: Sequence[Pair]) -> List[Dict[str, str]]:
+    items = "\n".join(f"{number}. Question: {question}. Model's response: {response}"
+                      for number, (question, response) in enumerate(pairs, start=1))
+    return [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": items}]
+
+def parse_verdicts(text: str, count: int) -> List[Optional[str]]:
+    """The 'true'/'false' verdict of each of `count` items (None where missing or invalid)."""
+    try:
+        verdicts = json.loads(text[text.find('{'):text.rfind('}') + 1])
+    except ValueError:
+        return [None] * count
+    if not isinstance(verdicts, dict):
+        return [None] * count
+    parsed = []
+    for number in range(1, count + 1):
+        verdict = str(verdicts.get(str(number), '')).strip().lower()
+        parsed.append(verdict if verdict in ('true', 'false') else None)
+    return parsed
+
+def judge_responses(pairs: Sequence[Pair], model: str = JUDGE_MODEL, batch_size: int = BATCH_SIZE,
+                    cache_path: str = DEFAULT_CACHE_PATH) -> List[Optional[str]]:
+    """Judge (question, model response) pairs as 'true' or 'false'.
+
+    Args:
+        pairs (Sequence[Pair]): Question text and the response to classify.
+        model (str): Judge model, `<provider>:<model>`.
+        batch_size (int): Pairs per request.
+        cache_path (str): Verdict cache (empty to disable).
+
+    Returns:
+        List[Optional[str]]: One verdict per pair, None where the judge gave none.
+
+    Raises:
+        BudgetExceeded: If the spending budget refused a batch.
+    """
+    cache = get_cache(cache_path)
+    keys = [pair_key(model, pair) for pair in pairs]
+    verdicts: Dict[str, Optional[str]] = dict(cache.get_many(list(set(keys)))) if cache else {}
+    todo = list({key: pair for key, pair in zip(keys, pairs) if key not in verdicts}.items())
+
+    batches = [todo[start:start + batch_size] for start in range(0, len(todo), batch_size)]
+    completions = get_client().complete_many(
+        model, [batch_messages([pair for _, pair in batch]) for batch in batches], cache=False, temperature=0,
+        max_tokens=TOKENS_PER_VERDICT * batch_size + 10, response_format={"type": "json_object"},
+        return_exceptions=True)
+
+    judged = {}
+    over_budget = None
+    for batch, completion in zip(batches, completions):
+        if isinstance(completion, BudgetExceeded):
+            over_budget = over_budget or completion
+            continue
+        if isinstance(completion, LLMError):
+            logging.error(f"Judging {len(batch)} responses failed: {completion}")
+            continue
+        if isinstance(completion, BaseException):
+            raise completion
+        for (key, _), verdict in zip(batch, parse_verdicts(completion.text, len(batch))):
+            if verdict is not None:
+                judged[key] = verdict
+    if cache and judged:
+        cache.put_many(judged)
+    if over_budget is not None:
+        raise over_budget
+    verdicts.update(judged)
+    return [verdicts.get(key) for key in keys]
@@ -0,0 +1,526 @@
+"""One client for every chat model the scripts call, hosted or local.
+
+    from .llm import get_client
+    llm = get_client()
+    reply = llm.complete("openai:gpt-4-1106-preview", messages, temperature=0)
+    replies = llm.complete_many("openai:gpt-3.5-turbo", [messages, ...], temperature=0,
+                                return_exceptions=True)
+
+A model is named `<provider>:<model>`; a bare name goes to OpenAI. Providers:
+
+- `openai`: chat completions, key from `api_keys.api_keys` or OPENAI_API_KEY (and
+  OPENAI_BASE_URL, if set).
+- `vertex`: Gemini models on Vertex AI (`google-cloud-aiplatform`).
+- `local`: a HuggingFace text-generation checkpoint, run in this process.
+- `fake`: canned replies without any network, for dry runs of the calling code.
+
+More can be added with `register_provider`.
+
+All calls run on one background event loop owned by the client. Sync scripts therefore
+share one pooled HTTP client per provider, and `complete_many` runs a whole dataset
+concurrently. Each provider caps its concurrent requests and paces them to a
+requests-per-minute budget. Rate limits, timeouts and 5xx answers are retried with
+exponential backoff.
+
+Replies of deterministic calls (temperature 0) are cached in SQLite under
+`cache/llm.sqlite` (or `$CHEM_QA_LLM_CACHE`; empty disables the cache), so re-running a
+benchmark only pays for new prompts. Identical requests in flight share one call. Tokens
+and cost are totalled per model (`usage()`), and listeners see every completion.
+
+Prices, provider limits and the budget are set in `llm_config.py`. Every call is booked
+to the cost ledger (`cost_ledger.py`) with the script and the paper or question it was
+made for (`item`). Once a budget is set, a call that could take the ledger's total past
+it raises `BudgetExceeded` before it is sent.
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import openai
+
+from .cost_ledger import DEFAULT_LEDGER_PATH, CostLedger
+from .llm_config import (BUDGET_USD, CHARS_PER_TOKEN, COMPLETION_TOKENS_ESTIMATE, PRICES,
+                         PROVIDER_SETTINGS)
+from .tracing import count, span
+
+Messages = List[Dict[str, str]]
+
+DEFAULT_CACHE_PATH = os.environ.get('CHEM_QA_LLM_CACHE', os.path.join(os.path.dirname(__file__), '..', 'cache', 'llm.sqlite'))
+
+_default_client: Optional["LLMClient"] = None
+_default_lock = threading.Lock()
+
+@dataclass
+class Completion:
+    text: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    latency: float = 0.0
+    cached: bool = False
+    # Seconds between the call and the start of the request that answered it (concurrency
+    # cap, pacing and retries), and the wall-clock time of the call
+    queue_wait: float = 0.0
+    started_at: float = 0.0
+
+class LLMError(Exception):
+    """A call that failed, after retries if the error was transient."""
+
+class RetryableError(LLMError):
+    """Raised by providers for errors worth retrying (rate limits, timeouts, 5xx)."""
+
+class BudgetExceeded(LLMError):
+    """A call was refused because it could take the spending past the budget."""
+
+def cost_of(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Price of a call in USD (0 for models without a known price)."""
+    prompt_price, completion_price = PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+def openai_key() -> Optional[str]:
+    try:
+        from api_keys.api_keys import key_openai
+        return key_openai
+    except ImportError:
+        return os.environ.get('OPENAI_API_KEY')
+
+def flatten(messages: Messages) -> str:
+    """The messages as one prompt, for backends without chat roles."""
+    return "\n\n".join(message['content'] for message in messages)
+
+class RateLimiter:
+    """Token bucket of `per_minute` requests: a burst of up to a minute's budget starts at
+    once, after which requests are spaced to the budget."""
+
+    def __init__(self, per_minute: Optional[float] = None):
+        self.per_minute = per_minute
+        self._tokens = float(per_minute or 0)
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        if not self.per_minute:
+            return
+        now = time.monotonic()
+        self._tokens = min(self.per_minute, self._tokens + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+        self._tokens -= 1
+        if self._tokens < 0:
+            # Reserved a token that refills later; wait for it
+            await asyncio.sleep(-self._tokens * 60 / self.per_minute)
+
+class Provider:
+    """A chat backend. Subclasses implement `_complete`; this class adds the concurrency
+    cap, pacing and retries. Parameters a backend has no equivalent for (e.g. OpenAI's
+    `response_format`) are ignored by it, so callers can pass them whatever the model.
+
+    Args:
+        concurrency (int): Requests in flight at once.
+        requests_per_minute (Optional[float]): Request budget (None for unlimited).
+        retries (int): Retries of a `RetryableError`.
+        backoff (float): First retry delay in seconds, doubled (with jitter) per retry.
+    """
+    name = ''
+
+    def __init__(self, concurrency: int = 8, requests_per_minute: Optional[float] = None, retries: int = 4,
+                 backoff: float = 1.0):
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(requests_per_minute)
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def _complete(self, model: str, messages: Messages, **params) -> Completion:
+        raise NotImplementedError
+
+    async def complete(self, model: str, messages: Messages, **params) -> Completion:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        started_at, entered = time.time(), time.perf_counter()
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                await self.limiter.acquire()
+                start = time.perf_counter()
+                try:
+                    with span('llm_request', provider=self.name, model=model):
+                        completion = await self._complete(model, messages, **params)
+                except RetryableError as e:
+                    count('llm_retries', provider=self.name, model=model)
+                    if attempt == self.retries:
+                        raise LLMError(f"{self.name}:{model} failed after {attempt + 1} attempts: {e}") from e
+                    await asyncio.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+                    continue
+                completion.latency = time.perf_counter() - start
+                completion.queue_wait = start - entered
+                completion.started_at = started_at
+                return completion
+
+class OpenAIProvider(Provider):
+    name = 'openai'
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, timeout: float = 120.0,
+                 concurrency: int = 16, requests_per_minute: Optional[float] = 500, **kwargs):
+        super().__init__(concurrency, requests_per_minute, **kwargs)
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self._client = None
+
+    def client(self):
+        if self._client is None:
+            # Retries are ours, so that they respect the provider's pacing
+            self._client = openai.AsyncOpenAI(api_key=self.api_key or openai_key(), base_url=self.base_url,
+                                       timeout=self.timeout, max_retries=0)
+        return self._client
+
+    async def _complete(self, model: str, messages: Messages, **params) -> Completion:
+        try:
+            response = await self.client().chat.completions.create(model=model, messages=messages, **params)
+        except (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError) as e:
+            raise RetryableError(str(e)) from e
+        except openai.OpenAIError as e:
+            raise LLMError(str(e)) from e
+        usage = response.usage
+        prompt_tokens = usage.prompt_tokens if usage else 0
+        completion_tokens = usage.completion_tokens if usage else 0
+        return Completion(text=response.choices[0].message.content or '', model=response.model,
+                          prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                          cost=cost_of(model, prompt_tokens, completion_tokens))
+
+class VertexProvider(Provider):
+    """Gemini models through `vertexai.generative_models`. System messages are prepended
+    to the prompt."""
+    name = 'vertex'
+
+    def __init__(self, project: Optional[str] = None, location: str = 'us-central1', concurrency: int = 8,
+                 requests_per_minute: Optional[float] = 200, **kwargs):
+        super().__init__(concurrency, requests_per_minute, **kwargs)
+        self.project = project
+        self.location = location
+        self._models: Dict[str, Any] = {}
+
+    def model(self, model: str):
+        if model not in self._models:
+            import vertexai
+            from vertexai.generative_models import GenerativeModel
+            if not self._models:
+                vertexai.init(project=self.project, location=self.location)
+            self._models[model] = GenerativeModel(model)
+        return self._models[model]
+
+    async def _complete(self, model: str, messages: Messages, temperature: Optional[float] = None,
+                        max_tokens: Optional[int] = None, **params) -> Completion:
+        from google.api_core import exceptions
+        from vertexai.generative_models import GenerationConfig
+        config = GenerationConfig(temperature=temperature, max_output_tokens=max_tokens)
+        try:
+            response = await self.model(model).generate_content_async(flatten(messages), generation_config=config)
+        except (exceptions.ResourceExhausted, exceptions.ServiceUnavailable, exceptions.DeadlineExceeded,
+                exceptions.InternalServerError) as e:
+            raise RetryableError(str(e)) from e
+        except exceptions.GoogleAPIError as e:
+            raise LLMError(str(e)) from e
+        usage = response.usage_metadata
+        return Completion(text=response.text.strip(), model=model, prompt_tokens=usage.prompt_token_count,
+                          completion_tokens=usage.candidates_token_count,
+                          cost=cost_of(model, usage.prompt_token_count, usage.candidates_token_count))
+
+class LocalProvider(Provider):
+    """A HuggingFace text-generation checkpoint in this process, one call at a time."""
+    name = 'local'
+
+    def __init__(self, precision: str = "fp32", concurrency: int = 1, **kwargs):
+        super().__init__(concurrency, retries=0, **kwargs)
+        self.precision = precision
+        self._pipelines: Dict[str, Any] = {}
+
+    def pipeline(self, model: str):
+        if model not in self._pipelines:
+            from .model_server import build_pipeline
+            self._pipelines[model] = build_pipeline(model, "text-generation", self.precision)
+        return self._pipelines[model]
+
+    def _generate(self, model: str, prompt: str, temperature: Optional[float], max_tokens: Optional[int]):
+        generator = self.pipeline(model)
+        options = {'max_new_tokens': max_tokens or 256, 'return_full_text': False, 'do_sample': bool(temperature)}
+        if temperature:
+            options['temperature'] = temperature
+        text = generator(prompt, **options)[0]['generated_text']
+        count = lambda value: len(generator.tokenizer(value)['input_ids'])
+        return text, count(prompt), count(text)
+
+    async def _complete(self, model: str, messages: Messages, temperature: Optional[float] = None,
+                        max_tokens: Optional[int] = None, **params) -> Completion:
+        # asyncio.to_thread is Python 3.9+; the declared runtime is 3.8
+        text, prompt_tokens, completion_tokens = await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(self._generate, model, flatten(messages), temperature, max_tokens))
+        return Completion(text=text.strip(), model=model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+class FakeProvider(Provider):
+    """Replies without a network: `reply` is a fixed string or a function of the messages.
+    Tokens are counted as whitespace-separated words.
+
+    Args:
+        reply (Union[str, Callable[[Messages], str]]): The reply to every call.
+        latency (float): Seconds each call takes.
+    """
+    name = 'fake'
+
+    def __init__(self, reply: Union[str, Callable[[Messages], str]] = "A", latency: float = 0.0,
+                 concurrency: int = 64, **kwargs):
+        super().__init__(concurrency, **kwargs)
+        self.reply = reply
+        self.latency = latency
+
+    async def _complete(self, model: str, messages: Messages, **params) -> Completion:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        text = self.reply(messages) if callable(self.reply) else self.reply
+        return Completion(text=text, model=model, prompt_tokens=len(flatten(messages).split()),
+                          completion_tokens=len(text.split()))
+
+PROVIDERS: Dict[str, Callable[[], Provider]] = {
+    'openai': OpenAIProvider,
+    'vertex': VertexProvider,
+    'local': LocalProvider,
+    'fake': FakeProvider,
+}
+
+def register_provider(name: str, factory: Callable[[], Provider]) -> None:
+    """Make `<name>:<model>` available to every client created afterwards."""
+    PROVIDERS[name] = factory
+
+def parse_model(spec: str) -> Tuple[str, str]:
+    """Split `<provider>:<model>` (bare names are OpenAI models)."""
+    provider, sep, model = spec.partition(':')
+    if sep and provider in PROVIDERS:
+        return provider, model
+    return 'openai', spec
+
+class ResponseCache:
+    """Replies by request hash in SQLite; every thread gets its own connection."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        folder = os.path.dirname(db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                text TEXT NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )""")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Completion]:
+        row = self._connect().execute(
+            "SELECT model, text, prompt_tokens, completion_tokens FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return Completion(text=row[1], model=row[0], prompt_tokens=row[2], completion_tokens=row[3], cached=True)
+
+    def put(self, key: str, completion: Completion) -> None:
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                         (key, completion.model, completion.text, completion.prompt_tokens,
+                          completion.completion_tokens, time.time()))
+
+class LLMClient:
+    """Routes calls to providers on a background event loop, with caching and usage totals.
+
+    Args:
+        providers (Optional[Dict[str, Provider]]): Configured providers; the others are
+            created on first use with their `PROVIDER_SETTINGS`.
+        cache_path (Optional[str]): Reply cache (None or empty to disable).
+        ledger (Optional[CostLedger]): Ledger every completion is booked to.
+        budget (Optional[float]): Cap in USD on the ledger's total cost (or, without a
+            ledger, on this client's).
+    """
+
+    def __init__(self, providers: Optional[Dict[str, Provider]] = None, cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+                 ledger: Optional[CostLedger] = None, budget: Optional[float] = None):
+        self.providers: Dict[str, Provider] = dict(providers or {})
+        self.cache = ResponseCache(cache_path) if cache_path else None
+        self.ledger = ledger
+        self.budget = budget
+        self._reserved = 0.0
+        self._listeners: List[Callable[[str, Completion, Optional[str]], None]] = []
+        self._usage: Dict[str, Dict[str, float]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        if ledger is not None:
+            self.add_listener(ledger.record)
+
+    def provider(self, name: str) -> Provider:
+        with self._lock:
+            if name not in self.providers:
+                self.providers[name] = PROVIDERS[name](**PROVIDER_SETTINGS.get(name, {}))
+            return self.providers[name]
+
+    def add_listener(self, listener: Callable[[str, Completion, Optional[str]], None]) -> None:
+        """Call `listener(model spec, completion, item)` after every completion, cached or not."""
+        self._listeners.append(listener)
+
+    def spent(self) -> float:
+        """The total the budget applies to."""
+        if self.ledger is not None:
+            return self.ledger.total_cost()
+        with self._lock:
+            return sum(totals['cost'] for totals in self._usage.values())
+
+    def _reserve(self, spec: str, model: str, messages: Messages, params: Dict) -> float:
+        """Book the worst-case cost of a call against the budget until it completes.
+
+        Raises:
+            BudgetExceeded: If the call could take the spending past the budget.
+        """
+        if self.budget is None:
+            return 0.0
+        prompt_tokens = sum(len(message['content']) for message in messages) // CHARS_PER_TOKEN
+        estimate = cost_of(model, prompt_tokens, params.get('max_tokens') or COMPLETION_TOKENS_ESTIMATE)
+        spent = self.spent()
+        with self._lock:
+            if spent + self._reserved + estimate > self.budget:
+                raise BudgetExceeded(f"{spec}: ${spent:.4f} spent and ${self._reserved:.4f} in flight; "
+                                     f"another ${estimate:.4f} could exceed the ${self.budget:.2f} budget")
+            self._reserved += estimate
+        return estimate
+
+    def usage(self) -> Dict[str, Dict[str, float]]:
+        """Per model spec: requests, cache hits, prompt/completion tokens and cost."""
+        with self._lock:
+            return {spec: dict(totals) for spec, totals in self._usage.items()}
+
+    def _record(self, spec: str, completion: Completion, item: Optional[str]) -> None:
+        with self._lock:
+            totals = self._usage.setdefault(spec, {'requests': 0, 'cached': 0, 'prompt_tokens': 0,
+                                                   'completion_tokens': 0, 'cost': 0.0})
+            totals['requests'] += 1
+            totals['cached'] += completion.cached
+            totals['prompt_tokens'] += completion.prompt_tokens
+            totals['completion_tokens'] += completion.completion_tokens
+            totals['cost'] += completion.cost
+        count('llm_calls', spec=spec, cached=completion.cached)
+        count('llm_prompt_tokens', completion.prompt_tokens, spec=spec)
+        count('llm_completion_tokens', completion.completion_tokens, spec=spec)
+        count('llm_cost_usd', completion.cost, spec=spec)
+        for listener in self._listeners:
+            listener(spec, completion, item)
+
+    def _submit(self, coroutine) -> Future:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='llm-client', daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def _complete(self, spec: str, messages: Messages, cache: Optional[bool], item: Optional[str],
+                        params: Dict) -> Completion:
+        provider_name, model = parse_model(spec)
+        key = hashlib.sha256(json.dumps([provider_name, model, messages, params], sort_keys=True).encode('utf-8')).hexdigest()
+        use_cache = self.cache is not None and (params.get('temperature') == 0 if cache is None else cache)
+        completion = self.cache.get(key) if use_cache else None
+        if completion is None:
+            if key in self._inflight:
+                completion = Completion(**asdict(await asyncio.shield(self._inflight[key])))
+                completion.cached, completion.cost = True, 0.0
+            else:
+                estimate = self._reserve(spec, model, messages, params)
+                self._inflight[key] = asyncio.ensure_future(self.provider(provider_name).complete(model, messages, **params))
+                try:
+                    completion = await self._inflight[key]
+                finally:
+                    del self._inflight[key]
+                    with self._lock:
+                        self._reserved -= estimate
+                if use_cache:
+                    self.cache.put(key, completion)
+        self._record(spec, completion, item)
+        return completion
+
+    async def _complete_many(self, spec: str, conversations: Sequence[Messages], cache: Optional[bool],
+                             items: Optional[Sequence[str]], return_exceptions: bool, params: Dict) -> List:
+        items = items or [None] * len(conversations)
+        return await asyncio.gather(*(self._complete(spec, messages, cache, item, params)
+                                      for messages, item in zip(conversations, items)),
+                                    return_exceptions=return_exceptions)
+
+    def complete(self, spec: str, messages: Messages, cache: Optional[bool] = None, item: Optional[str] = None,
+                 **params) -> Completion:
+        """One chat completion.
+
+        Args:
+            spec (str): `<provider>:<model>`.
+            messages (Messages): Chat messages (`role`, `content`).
+            cache (Optional[bool]): Read and write the reply cache (default: only at temperature 0).
+            item (Optional[str]): Paper or question the call is booked to in the ledger.
+            **params: Provider options, e.g. `temperature`, `max_tokens`.
+
+        Raises:
+            LLMError: If the call failed (`BudgetExceeded` if it was not sent).
+        """
+        return self._submit(self._complete(spec, messages, cache, item, params)).result()
+
+    def complete_many(self, spec: str, conversations: Sequence[Messages], cache: Optional[bool] = None,
+                      items: Optional[Sequence[str]] = None, return_exceptions: bool = False,
+                      **params) -> List[Union[Completion, BaseException]]:
+        """Completions of many conversations, run concurrently within the provider's limits.
+
+        Returns:
+            List: One completion per conversation, in order. With `return_exceptions`, a
+                failed call gives its exception instead of raising.
+        """
+        return self._submit(self._complete_many(spec, conversations, cache, items, return_exceptions, params)).result()
+
+    async def acomplete(self, spec: str, messages: Messages, cache: Optional[bool] = None, item: Optional[str] = None,
+                        **params) -> Completion:
+        """`complete` for coroutines; runs on the client's loop whatever the caller's loop."""
+        return await asyncio.wrap_future(self._submit(self._complete(spec, messages, cache, item, params)))
+
+    async def acomplete_many(self, spec: str, conversations: Sequence[Messages], cache: Optional[bool] = None,
+                             items: Optional[Sequence[str]] = None, return_exceptions: bool = False,
+                             **params) -> List[Union[Completion, BaseException]]:
+        return await asyncio.wrap_future(
+            self._submit(self._complete_many(spec, conversations, cache, items, return_exceptions, params)))
+
+def get_client() -> LLMClient:
+    """Return the process-wide client, creating it with default providers on first use.
+
+    It books to the default ledger (`$CHEM_QA_LLM_LEDGER`; empty disables it) under
+    `BUDGET_USD`.
+    """
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = LLMClient(ledger=CostLedger() if DEFAULT_LEDGER_PATH else None, budget=BUDGET_USD)
+        return _default_client
+
+def configure_client(**kwargs) -> LLMClient:
+    """Replace the process-wide client, e.g. to set provider limits or disable the cache."""
+    global _default_client
+    with _default_lock:
+        _default_client = LLMClient(**kwargs)
+        return _default_client
@@ -0,0 +1,25 @@
+"""Prices, limits and the spending cap of the LLM client (`llm.py`).
+
+Edit here rather than in the scripts. The budget can also be set per run with
+CHEM_QA_LLM_BUDGET (USD).
+"""
+import os
+from typing import Any, Dict, Optional, Tuple
+
+# USD per 1K tokens as (prompt, completion), https://openai.com/pricing
+PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4-1106-preview": (0.01, 0.03),
+}
+
+# Constructor options per provider, e.g. {'openai': {'concurrency': 32, 'requests_per_minute': 5000}}
+PROVIDER_SETTINGS: Dict[str, Dict[str, Any]] = {}
+
+# Cap on the ledger's total cost in USD (None for no cap). Calls that could take the total
+# past it are refused before they are sent.
+BUDGET_USD: Optional[float] = float(os.environ['CHEM_QA_LLM_BUDGET']) if os.environ.get('CHEM_QA_LLM_BUDGET') else None
+
+# Completion tokens assumed for the budget check of a call without `max_tokens`
+COMPLETION_TOKENS_ESTIMATE = 1024
+# Characters per prompt token assumed for the budget check
+CHARS_PER_TOKEN = 4
@@ -1,50 +1,75 @@
-import traceback
 import os
 import csv
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
 from .publishers_links import publishers_links
-from .scrapers import *
+from .doi_registry import FIELDNAMES, get_registry
+from .fetch import configure_fetcher
+from .frontier import CrawlFrontier, StopConditions
+from .scheduler import HostPolicy, PolitenessScheduler, crawl_in_parallel
+from .scraper_specs import SCRAPERS
+from .scrapers import scrape
 
 OUTPUT_FOLDER: str = "../data/chem_all_output"
 CSV_PATH: str = "../data/chem_downloaded_articles.csv"
+FRONTIER_PATH: str = "../data/crawl_frontier.sqlite"
+# Stop paging a listing after this many already-downloaded articles in a row (None = walk it all)
+STOP_AFTER_SEEN: Optional[int] = 20
+MAX_PAGES_PER_LINK: Optional[int] = None
+# Publishers are crawled in parallel; each host is paced by its own policy (robots.txt Crawl-delay wins if larger)
+MAX_PARALLEL_PUBLISHERS: Optional[int] = None
+DEFAULT_HOST_POLICY: HostPolicy = HostPolicy(delay=1.0, concurrency=2)
+HOST_POLICIES: Dict[str, HostPolicy] = {}
+# Processes that parse listing and article HTML, separate from the download threads
+PARSE_WORKERS: int = 2
+# Parse workers are not forked from the crawl process, which runs download threads
+PARSE_START_METHOD: str = "forkserver"
 
 def main():
     """Main function to initiate scraping and downloading of open access papers."""
 
     os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-    fieldnames = [
-        'DOI', 'Title', 'Abstract', 'Journal', 'Relevant fields', 
-        'Authors', 'Keywords', 'Institute of Origin', 'Funding', 
-        'Methods', 'Results', 'Experiment details'
-    ]
-
     if not os.path.exists(CSV_PATH):
         with open(CSV_PATH, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
             writer.writeheader()
 
-    vpn_index = 0
+    registry = get_registry(CSV_PATH)
+    stale = registry.release_stale_claims()
+    if stale:
+        print(f"Released {stale} unfinished DOI claims from a previous run")
+
+    frontier = CrawlFrontier(FRONTIER_PATH)
+    stop = StopConditions(max_seen=STOP_AFTER_SEEN, max_pages=MAX_PAGES_PER_LINK)
+
+    configure_fetcher(scheduler=PolitenessScheduler(DEFAULT_HOST_POLICY, HOST_POLICIES))
+
+    jobs = {}
     for publisher_key, links in publishers_links.items():
         journal_name = publisher_key.replace("_links", "")
-        print(f"Starting scraping for {journal_name}")
-        function_name = f"scrape_page_articles_{journal_name}"
-        scraper_function = globals().get(function_name)
-
-        if scraper_function:
-            for link in links:
-                print(f"Scraping {link}")
-                try:
-                    # url: str, journal_name: str, count: int, vpn_index: int
-                    # Call the dynamically selected scraper function
-                    url, temp_count, vpn_index = scraper_function(link, OUTPUT_FOLDER, CSV_PATH, journal_name, vpn_index)
-                    print(f"Completed scraping for {link}")
-                except Exception as e:
-                    print(f"Error occurred while scraping {link}: {e}")
-                    traceback.print_exc()
-                print("="*50)  # Divider after each link
-            print("="*100)  # Divider after each publisher
+        if journal_name in SCRAPERS:
+            jobs[journal_name] = links
         else:
-            print(f"No scraping function found for {journal_name}")
+            print(f"No scraper registered for {journal_name}")
+
+    context = multiprocessing.get_context(PARSE_START_METHOD)
+    with ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=context) as parse_pool:
+        # Start the workers before any crawl thread exists
+        list(parse_pool.map(abs, range(PARSE_WORKERS)))
+
+        def crawl_link(journal_name: str, link: str) -> int:
+            try:
+                return scrape(SCRAPERS[journal_name], link, OUTPUT_FOLDER, CSV_PATH, frontier=frontier, stop=stop, parse_pool=parse_pool)
+            finally:
+                registry.export_csv(CSV_PATH)
+
+        print(f"Starting scraping for {', '.join(jobs)}")
+        totals = crawl_in_parallel(jobs, crawl_link, MAX_PARALLEL_PUBLISHERS)
+    for journal_name, total in totals.items():
+        print(f"{journal_name}: {total} PDFs downloaded")
+    print("="*100)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,348 @@
+"""Long-lived process that keeps HuggingFace pipelines loaded between benchmark runs.
+
+Loading a checkpoint dominates short benchmark runs, and the MCQ and binary benchmarks
+load the same NLI models separately. Start the server once:
+
+    python -m scripts.model_server --port 6000 --memory-budget 16
+
+and point the benchmarks at it:
+
+    CHEM_QA_MODEL_SERVER=localhost:6000 python -m scripts.benchmark_huggingface_MCQ
+
+Pipelines stay warm in an LRU keyed by (model, modality, precision). When their combined
+size exceeds the memory budget, the least recently used ones are dropped. Clients talk
+to the server over a local socket with `multiprocessing.connection`, which unpickles what
+it receives, so the key is what stands between the socket and code execution in the
+server. It is `CHEM_QA_MODEL_SERVER_KEY` if set. Otherwise the server generates a random
+key on first start into `cache/model_server.key` (or `$CHEM_QA_MODEL_SERVER_KEY_FILE`),
+readable only by its owner, and clients of the same user read it from there. Clients on
+another machine need the key in their environment.
+"""
+import argparse
+import gc
+import os
+import secrets
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import psutil
+
+from .telemetry import timed_call
+from .tracing import instrument_pipeline, span
+
+ADDRESS_ENV = "CHEM_QA_MODEL_SERVER"
+AUTHKEY_ENV = "CHEM_QA_MODEL_SERVER_KEY"
+AUTHKEY_FILE = os.environ.get('CHEM_QA_MODEL_SERVER_KEY_FILE',
+                              os.path.join(os.path.dirname(__file__), '..', 'cache', 'model_server.key'))
+
+ModelKey = Tuple[str, str, str]
+
+def server_address() -> Optional[Tuple[str, int]]:
+    """The (host, port) from CHEM_QA_MODEL_SERVER, or None if no server is configured."""
+    value = os.environ.get(ADDRESS_ENV)
+    if not value:
+        return None
+    host, _, port = value.rpartition(':')
+    return host or 'localhost', int(port)
+
+def authkey(create: bool = False) -> bytes:
+    """The shared secret of server and clients: CHEM_QA_MODEL_SERVER_KEY, else the key file.
+
+    Args:
+        create (bool): Generate the key file (mode 0600) if it does not exist yet; the
+            server does, clients do not.
+
+    Raises:
+        RuntimeError: If there is no key to use.
+    """
+    value = os.environ.get(AUTHKEY_ENV)
+    if value:
+        return value.encode('utf-8')
+    if create and not os.path.exists(AUTHKEY_FILE):
+        os.makedirs(os.path.dirname(AUTHKEY_FILE), exist_ok=True)
+        try:
+            fd = os.open(AUTHKEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass  # Another server created it first
+        else:
+            with os.fdopen(fd, 'w') as f:
+                f.write(secrets.token_hex(32))
+    try:
+        with open(AUTHKEY_FILE, 'r') as f:
+            return f.read().strip().encode('utf-8')
+    except FileNotFoundError:
+        raise RuntimeError(f"No model server key: set {AUTHKEY_ENV} or start the server on this machine "
+                           f"to create {AUTHKEY_FILE}") from None
+
+def model_bytes(model) -> int:
+    """Size of a model's parameters and buffers."""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+def build_pipeline(model_name: str, modality: str, precision: str = "fp32", tokenizer_inputs: Optional[Sequence] = None):
+    """Build a benchmark pipeline in this process, with the token cache of `tokenizer_inputs` and the given precision."""
+    import torch
+    from transformers import AutoTokenizer, pipeline
+
+    from .quantization import quantize_pipeline
+    from .token_cache import cached_tokenizer
+
+    device = 0 if torch.cuda.is_available() else -1
+    tokenizer = None
+    if tokenizer_inputs:
+        tokenizer = cached_tokenizer(AutoTokenizer.from_pretrained(model_name), tokenizer_inputs)
+    classifier = pipeline(modality, model=model_name, tokenizer=tokenizer, device=device)
+    return instrument_pipeline(quantize_pipeline(classifier, precision), model_name)
+
+class PipelineCache:
+    """LRU of loaded pipelines under a memory budget.
+
+    The size of an entry is the larger of its model's parameter bytes and the growth of the
+    process RSS while loading it, so memory held outside the parameters (tokenizers,
+    quantized weights) is counted too.
+    """
+
+    def __init__(self, memory_budget: int):
+        self.memory_budget = memory_budget
+        self._entries: "OrderedDict[ModelKey, Dict[str, Any]]" = OrderedDict()
+        # Models being loaded; set when the load ends, whether it succeeded or not
+        self._loading: Dict[ModelKey, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._process = psutil.Process()
+
+    def get(self, key: ModelKey) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry['hits'] += 1
+            return entry
+
+    def load(self, key: ModelKey, tokenizer_inputs: Optional[Sequence] = None) -> Dict[str, Any]:
+        """Load a pipeline unless it is loaded. The load runs outside the cache lock, so
+        calls on other models go on meanwhile; concurrent loads of the same model wait for
+        the first one (and retry it if it failed)."""
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    return entry
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    break
+            loading.wait()
+
+        try:
+            model_name, modality, precision = key
+            print(f"Loading {model_name} ({modality}, {precision})")
+            rss_before = self._process.memory_info().rss
+            start = time.perf_counter()
+            classifier = build_pipeline(model_name, modality, precision, tokenizer_inputs)
+            size = max(model_bytes(classifier.model), self._process.memory_info().rss - rss_before)
+            entry = {'pipeline': classifier, 'bytes': size, 'load_seconds': time.perf_counter() - start,
+                     'hits': 0, 'lock': threading.Lock()}
+            with self._lock:
+                self._entries[key] = entry
+                self._evict()
+            return entry
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+
+    def _evict(self) -> None:
+        """Drop least recently used pipelines until the budget holds. The newest always stays."""
+        evicted = False
+        while len(self._entries) > 1 and sum(e['bytes'] for e in self._entries.values()) > self.memory_budget:
+            key, entry = self._entries.popitem(last=False)
+            print(f"Evicting {key[0]} ({entry['bytes'] / 2**20:.0f} MiB)")
+            evicted = True
+        if evicted:
+            gc.collect()
+
+    def evict(self, key: Optional[ModelKey] = None) -> int:
+        """Drop one pipeline, or all of them if `key` is None. Returns the number dropped."""
+        with self._lock:
+            keys = [key] if key is not None else list(self._entries)
+            dropped = sum(self._entries.pop(k, None) is not None for k in keys)
+        gc.collect()
+        return dropped
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{'model_name': key[0], 'modality': key[1], 'precision': key[2], 'bytes': entry['bytes'],
+                     'load_seconds': entry['load_seconds'], 'hits': entry['hits']}
+                    for key, entry in self._entries.items()]
+
+def _run_calls(entry: Dict[str, Any], calls: Sequence[Tuple[tuple, dict]]) -> List[Tuple[str, Any, Optional[Dict]]]:
+    """Run a batch of pipeline calls; a failing call yields ('error', message, None) instead of aborting the batch.
+
+    The telemetry of each call counts the wait for the pipeline's lock and for the earlier
+    calls of the batch as its queue wait.
+    """
+    outputs = []
+    received = time.perf_counter()
+    with entry['lock']:
+        for args, kwargs in calls:
+            queue_wait = time.perf_counter() - received
+            try:
+                result, telemetry = timed_call(entry['pipeline'], *args, **kwargs)
+                telemetry['queue_wait'] = queue_wait
+                outputs.append(('ok', result, telemetry))
+            except Exception as e:
+                outputs.append(('error', f"{type(e).__name__}: {e}", None))
+    return outputs
+
+def handle_connection(conn, cache: PipelineCache, stop: threading.Event, address: Tuple[str, int]) -> None:
+    """Serve one client until it disconnects.
+
+    Requests are tuples:
+        ('run', key, calls): Run the calls on a loaded pipeline. Replies ('ok', [(status, output, telemetry), ...]),
+            or ('missing',) if it is not loaded.
+        ('load', key, tokenizer_inputs): Load a pipeline (no-op if loaded). Replies ('ok', None).
+        ('stats',), ('evict', key or None), ('shutdown',).
+    Failures reply ('error', traceback).
+    """
+    with conn:
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, ConnectionResetError):
+                return
+            try:
+                command = request[0]
+                if command == 'run':
+                    entry = cache.get(tuple(request[1]))
+                    conn.send(('missing',) if entry is None else ('ok', _run_calls(entry, request[2])))
+                elif command == 'load':
+                    cache.load(tuple(request[1]), request[2])
+                    conn.send(('ok', None))
+                elif command == 'stats':
+                    conn.send(('ok', cache.stats()))
+                elif command == 'evict':
+                    conn.send(('ok', cache.evict(tuple(request[1]) if request[1] else None)))
+                elif command == 'shutdown':
+                    conn.send(('ok', None))
+                    stop.set()
+                    # Wake up the accept loop so that it sees the stop flag
+                    Client(address, authkey=authkey()).close()
+                    return
+                else:
+                    conn.send(('error', f"Unknown command {command}"))
+            except Exception:
+                conn.send(('error', traceback.format_exc()))
+
+def serve(host: str = 'localhost', port: int = 6000, memory_budget: int = 8 * 2**30) -> None:
+    key = authkey(create=True)
+    # Import the libraries up front so that their memory is not charged to the first model loaded
+    import torch  # noqa: F401
+    from transformers import pipeline  # noqa: F401
+
+    cache = PipelineCache(memory_budget)
+    stop = threading.Event()
+    with Listener((host, port), authkey=key) as listener:
+        print(f"Model server listening on {host}:{port} with a {memory_budget / 2**30:.1f} GiB budget")
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, EOFError, ConnectionError) as e:
+                print(f"Rejected a connection: {type(e).__name__}: {e}")
+                continue
+            if stop.is_set():
+                conn.close()
+                break
+            threading.Thread(target=handle_connection, args=(conn, cache, stop, (host, port)), daemon=True).start()
+    print("Model server stopped")
+
+class RemotePipeline:
+    """Client-side stand-in for a `transformers` pipeline served by the model server.
+
+    Calling it runs one pipeline call on the server. `map` submits many calls in a single
+    round trip. The first use loads the model on the server if it is not warm yet.
+    """
+
+    def __init__(self, model_name: str, modality: str, precision: str = "fp32",
+                 tokenizer_inputs: Optional[Sequence] = None, address: Optional[Tuple[str, int]] = None):
+        self.key = (model_name, modality, precision)
+        self.tokenizer_inputs = tokenizer_inputs
+        self.conn = Client(address or server_address(), authkey=authkey())
+
+    def _request(self, *request):
+        self.conn.send(request)
+        reply = self.conn.recv()
+        if reply[0] == 'error':
+            raise RuntimeError(f"Model server error: {reply[1]}")
+        return reply
+
+    def map_timed(self, calls: Sequence[Tuple[tuple, dict]]) -> List[Tuple[Any, Optional[Dict]]]:
+        """Run (args, kwargs) calls in order, returning each output with its telemetry (see
+        `telemetry.py`). Failed calls come back as RuntimeError instances without telemetry.
+
+        The server measures each call's queue wait and tokens. The latency is what the client
+        waited beyond the queue, transport included; the outputs of a batch all arrive
+        together. Loading a missing model does not count.
+        """
+        started_at = time.time()
+        start = time.perf_counter()
+        with span('pipeline_remote', model=self.key[0], task=self.key[1]):
+            reply = self._request('run', self.key, list(calls))
+            if reply[0] == 'missing':
+                self._request('load', self.key, self.tokenizer_inputs)
+                started_at = time.time()
+                start = time.perf_counter()
+                reply = self._request('run', self.key, list(calls))
+        elapsed = time.perf_counter() - start
+        outputs = []
+        for status, value, *telemetry in reply[1]:
+            # Servers from before telemetry reply without it
+            telemetry = telemetry[0] if telemetry else None
+            if telemetry is not None:
+                telemetry.update(started_at=started_at, latency=elapsed - telemetry['queue_wait'])
+            outputs.append((value if status == 'ok' else RuntimeError(value), telemetry))
+        return outputs
+
+    def map(self, calls: Sequence[Tuple[tuple, dict]]) -> List[Any]:
+        """Run (args, kwargs) calls in order. Failed calls come back as RuntimeError instances."""
+        return [value for value, _ in self.map_timed(calls)]
+
+    def timed_call(self, *args, **kwargs) -> Tuple[Any, Optional[Dict]]:
+        result, telemetry = self.map_timed([(args, kwargs)])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result, telemetry
+
+    def __call__(self, *args, **kwargs):
+        return self.timed_call(*args, **kwargs)[0]
+
+    def close(self) -> None:
+        self.conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep HuggingFace pipelines warm for the benchmark scripts.")
+    parser.add_argument('--host', type=str, default='localhost')
+    parser.add_argument('--port', type=int, default=6000)
+    parser.add_argument('--memory-budget', type=float, default=8.0, help='GiB of pipelines to keep loaded')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('stats', help='Print the pipelines loaded by a running server')
+    subparsers.add_parser('shutdown', help='Stop a running server')
+    args = parser.parse_args()
+
+    if args.command is None:
+        serve(args.host, args.port, int(args.memory_budget * 2**30))
+        return
+    with Client((args.host, args.port), authkey=authkey()) as conn:
+        conn.send((args.command,))
+        status, value = conn.recv()
+    if args.command == 'stats':
+        for entry in value:
+            print(f"{entry['model_name']:60s} {entry['modality']:26s} {entry['precision']:5s} "
+                  f"{entry['bytes'] / 2**20:8.0f} MiB  loaded in {entry['load_seconds']:.1f}s  {entry['hits']} hits")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Compact, memory-mapped form of a question dataset.
+
+The JSON datasets (`chem_mqa_dataset.json`, `all_questions_gpt_4.json`) are lists of
+`{"Question_N": {...}, "doi": ...}` entries. Parsing them builds thousands of Python
+strings per process. Here they are packed once into a folder with these files:
+
+    text.bin      every text field of every question, UTF-8, back to back
+    offsets.npy   int64 (questions * fields + 1,) start of each field in text.bin
+    answers.npy   int8 (questions,) gold answer, 0-3 for A-D (-1 if missing)
+    meta.json     field names and the size/mtime of the source JSON
+
+All worker processes that open the folder map the same pages of the OS page cache, so
+the dataset costs its memory once, however many workers read it. Strings are only
+decoded for the fields that are actually read.
+
+    dataset = load_packed("./data/chem_mqa_dataset.json")
+    for question_data in dataset:  # same shape as the JSON entries
+        ...
+"""
+import json
+import os
+import shutil
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+
+from .file_lock import file_lock
+
+FIELDS = ('question_id', 'doi', 'Context', 'Question', 'A', 'B', 'C', 'D', 'Source')
+OPTIONS = ('A', 'B', 'C', 'D')
+FORMAT_VERSION = 1
+
+def packed_path(json_path: str) -> str:
+    """The folder that holds the packed form of `json_path`."""
+    return os.path.splitext(json_path)[0] + ".packed"
+
+def pack_dataset(json_path: str, out_dir: Optional[str] = None) -> str:
+    """Pack a question dataset JSON into `out_dir` (default: next to the JSON).
+
+    The folder is written under a temporary name and renamed into place, so workers that
+    open it concurrently never see a half-written pack. Callers that may race with other
+    processes building the same pack hold its lock (`load_packed` does).
+
+    Returns:
+        str: The packed folder.
+    """
+    out_dir = out_dir or packed_path(json_path)
+    with open(json_path, 'r') as f:
+        entries = json.load(f)
+
+    buffer = bytearray()
+    offsets = [0]
+    answers = []
+    for entry in entries:
+        doi = entry.get('doi', '')
+        for question_id, details in entry.items():
+            if not question_id.startswith("Question"):
+                continue
+            values = {'question_id': question_id, 'doi': doi, **details}
+            for field in FIELDS:
+                buffer += str(values.get(field) or '').encode('utf-8')
+                offsets.append(len(buffer))
+            answer = str(details.get('Answer', '')).strip().upper()
+            answers.append(OPTIONS.index(answer) if answer in OPTIONS else -1)
+
+    stat = os.stat(json_path)
+    tmp_dir = f"{out_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    with open(os.path.join(tmp_dir, 'text.bin'), 'wb') as f:
+        f.write(buffer)
+    np.save(os.path.join(tmp_dir, 'offsets.npy'), np.array(offsets, dtype=np.int64))
+    np.save(os.path.join(tmp_dir, 'answers.npy'), np.array(answers, dtype=np.int8))
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump({'version': FORMAT_VERSION, 'fields': list(FIELDS), 'size': len(answers),
+                   'source_size': stat.st_size, 'source_mtime': stat.st_mtime}, f, indent=4)
+
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.replace(tmp_dir, out_dir)
+    return out_dir
+
+class PackedDataset:
+    """Read-only view of a packed dataset.
+
+    Iterating yields entries shaped like the JSON ones (`{"Question_N": {...}, "doi": ...}`),
+    so existing benchmark loops work unchanged. `answers` and `field` give direct access
+    without building per-question dicts.
+    """
+
+    def __init__(self, packed_dir: str):
+        with open(os.path.join(packed_dir, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+        self.fields = self.meta['fields']
+        self._field_index = {field: i for i, field in enumerate(self.fields)}
+        self.offsets = np.load(os.path.join(packed_dir, 'offsets.npy'), mmap_mode='r')
+        self.answers = np.load(os.path.join(packed_dir, 'answers.npy'), mmap_mode='r')
+        text_path = os.path.join(packed_dir, 'text.bin')
+        self.text = np.memmap(text_path, dtype=np.uint8, mode='r') if os.path.getsize(text_path) else np.zeros(0, np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+    def field(self, index: int, name: str) -> str:
+        slot = index * len(self.fields) + self._field_index[name]
+        start, end = self.offsets[slot], self.offsets[slot + 1]
+        return self.text[start:end].tobytes().decode('utf-8')
+
+    def answer(self, index: int) -> str:
+        answer = int(self.answers[index])
+        return OPTIONS[answer] if answer >= 0 else ''
+
+    def record(self, index: int) -> Dict[str, str]:
+        """The question's details as in the JSON (Context, Question, A-D, Answer, Source)."""
+        details = {field: self.field(index, field) for field in self.fields if field not in ('question_id', 'doi')}
+        details['Answer'] = self.answer(index)
+        return details
+
+    def __getitem__(self, index: int) -> Dict:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return {self.field(index, 'question_id'): self.record(index), 'doi': self.field(index, 'doi')}
+
+    def __iter__(self) -> Iterator[Dict]:
+        for index in range(len(self)):
+            yield self[index]
+
+def load_packed(json_path: str, packed_dir: Optional[str] = None) -> PackedDataset:
+    """Open the packed form of `json_path`, (re)packing it first if it is missing or stale.
+
+    The check and the build run under a lock file, so of several workers started on a
+    missing pack one builds it and the others open the result.
+    """
+    packed_dir = packed_dir or packed_path(json_path)
+    meta_path = os.path.join(packed_dir, 'meta.json')
+    with file_lock(f"{packed_dir}.lock"):
+        stale = True
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            stat = os.stat(json_path)
+            stale = (meta.get('version') != FORMAT_VERSION or meta.get('source_size') != stat.st_size
+                     or meta.get('source_mtime') != stat.st_mtime)
+        if stale:
+            print(f"Packing {json_path} into {packed_dir}")
+            pack_dataset(json_path, packed_dir)
+        return PackedDataset(packed_dir)
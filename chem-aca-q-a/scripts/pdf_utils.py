@@ -3,46 +3,118 @@ import traceback
 import requests
 import fitz
 import os
-import csv
 import re
 import subprocess
-from openai import OpenAI
 
 from typing import Optional
 
-from api_keys.api_keys import key_openai
+from .doi_registry import doi_key, get_registry
+from .fetch import Fetcher, get_fetcher
+from .llm import get_client
+from .tracing import span, traced
 
-client = OpenAI(
-  api_key=key_openai,
-)
+EXTRACTION_MODEL = "openai:gpt-3.5-turbo"
 
-def download_pdf(url: str, output_folder: str, csv_path: str, folder: str, journal_name: str, article_link: str) -> bool:
+CHUNK_SIZE: int = 64 * 1024
+PDF_MAGIC: bytes = b'%PDF'
+# Some servers label PDFs generically; anything else (notably text/html paywall pages) is rejected.
+PDF_CONTENT_TYPES = ('application/pdf', 'application/x-pdf', 'application/octet-stream', 'binary/octet-stream')
+
+def looks_like_pdf(head: bytes) -> bool:
+    """The PDF spec allows the `%PDF` header anywhere in the first 1024 bytes."""
+    return PDF_MAGIC in head[:1024]
+
+def stream_pdf(url: str, filepath: str, fetcher: Fetcher) -> bool:
+    """Stream a PDF to `filepath` in fixed-size chunks.
+
+    The body is written to `<filepath>.part` and renamed into place only once it is complete
+    and validated, so a crash never leaves a truncated `.pdf` behind. If a `.part` file from an
+    earlier attempt exists, the download resumes from its size with an HTTP range request.
+
+    Args:
+        url (str): The URL of the PDF.
+        filepath (str): Where the finished PDF should end up.
+        fetcher (Fetcher): Pooled HTTP client.
+
+    Returns:
+        bool: True if a valid PDF was saved to `filepath`, False otherwise.
+    """
+    part_path = filepath + '.part'
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+
+    with fetcher.get(url, stream=True, headers=headers) as response:
+        if response.status_code == 416:
+            # The partial file does not match what the server has; start over next time.
+            os.remove(part_path)
+            print(f'Discarded stale partial download of {url}')
+            return False
+        if response.status_code not in (200, 206):
+            print(f'Error {response.status_code} while downloading {url}')
+            return False
+
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type and content_type not in PDF_CONTENT_TYPES:
+            print(f'Skipping {url}: Content-Type is {content_type}, not a PDF')
+            return False
+
+        # A 200 means the server ignored the range request, so rewrite from the start.
+        mode = 'ab' if response.status_code == 206 else 'wb'
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if f.tell() == 0 and not looks_like_pdf(chunk):
+                    print(f'Skipping {url}: payload does not start with {PDF_MAGIC!r}')
+                    break
+                f.write(chunk)
+
+    with open(part_path, 'rb') as f:
+        head = f.read(1024)
+    if not looks_like_pdf(head):
+        os.remove(part_path)
+        return False
+
+    os.replace(part_path, filepath)
+    return True
+
+@traced("download_pdf", "journal_name")
+def download_pdf(url: str, output_folder: str, csv_path: str, folder: str, journal_name: str, article_link: Optional[str] = None, fetcher: Optional[Fetcher] = None) -> bool:
     """Download a PDF from a given URL and save it to the specified folder.
+
+    The download is streamed to disk (see `stream_pdf`), so memory use does not grow with
+    the size of the PDF.
     
     Args:
         url (str): The URL of the PDF to download.
         folder (str): The folder to save the downloaded PDF.
+        fetcher (Optional[Fetcher]): Pooled HTTP client to use; defaults to the shared one.
 
     Returns:
         bool: True if the download is successful, False otherwise.
     """
-    response = requests.get(url)
-    if response.status_code == 200:
-        os.makedirs(folder, exist_ok=True)
-        filename = url.split('/')[-1]
-        filepath = os.path.join(folder, filename)
-        with open(filepath, 'wb') as f:
-            f.write(response.content)
+    fetcher = fetcher or get_fetcher()
+    os.makedirs(folder, exist_ok=True)
+    filename = url.split('/')[-1]
+    filepath = os.path.join(folder, filename)
+
+    if os.path.exists(filepath):
+        print(f'{filename} already downloaded')
+    else:
+        try:
+            downloaded = stream_pdf(url, filepath, fetcher)
+        except requests.RequestException as e:
+            # Includes DisallowedByRobots; one bad article should not end the listing.
+            print(f'Error while downloading {url}: {e}')
+            return False
+        if not downloaded:
+            return False
         print("*"*50)
         print(f'Downloaded {filename}')
         print("*"*50)
 
-        convert_pdf_to_text(filepath, output_folder, csv_path)
-        return True
-    else:
-        print(f'Error {response.status_code} while downloading {url}')
-        return False
+    convert_pdf_to_text(filepath, output_folder, csv_path)
+    return True
 
+@traced("convert_pdf_to_text")
 def convert_pdf_to_text(pdf_path: str, output_folder:str, csv_path: str) -> Optional[str]:
     """Convert a PDF file to text and save it.
     
@@ -102,15 +174,12 @@ def process_pdf(text: str, filename: str, csv_path:str) -> str:
     Returns:
         str: The title of the paper if extracted successfully, otherwise an error message.
     """
-    last_part = filename.split('/')[-1]
-    doi = last_part.split('.')[0]
+    doi = doi_key(filename)
     
-    with open(csv_path, 'r', newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            if row['DOI'] == doi:
-                print(f"DOI {doi} already exists in CSV.")
-                return doi
+    registry = get_registry(csv_path)
+    if not registry.claim(doi):
+        print(f"DOI {doi} already exists in registry.")
+        return doi
 
     initial_prompt = f"""Given the following text, extract structured information in JSON format including the title, abstract, authors, keywords, institute of origin, DOI, and funding:
         
@@ -141,26 +210,24 @@ def process_pdf(text: str, filename: str, csv_path:str) -> str:
     ]
 
     try:
-        completion = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.2
-        )
+        completion = get_client().complete(EXTRACTION_MODEL, messages, temperature=0.2, item=doi)
 
-        last_response = completion.choices[0].message.content
+        last_response = completion.text
         print("="*10)
         print("Model")
         print(completion.model)
         print("="*10)
         print("Token count")
-        print(completion.usage.completion_tokens + int(completion.usage.prompt_tokens))
+        print(completion.completion_tokens + completion.prompt_tokens)
         print("="*10)
         print(last_response)
 
         try:
-            parsed_response = json.loads(last_response)
+            with span("parse_json"):
+                parsed_response = json.loads(last_response)
         except json.JSONDecodeError as e:
             print(f"JSON decoding error: {e}")
+            registry.release(doi)
             return "Error in JSON decoding"
         
         print(parsed_response)
@@ -174,34 +241,31 @@ def process_pdf(text: str, filename: str, csv_path:str) -> str:
         keywords = ', '.join(parsed_response['Keywords'])
         relevant_fields = ', '.join(parsed_response.get('Relevant fields', []))  # Handles optional fields gracefully
 
-        with open(csv_path, 'a', newline='', encoding='utf-8') as csvfile:
-            fieldnames = [
-                'DOI', 'Title', 'Abstract', 'Journal', 'Relevant fields',
-                'Authors', 'Keywords', 'Institute of Origin', 'Funding',
-                'Methods', 'Results', 'Experiment details'
-            ]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            data_to_write = {
-                'DOI': parsed_response['DOI'],
-                'Title': parsed_response['Title'],
-                'Abstract': parsed_response['Abstract'],
-                'Journal': parsed_response.get('Journal', 'N/A'),  # Using .get() for optional fields
-                'Relevant fields': relevant_fields,
-                'Authors': authors,
-                'Keywords': keywords,
-                'Institute of Origin': parsed_response['Institute of Origin'],
-                'Funding': parsed_response['Funding'],
-                'Methods': parsed_response.get('Methods', 'N/A'),
-                'Results': parsed_response.get('Results', 'N/A'),
-                'Experiment details': parsed_response.get('Experiment details', 'N/A')
-            }
-
-            writer.writerow(data_to_write)
+        data_to_write = {
+            'DOI': parsed_response['DOI'],
+            'Title': parsed_response['Title'],
+            'Abstract': parsed_response['Abstract'],
+            'Journal': parsed_response.get('Journal', 'N/A'),  # Using .get() for optional fields
+            'Relevant fields': relevant_fields,
+            'Authors': authors,
+            'Keywords': keywords,
+            'Institute of Origin': parsed_response['Institute of Origin'],
+            'Funding': parsed_response['Funding'],
+            'Methods': parsed_response.get('Methods', 'N/A'),
+            'Results': parsed_response.get('Results', 'N/A'),
+            'Experiment details': parsed_response.get('Experiment details', 'N/A')
+        }
+
+        # The registry is the source of truth; main() exports it to csv_path.
+        registry.complete(doi, data_to_write)
 
     except json.JSONDecodeError as e:
         print(f"JSON decoding error: {e}")
+        registry.release(doi)
         return "Error in JSON decoding"
+    except Exception:
+        registry.release(doi)
+        raise
 
     print("Done with ", doi)
     print("*"*50)
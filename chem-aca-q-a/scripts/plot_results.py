@@ -1,38 +1,137 @@
+import argparse
+import hashlib
+import json
 import os
+from typing import Dict, List
+
+import numpy as np
 import pandas as pd
 
-path = './results/HuggingFace'  # Updated path for clarity
-files = os.listdir(path)
-dataframes = []
-model_labels = {}
-label_count = 65  # ASCII for 'A'
-
-for file in files:
-    if file.endswith('.csv'):
-        df = pd.read_csv(os.path.join(path, file))
-        model_label = 'Model ' + chr(label_count)
-        model_labels[file.split('.')[0]] = model_label
-        df['model'] = model_label
-        dataframes.append(df)
-        label_count += 1
-
-data = pd.concat(dataframes, ignore_index=True)
-
-# Step 2: Data preparation
-data['is_incorrect'] = ~data['is_correct'] & ~data['is_unparsable']
-
-# Step 3: Create summary table for counts
-summary_counts = data.groupby('model')[['is_correct', 'is_incorrect', 'is_unparsable']].sum()
-summary_counts.columns = ['Correct', 'Incorrect', 'Unparsable']
-
-# Step 4: Calculate standard deviation
-std_dev = data.groupby('model')[['is_correct', 'is_incorrect', 'is_unparsable']].std()
-std_dev.columns = ['Std Dev Correct', 'Std Dev Incorrect', 'Std Dev Unparsable']
-
-# Step 5: Merge tables and print
-summary_table = pd.concat([summary_counts, std_dev], axis=1)
-print("Summary Table of Responses per Model:")
-print(summary_table)
-
-# Optionally, save to CSV
-summary_table.to_csv('model_summary_table.csv', index=True)
\ No newline at end of file
+from .significance import bootstrap_counts_ci
+
+RESULTS_PATH = './results/HuggingFace'
+CACHE_FILE = '.summary_cache.json'
+LABELS_FILE = 'model_labels.json'
+OUTPUT_FILE = 'model_summary_table.csv'
+CATEGORIES = ['Correct', 'Incorrect', 'Unparsable']
+
+def file_sha1(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_json(path: str, data) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+def aggregate_file(path: str) -> Dict[str, int]:
+    """Count correct, incorrect and unparsable answers of one result CSV.
+
+    Only the two boolean columns are parsed, so the prompt text repeated on every row is skipped.
+    """
+    data = pd.read_csv(path, usecols=['is_correct', 'is_unparsable'])
+    correct = data['is_correct'].astype(bool).to_numpy()
+    unparsable = data['is_unparsable'].astype(bool).to_numpy()
+    return {
+        'n': int(len(data)),
+        'Correct': int(correct.sum()),
+        'Incorrect': int((~correct & ~unparsable).sum()),
+        'Unparsable': int(unparsable.sum()),
+    }
+
+def model_name(file: str) -> str:
+    """'facebook_bart-large-mnli_results.csv' -> 'facebook_bart-large-mnli'."""
+    name = os.path.splitext(file)[0]
+    return name[:-len('_results')] if name.endswith('_results') else name
+
+def update_aggregates(path: str, cache: Dict) -> Dict[str, Dict]:
+    """Return the aggregates of every CSV in `path`, recomputing only files that changed.
+
+    A file is reused from `cache` when its size and mtime are unchanged, or when they changed
+    but its SHA-1 did not (e.g. after a copy or checkout).
+    """
+    files = cache.setdefault('files', {})
+    aggregates = {}
+    for file in sorted(os.listdir(path)):
+        if not file.endswith('.csv'):
+            continue
+        file_path = os.path.join(path, file)
+        stat = os.stat(file_path)
+        entry = files.get(file)
+        if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+            sha1 = file_sha1(file_path)
+            if entry is None or entry['sha1'] != sha1:
+                print(f"Summarising {file}")
+                entry = {'sha1': sha1, 'counts': aggregate_file(file_path)}
+            entry.update(size=stat.st_size, mtime=stat.st_mtime)
+            files[file] = entry
+        aggregates[model_name(file)] = entry['counts']
+    for file in [file for file in files if model_name(file) not in aggregates]:
+        del files[file]
+    return aggregates
+
+def label_for(index: int) -> str:
+    """Spreadsheet-style label: 0 -> 'Model A', 25 -> 'Model Z', 26 -> 'Model AA'."""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return 'Model ' + letters
+
+def assign_labels(models: List[str], labels: Dict[str, str]) -> Dict[str, str]:
+    """Give new models the next free label while keeping the labels already handed out."""
+    for model in models:
+        if model not in labels:
+            labels[model] = label_for(len(labels))
+    return labels
+
+def build_summary(path: str = RESULTS_PATH, resamples: int = 10000, confidence: float = 0.95) -> pd.DataFrame:
+    cache_path = os.path.join(path, CACHE_FILE)
+    labels_path = os.path.join(path, LABELS_FILE)
+
+    cache = load_json(cache_path, {})
+    aggregates = update_aggregates(path, cache)
+    save_json(cache_path, cache)
+
+    labels = assign_labels(sorted(aggregates), load_json(labels_path, {}))
+    save_json(labels_path, labels)
+    models = sorted(aggregates, key=lambda model: (len(labels[model]), labels[model]))
+
+    counts = np.array([[aggregates[model][category] for category in CATEGORIES] for model in models]).reshape(-1, len(CATEGORIES))
+    lower, upper = bootstrap_counts_ci(counts, resamples, confidence)
+
+    percent = int(confidence * 100)
+    summary = pd.DataFrame(counts, columns=CATEGORIES, index=[labels[model] for model in models])
+    summary.index.name = 'model'
+    summary.insert(0, 'Model Name', models)
+    for i, category in enumerate(CATEGORIES):
+        summary[f'{category} CI{percent} Low'] = lower[:, i]
+        summary[f'{category} CI{percent} High'] = upper[:, i]
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise the HuggingFace benchmark results per model.")
+    parser.add_argument('--path', type=str, default=RESULTS_PATH, help='Folder with the <model>_results.csv files')
+    parser.add_argument('--output', type=str, default=OUTPUT_FILE, help='CSV file for the summary table')
+    parser.add_argument('--resamples', type=int, default=10000, help='Bootstrap resamples')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Coverage of the confidence intervals')
+    args = parser.parse_args()
+
+    summary_table = build_summary(args.path, args.resamples, args.confidence)
+    print("Summary Table of Responses per Model:")
+    print(summary_table)
+    summary_table.to_csv(args.output, index=True)
+
+if __name__ == '__main__':
+    main()
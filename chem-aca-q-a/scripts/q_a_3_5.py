@@ -1,18 +1,18 @@
 import os
 import json
-import openai
+from concurrent.futures import ThreadPoolExecutor
 
-from api_keys.api_keys import key_openai
-from openai import OpenAI
+from .llm import BudgetExceeded, get_client
 
-client = OpenAI(api_key=key_openai)
+MODEL = "openai:gpt-3.5-turbo"
+# Papers whose questions are generated at the same time
+PAPER_WORKERS = 8
 
 def generate_questions(text, paper_name, path_q):
     """
     Generates multiple-choice questions from a given text by dividing the text into parts and
     processing each part separately to manage token limits.
 
-    :param client: OpenAI GPT client.
     :param text: Text to generate questions from.
     :return: A list containing all generated questions.
     """
@@ -26,8 +26,6 @@ def generate_questions(text, paper_name, path_q):
     print("Preparing Q&A for: ", paper_name)
     print("*"*50)
 
-    openai.api_key = key_openai
-
     prompt = f"""Given the following text, extract structured information in JSON format so as to create 10 multiple-choice questions with 4 options each and the correct answer and source of the answer based on the provided chemistry-related content.
     Focus solely on the concepts in the paper without addressing the paper explicitly - address only the content.
     
@@ -96,13 +94,9 @@ def generate_questions(text, paper_name, path_q):
         ]
 
         try:
-            completion = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                temperature=0.2
-            )
+            completion = get_client().complete(MODEL, messages, temperature=0.2, item=paper_name)
 
-            last_response = completion.choices[0].message.content
+            last_response = completion.text
             partial_output = last_response
 
             print(last_response)
@@ -111,7 +105,7 @@ def generate_questions(text, paper_name, path_q):
             print(completion.model)
             print("="*10)
             print("Token count")
-            print(completion.usage.completion_tokens + int(completion.usage.prompt_tokens))
+            print(completion.completion_tokens + completion.prompt_tokens)
             print("="*10)
             
             # Check if we have 10 questions now by counting occurrences
@@ -124,6 +118,8 @@ def generate_questions(text, paper_name, path_q):
                     json.dump(parsed_response, json_file, indent=4)                 
                 return parsed_response
 
+        except BudgetExceeded:
+            raise
         except json.JSONDecodeError as e:
             print(f"JSON decoding error: {e}. Retrying...")
             attempts += 1
@@ -177,15 +173,15 @@ def main():
     all_questions = {}
     question_counter = 0
 
-    for paper in os.listdir("..data//all_output"):
-        if paper.endswith(".txt"):
-            with open(os.path.join("../data/all_output", paper), "r") as f:
-                text = f.read()
-
-            paper_name = paper[:-4]
-
-            qa = generate_questions(text, paper_name, "../data/Q&A_jsons/")
+    def generate(paper):
+        with open(os.path.join("../data/all_output", paper), "r") as f:
+            text = f.read()
+        return generate_questions(text, paper[:-4], "../data/Q&A_jsons/")
 
+    papers = [paper for paper in os.listdir("../data/all_output") if paper.endswith(".txt")]
+    # Papers are independent, so their requests overlap; the client enforces the rate limits
+    with ThreadPoolExecutor(max_workers=PAPER_WORKERS) as pool:
+        for qa in pool.map(generate, papers):
             if qa:
                 for question in qa:
                     all_questions[f"question_{question_counter}"] = question
@@ -1,31 +1,18 @@
 import os
 import json
-import openai
+from concurrent.futures import ThreadPoolExecutor
 
-from api_keys.api_keys import key_openai
-from openai import OpenAI
+from .llm import BudgetExceeded, get_client
 
-client = OpenAI(api_key=key_openai)
-
-def load_total_cost():
-    try:
-        with open("total_cost_4_gpt.py", "r") as f:
-            globals = {}
-            exec(f.read(), globals)
-            return globals['TOTAL_COST']
-    except FileNotFoundError:
-        return 0  # Default to 0 if the file does not exist
-
-def save_total_cost(total_cost):
-    with open("total_cost_4_gpt.py", "w") as f:
-        f.write(f"TOTAL_COST = {total_cost}\n")
+MODEL = "openai:gpt-4-1106-preview"
+# Papers whose questions are generated at the same time
+PAPER_WORKERS = 8
 
 def generate_questions(text, paper_name, path_q):
     """
     Generates multiple-choice questions from a given text by dividing the text into parts and
     processing each part separately to manage token limits.
 
-    :param client: OpenAI GPT client.
     :param text: Text to generate questions from.
     :return: A list containing all generated questions.
     """
@@ -39,8 +26,6 @@ def generate_questions(text, paper_name, path_q):
     print("Preparing Q&A for: ", paper_name)
     print("*"*50)
 
-    openai.api_key = key_openai
-
     prompt = f"""Given the following text, extract structured information in JSON format so as to create 10 multiple-choice questions with 4 options each and the correct answer and source of the answer based on the provided chemistry-related content.
     Focus solely on the concepts in the paper without addressing the paper explicitly - address only the content.
     
@@ -114,14 +99,9 @@ def generate_questions(text, paper_name, path_q):
         ]
 
         try:
-            TOTAL_COST = load_total_cost()
-            completion = client.chat.completions.create(
-                model="gpt-4-1106-preview",
-                messages=messages,
-                temperature=0.2
-            )
-
-            last_response = completion.choices[0].message.content
+            completion = get_client().complete(MODEL, messages, temperature=0.2, item=paper_name)
+
+            last_response = completion.text
             partial_output = last_response
 
             print(last_response)
@@ -130,14 +110,14 @@ def generate_questions(text, paper_name, path_q):
             print(completion.model)
             print("="*10)
             print("Token count")
-            print(completion.usage.completion_tokens + int(completion.usage.prompt_tokens))
+            print(completion.completion_tokens + completion.prompt_tokens)
             print("="*10)
-            total_cost_paper = (int(completion.usage.completion_tokens) * 0.01 / 1000) + (int(completion.usage.prompt_tokens) * 0.03 / 1000) # https://openai.com/pricing
-            TOTAL_COST += total_cost_paper
-            print(f"Total cost for paper: {total_cost_paper}")
-            print(f"Incremented cost: {TOTAL_COST}")
+            # Every call is booked to the cost ledger (python -m scripts.cost_ledger --by script day)
+            ledger = get_client().ledger
+            if ledger is not None:
+                print(f"Total cost for paper: {ledger.item_cost(paper_name)}")
+                print(f"Incremented cost: {ledger.total_cost(script=ledger.script)}")
             print("="*10)
-            save_total_cost(TOTAL_COST)
             
             # Check if we have 10 questions now by counting occurrences
             question_count = partial_output.count('"Question":')
@@ -149,6 +129,8 @@ def generate_questions(text, paper_name, path_q):
                     json.dump(parsed_response, json_file, indent=4)                 
                 return parsed_response
 
+        except BudgetExceeded:
+            raise
         except json.JSONDecodeError as e:
             print(f"JSON decoding error: {e}. Retrying...")
             attempts += 1
@@ -202,15 +184,15 @@ def main():
     all_questions = {}
     question_counter = 0
 
-    for paper in os.listdir("../data/all_output"):
-        if paper.endswith(".txt"):
-            with open(os.path.join("../data/all_output", paper), "r") as f:
-                text = f.read()
-
-            paper_name = paper[:-4]
-
-            qa = generate_questions(text, paper_name, "../data/Q&A_jsons_gpt_4/")
+    def generate(paper):
+        with open(os.path.join("../data/all_output", paper), "r") as f:
+            text = f.read()
+        return generate_questions(text, paper[:-4], "../data/Q&A_jsons_gpt_4/")
 
+    papers = [paper for paper in os.listdir("../data/all_output") if paper.endswith(".txt")]
+    # Papers are independent, so their requests overlap; the client enforces the rate limits
+    with ThreadPoolExecutor(max_workers=PAPER_WORKERS) as pool:
+        for qa in pool.map(generate, papers):
             if qa:
                 for question in qa:
                     all_questions[f"question_{question_counter}"] = question
@@ -0,0 +1,489 @@
+"""Single SQLite warehouse for every benchmark output.
+
+The benchmark scripts write one CSV or JSON file per model, each in its own schema and
+with the full prompt repeated on every row. This module loads them all into one
+normalised store so that cross-model analysis is a single SQL query:
+
+    python -m scripts.results_store ingest --results results
+    python -m scripts.results_store summary --task mcq
+    python -m scripts.results_store query "SELECT model, AVG(correct) FROM results GROUP BY model"
+    python -m scripts.results_store report --task mcq --usd-per-hour 1.2
+
+HuggingFace runs at a reduced precision (`--int8`) are written to `<model>_int8_results.csv`
+and stored with their `precision`; per-model comparisons (`correctness_matrix`, the app)
+only read full-precision runs.
+
+`report` compares serving configurations: throughput, latency and queue-wait percentiles,
+tokens and cost per correct answer of every run, from the per-answer telemetry the
+benchmarks record (`telemetry.py`).
+"""
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .telemetry import TELEMETRY_FIELDS
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'results', 'results.sqlite')
+
+# Model names of the result files that do not carry them
+GPT_RESULT_MODELS = {
+    'gpt4_evaluation_results.json': 'gpt-4-1106-preview',
+    'gpt3_5_evaluation_results.json': 'gpt-3.5-turbo',
+}
+
+MCQ_OPTIONS = ('A', 'B', 'C', 'D')
+
+# Runs without a precision (API models) or at this one are the published accuracies
+FULL_PRECISION = 'fp32'
+
+# Per-answer telemetry columns added after the first release, with their types
+TELEMETRY_COLUMNS = {
+    'queue_wait': 'REAL',
+    'prompt_tokens': 'INTEGER',
+    'completion_tokens': 'INTEGER',
+    'cost': 'REAL',
+    'cached': 'INTEGER',
+    'started_at': 'REAL',
+}
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha1(prompt.encode('utf-8')).hexdigest()
+
+def _as_bool(value) -> Optional[bool]:
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('true', '1', 'yes')
+
+def _as_number(value, kind=float):
+    """A telemetry value from a CSV cell or JSON field (None if absent)."""
+    if value is None or value == '':
+        return None
+    return kind(float(value))
+
+def _percentiles(values: Sequence[float]) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+    if not values:
+        return None, None, None
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return float(p50), float(p90), float(p99)
+
+class ResultsStore:
+    """Normalised store of benchmark answers.
+
+    Tables:
+        runs: One row per evaluated model and task (`mcq`, `binary` or `judge`), with the
+            model revision(s) that answered.
+        prompts: Every distinct prompt once, keyed by its SHA-1.
+        answers: One row per question (and per choice for the binary task), pointing at
+            its run and prompt, with its telemetry (see `telemetry.py`).
+
+    The `results` view joins the three so that queries can group by model directly.
+    Connections are per thread, as in `DOIRegistry`.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        folder = os.path.dirname(db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id INTEGER PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    modality TEXT,
+                    task TEXT NOT NULL,
+                    source TEXT UNIQUE,
+                    created_at REAL NOT NULL,
+                    revision TEXT,
+                    precision TEXT
+                );
+                CREATE TABLE IF NOT EXISTS prompts (
+                    prompt_hash TEXT PRIMARY KEY,
+                    prompt TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS answers (
+                    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+                    question_id TEXT NOT NULL,
+                    choice TEXT NOT NULL DEFAULT '',
+                    answer TEXT,
+                    correct INTEGER,
+                    unparsable INTEGER NOT NULL DEFAULT 0,
+                    latency REAL,
+                    tokens INTEGER,
+                    prompt_hash TEXT REFERENCES prompts(prompt_hash),
+                    queue_wait REAL,
+                    prompt_tokens INTEGER,
+                    completion_tokens INTEGER,
+                    cost REAL,
+                    cached INTEGER,
+                    started_at REAL,
+                    PRIMARY KEY (run_id, question_id, choice)
+                );
+                CREATE INDEX IF NOT EXISTS answers_question ON answers (question_id);
+            """)
+            self._migrate(conn)
+            conn.executescript("""
+                DROP VIEW IF EXISTS results;
+                CREATE VIEW results AS
+                    SELECT r.run_id, r.model, r.modality, r.task, r.revision, r.precision, a.question_id, a.choice,
+                           a.answer, a.correct, a.unparsable, a.latency, a.tokens, a.prompt_hash,
+                           a.queue_wait, a.prompt_tokens, a.completion_tokens, a.cost, a.cached, a.started_at
+                    FROM answers a JOIN runs r USING (run_id);
+            """)
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection) -> None:
+        """Add the telemetry columns to a store created before they existed."""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(answers)")}
+        for column, kind in TELEMETRY_COLUMNS.items():
+            if column not in columns:
+                conn.execute(f"ALTER TABLE answers ADD COLUMN {column} {kind}")
+        run_columns = {row[1] for row in conn.execute("PRAGMA table_info(runs)")}
+        if 'revision' not in run_columns:
+            conn.execute("ALTER TABLE runs ADD COLUMN revision TEXT")
+        if 'precision' not in run_columns:
+            conn.execute("ALTER TABLE runs ADD COLUMN precision TEXT")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def record_run(self, model: str, modality: Optional[str], task: str, rows: Iterable[Dict],
+                   source: Optional[str] = None, precision: Optional[str] = None) -> int:
+        """Store the answers of one model in a single transaction.
+
+        Re-recording the same `source` replaces the earlier run, so ingesting a folder
+        twice does not duplicate anything.
+
+        Args:
+            model (str): Model name, e.g. `facebook/bart-large-mnli`.
+            modality (Optional[str]): Pipeline or API type, e.g. `zero-shot-classification` or `chat`.
+            task (str): `mcq`, `binary` or `judge`.
+            rows (Iterable[Dict]): Dicts with `question_id` and optionally `choice`, `prompt`,
+                `answer`, `correct`, `unparsable`, `tokens`, the telemetry fields (`latency`,
+                `queue_wait`, `prompt_tokens`, `completion_tokens`, `cost`, `cached`,
+                `started_at`) and `model_revision`.
+            source (Optional[str]): File the rows came from.
+            precision (Optional[str]): Inference precision of a local pipeline (`fp32`, `int8`).
+
+        Returns:
+            int: The id of the new run.
+        """
+        prompts = {}
+        answers = []
+        revisions = set()
+        for row in rows:
+            hashed = None
+            if row.get('prompt'):
+                hashed = prompt_hash(row['prompt'])
+                prompts[hashed] = row['prompt']
+            correct = _as_bool(row.get('correct'))
+            cached = _as_bool(row.get('cached'))
+            prompt_tokens = _as_number(row.get('prompt_tokens'), int)
+            completion_tokens = _as_number(row.get('completion_tokens'), int)
+            tokens = _as_number(row.get('tokens'), int)
+            if tokens is None and prompt_tokens is not None:
+                tokens = prompt_tokens + (completion_tokens or 0)
+            if row.get('model_revision'):
+                revisions.add(str(row['model_revision']))
+            answers.append((
+                row['question_id'], row.get('choice') or '', row.get('answer'),
+                None if correct is None else int(correct), int(bool(_as_bool(row.get('unparsable')))),
+                _as_number(row.get('latency')), tokens, hashed, _as_number(row.get('queue_wait')),
+                prompt_tokens, completion_tokens, _as_number(row.get('cost')),
+                None if cached is None else int(cached), _as_number(row.get('started_at')),
+            ))
+
+        with self._connect() as conn:
+            if source is not None:
+                conn.execute("DELETE FROM runs WHERE source = ?", (source,))
+            cursor = conn.execute(
+                "INSERT INTO runs (model, modality, task, source, created_at, revision, precision) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (model, modality, task, source, time.time(), ','.join(sorted(revisions)) or None, precision))
+            run_id = cursor.lastrowid
+            conn.executemany("INSERT OR IGNORE INTO prompts (prompt_hash, prompt) VALUES (?, ?)", prompts.items())
+            conn.executemany(
+                "INSERT OR REPLACE INTO answers (run_id, question_id, choice, answer, correct, unparsable, latency, tokens, "
+                "prompt_hash, queue_wait, prompt_tokens, completion_tokens, cost, cached, started_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id,) + answer for answer in answers],
+            )
+        return run_id
+
+    def query(self, sql: str, params: Sequence = ()) -> List[Tuple]:
+        return self._connect().execute(sql, params).fetchall()
+
+    def accuracy_by_model(self, task: str = 'mcq') -> List[Tuple[str, str, Optional[str], int, int, int, int]]:
+        """(model, modality, precision, answered, correct, wrong, unparsable) per run of a task, best first."""
+        return self.query("""
+            SELECT model, modality, precision, COUNT(*), COALESCE(SUM(correct = 1), 0), COALESCE(SUM(correct = 0 AND unparsable = 0), 0), SUM(unparsable)
+            FROM results WHERE task = ?
+            GROUP BY run_id ORDER BY SUM(correct = 1) DESC
+        """, (task,))
+
+    def correctness_matrix(self, task: str = 'mcq', models: Optional[Sequence[str]] = None
+                           ) -> Tuple[List[str], List[str], np.ndarray]:
+        """Per-question correctness of several models, aligned on the questions they all answered.
+
+        Only full-precision runs are read, so a quantized run never stands in for a model.
+
+        Returns:
+            Tuple[List[str], List[str], np.ndarray]: Model names, question ids, and a boolean
+            array of shape (questions, models).
+        """
+        if models is None:
+            models = [row[0] for row in self.query(
+                "SELECT DISTINCT model FROM runs WHERE task = ? AND COALESCE(precision, ?) = ? ORDER BY model",
+                (task, FULL_PRECISION, FULL_PRECISION))]
+        models = list(models)
+        if not models:
+            return [], [], np.zeros((0, 0), dtype=bool)
+        placeholders = ",".join("?" * len(models))
+        rows = self.query(f"""
+            SELECT question_id || CASE choice WHEN '' THEN '' ELSE '/' || choice END, model, correct
+            FROM results WHERE task = ? AND COALESCE(precision, ?) = ? AND model IN ({placeholders})
+        """, [task, FULL_PRECISION, FULL_PRECISION] + models)
+
+        column = {model: i for i, model in enumerate(models)}
+        by_question: Dict[str, np.ndarray] = {}
+        seen: Dict[str, int] = {}
+        for question, model, correct in rows:
+            if question not in by_question:
+                by_question[question] = np.zeros(len(models), dtype=bool)
+                seen[question] = 0
+            by_question[question][column[model]] = bool(correct)
+            seen[question] += 1
+        questions = [question for question in by_question if seen[question] == len(models)]
+        matrix = np.array([by_question[question] for question in questions], dtype=bool).reshape(len(questions), len(models))
+        return models, questions, matrix
+
+    def performance(self, task: str = 'mcq', usd_per_hour: Optional[float] = None) -> List[Dict]:
+        """Serving measurements of every run of a task, cheapest per correct answer first.
+
+        Cached replies are left out of the timings. Throughput is answers per second of
+        wall-clock time from the first question asked to the last answer back, so it
+        reflects the concurrency a run used. Runs without start times (files from before
+        telemetry, or a single answer) fall back to one answer at a time.
+
+        Args:
+            task (str): `mcq`, `binary` or `judge`.
+            usd_per_hour (Optional[float]): Price of the hardware local pipelines run on. Their
+                compute time (the sum of their latencies) is charged at it; API runs (modality
+                `chat`) pay their recorded cost only.
+
+        Returns:
+            List[Dict]: Per run: model, precision, revision, answered, correct, timed answers, throughput,
+            latency and queue-wait p50/p90/p99 (seconds), mean prompt and completion tokens,
+            cost and cost per correct answer.
+        """
+        runs = self.query("SELECT run_id, model, modality, revision, precision FROM runs WHERE task = ? ORDER BY model", (task,))
+        report = []
+        for run_id, model, modality, revision, precision in runs:
+            rows = self.query("""
+                SELECT correct, latency, queue_wait, prompt_tokens, completion_tokens, cost, cached, started_at
+                FROM answers WHERE run_id = ?
+            """, (run_id,))
+            timed = [row for row in rows if row[1] is not None and not row[6]]
+            latencies = [row[1] for row in timed]
+            waits = [row[2] or 0.0 for row in timed]
+            started = [(row[7], row[7] + (row[2] or 0.0) + row[1]) for row in timed if row[7] is not None]
+            wall = max(end for _, end in started) - min(start for start, _ in started) if len(started) > 1 else 0.0
+            if wall <= 0:
+                wall = sum(latency + wait for latency, wait in zip(latencies, waits))
+            correct = sum(row[0] == 1 for row in rows)
+            cost = sum(row[5] or 0.0 for row in rows)
+            if usd_per_hour is not None and modality != 'chat':
+                cost += sum(latencies) * usd_per_hour / 3600
+            prompt_tokens = [row[3] for row in rows if row[3] is not None]
+            completion_tokens = [row[4] for row in rows if row[4] is not None]
+            report.append({
+                'model': model,
+                'modality': modality,
+                'precision': precision,
+                'revision': revision,
+                'answered': len(rows),
+                'correct': correct,
+                'timed': len(timed),
+                'throughput': len(timed) / wall if wall > 0 else None,
+                'latency': _percentiles(latencies),
+                'queue_wait': _percentiles(waits),
+                'prompt_tokens': float(np.mean(prompt_tokens)) if prompt_tokens else None,
+                'completion_tokens': float(np.mean(completion_tokens)) if completion_tokens else None,
+                'cost': cost,
+                'cost_per_correct': cost / correct if correct else None,
+            })
+        report.sort(key=lambda entry: (entry['cost_per_correct'] is None, entry['cost_per_correct'] or 0.0))
+        return report
+
+    # Ingestion of the files written by the benchmark scripts
+
+    def ingest_huggingface_csv(self, csv_path: str, model: str, modality: Optional[str], precision: str = FULL_PRECISION) -> int:
+        """Load a `results/HuggingFace/<model>_results.csv` file. Returns the number of answers."""
+        with open(csv_path, 'r', newline='', encoding='utf-8') as csvfile:
+            rows = [{
+                'question_id': row['question_id'],
+                'prompt': row['prompt'],
+                'answer': row['generated_answer'],
+                'correct': row['is_correct'],
+                'unparsable': row.get('is_unparsable', row['generated_answer'] == 'Unparsable'),
+                **_telemetry(row),
+            } for row in csv.DictReader(csvfile)]
+        self.record_run(model, modality, 'mcq', rows, source=os.path.abspath(csv_path), precision=precision)
+        return len(rows)
+
+    def ingest_binary_csv(self, csv_path: str, model: str, modality: Optional[str], precision: str = FULL_PRECISION) -> int:
+        """Load a `results/Binary/<model>_results.csv` or `_gpt4_results.csv` (judge) file."""
+        if os.path.getsize(csv_path) == 0:
+            return 0
+        with open(csv_path, 'r', newline='', encoding='utf-8') as csvfile:
+            reader = csv.DictReader(csvfile)
+            judge = 'gpt_classification' in (reader.fieldnames or [])
+            rows = [{
+                'question_id': row['question_id'],
+                'choice': row['choice_label'],
+                'prompt': row['prompt'],
+                'answer': row['gpt_classification'] if judge else row['generated_answer'],
+                'correct': None if judge else row['is_correct'],
+                'unparsable': row['generated_answer'] == 'Unparsable',
+                **_telemetry(row),
+            } for row in reader]
+        self.record_run(model, modality, 'judge' if judge else 'binary', rows, source=os.path.abspath(csv_path),
+                        precision=precision)
+        return len(rows)
+
+    def ingest_answers_json(self, json_path: str, model: str, modality: str = 'chat') -> int:
+        """Load a JSON list of answers as written by the GPT and Google Cloud benchmarks."""
+        with open(json_path, 'r') as f:
+            results = json.load(f)
+        rows = [{
+            'question_id': result['question_id'],
+            'prompt': result.get('prompt'),
+            'answer': result.get('generated_answer'),
+            'correct': result.get('is_correct'),
+            'unparsable': (result.get('generated_answer') or '').strip().upper() not in MCQ_OPTIONS,
+            'tokens': result.get('tokens'),
+            **_telemetry(result),
+        } for result in results]
+        self.record_run(model, modality, 'mcq', rows, source=os.path.abspath(json_path))
+        return len(rows)
+
+    def ingest_results_dir(self, results_dir: str) -> Dict[str, int]:
+        """Load every known result file under `results_dir`.
+
+        Returns:
+            Dict[str, int]: Answers loaded per file.
+        """
+        loaded = {}
+        for folder, ingest in (('HuggingFace', self.ingest_huggingface_csv), ('Binary', self.ingest_binary_csv)):
+            modalities = _model_modalities(os.path.join(results_dir, folder, 'overall_stats.json'))
+            for csv_path in sorted(glob.glob(os.path.join(results_dir, folder, '*_results.csv'))):
+                stem = os.path.basename(csv_path)[:-len('_results.csv')]
+                if stem.endswith('_gpt4'):
+                    stem = stem[:-len('_gpt4')]
+                model, modality, precision = modalities.get(stem) or _parse_stem(stem)
+                loaded[csv_path] = ingest(csv_path, model, modality, precision)
+        for json_path in sorted(glob.glob(os.path.join(results_dir, '*_Answers', '*.json'))):
+            model = GPT_RESULT_MODELS.get(os.path.basename(json_path), os.path.splitext(os.path.basename(json_path))[0])
+            loaded[json_path] = self.ingest_answers_json(json_path, model)
+        return loaded
+
+def _telemetry(row: Dict) -> Dict:
+    """The telemetry fields of a result row (absent in files from before they were recorded)."""
+    return {field: row.get(field) for field in TELEMETRY_FIELDS}
+
+def result_stem(model_name: str, precision: str = FULL_PRECISION) -> str:
+    """Stem of a model's result files: 'facebook/bart-large-mnli', 'int8' -> 'facebook_bart-large-mnli_int8'."""
+    stem = model_name.replace('/', '_')
+    return stem if precision == FULL_PRECISION else f"{stem}_{precision}"
+
+def _parse_stem(stem: str) -> Tuple[str, None, str]:
+    """(model name, modality, precision) guessed from a result file stem without overall_stats.json."""
+    precision = FULL_PRECISION
+    if stem.endswith('_int8'):
+        stem, precision = stem[:-len('_int8')], 'int8'
+    return stem.replace('_', '/', 1), None, precision
+
+def _model_modalities(stats_path: str) -> Dict[str, Tuple[str, str, str]]:
+    """Map result file stems to (model name, modality, precision) using a benchmark's overall_stats.json."""
+    if not os.path.exists(stats_path):
+        return {}
+    with open(stats_path, 'r') as f:
+        stats = json.load(f)
+    return {result_stem(entry['model_name'], entry.get('precision', FULL_PRECISION)):
+            (entry['model_name'], modality, entry.get('precision', FULL_PRECISION))
+            for modality, entries in stats.items() for entry in entries}
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the benchmark results warehouse.")
+    parser.add_argument('--db', type=str, default=DEFAULT_DB_PATH, help='Path to the SQLite results store')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = subparsers.add_parser('ingest', help='Load the CSV/JSON files of a results folder')
+    ingest_parser.add_argument('--results', type=str, default=os.path.join(os.path.dirname(__file__), '..', 'results'),
+                               help='Folder containing HuggingFace/, Binary/ and *_Answers/')
+
+    summary_parser = subparsers.add_parser('summary', help='Print accuracy per model')
+    summary_parser.add_argument('--task', type=str, choices=['mcq', 'binary', 'judge'], default='mcq')
+
+    report_parser = subparsers.add_parser('report', help='Print throughput, latency and cost per correct answer per model')
+    report_parser.add_argument('--task', type=str, choices=['mcq', 'binary', 'judge'], default='mcq')
+    report_parser.add_argument('--usd-per-hour', type=float, help='Hardware price charged for the compute time of local pipelines')
+
+    query_parser = subparsers.add_parser('query', help='Run an SQL query against the store')
+    query_parser.add_argument('sql', type=str)
+
+    args = parser.parse_args()
+    store = ResultsStore(args.db)
+
+    if args.command == 'ingest':
+        loaded = store.ingest_results_dir(args.results)
+        for path, count in loaded.items():
+            print(f"{count:6d} answers  {os.path.relpath(path, args.results)}")
+        print(f"Loaded {sum(loaded.values())} answers from {len(loaded)} files into {args.db}")
+    elif args.command == 'summary':
+        print(f"{'Model':60s} {'Answered':>8s} {'Correct':>8s} {'Wrong':>8s} {'Unpars.':>8s} {'Acc.':>6s}")
+        for model, modality, precision, answered, correct, wrong, unparsable in store.accuracy_by_model(args.task):
+            if precision and precision != FULL_PRECISION:
+                model = f"{model} ({precision})"
+            print(f"{model:60s} {answered:8d} {correct:8d} {wrong:8d} {unparsable:8d} {correct / answered:6.3f}")
+    elif args.command == 'report':
+        milliseconds = lambda value: '-' if value is None else f"{value * 1000:.0f}"
+        print(f"{'Model':50s} {'Revision':12s} {'Correct':>11s} {'Ans/s':>7s} {'p50 ms':>7s} {'p90 ms':>7s} {'p99 ms':>7s} "
+              f"{'Wait p50':>8s} {'Wait p99':>8s} {'Tok in':>7s} {'Tok out':>7s} {'Cost $':>9s} {'$/correct':>10s}")
+        for entry in store.performance(args.task, args.usd_per_hour):
+            if entry['precision'] and entry['precision'] != FULL_PRECISION:
+                entry['model'] = f"{entry['model']} ({entry['precision']})"
+            p50, p90, p99 = entry['latency']
+            wait50, _, wait99 = entry['queue_wait']
+            print(f"{entry['model'][:50]:50s} {(entry['revision'] or '-')[:12]:12s} "
+                  f"{entry['correct']:5d}/{entry['answered']:<5d} "
+                  f"{'-' if entry['throughput'] is None else format(entry['throughput'], '.2f'):>7s} "
+                  f"{milliseconds(p50):>7s} {milliseconds(p90):>7s} {milliseconds(p99):>7s} "
+                  f"{milliseconds(wait50):>8s} {milliseconds(wait99):>8s} "
+                  f"{'-' if entry['prompt_tokens'] is None else format(entry['prompt_tokens'], '.0f'):>7s} "
+                  f"{'-' if entry['completion_tokens'] is None else format(entry['completion_tokens'], '.1f'):>7s} "
+                  f"{entry['cost']:9.4f} "
+                  f"{'-' if entry['cost_per_correct'] is None else format(entry['cost_per_correct'], '.6f'):>10s}")
+    elif args.command == 'query':
+        for row in store.query(args.sql):
+            print("\t".join(str(value) for value in row))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+@dataclass
+class HostPolicy:
+    """Politeness budget of a single host.
+
+    Attributes:
+        delay (float): Minimum seconds between the starts of two requests to the host.
+        concurrency (int): Maximum requests in flight to the host.
+        respect_robots (bool): Honour robots.txt rules and raise `delay` to its Crawl-delay.
+    """
+    delay: float = 1.0
+    concurrency: int = 2
+    respect_robots: bool = True
+
+class DisallowedByRobots(requests.RequestException):
+    """Raised instead of fetching a URL that the host's robots.txt disallows."""
+
+class PolitenessScheduler:
+    """Paces requests per host so that parallel crawls never hammer a single publisher.
+
+    Request start times are handed out per host at least `delay` seconds apart, where
+    `delay` is the larger of the configured delay and the host's robots.txt Crawl-delay.
+    `Fetcher` calls `wait` before every request and takes its per-host concurrency from
+    `policy`. robots.txt rules are matched against `user_agent`, by default the User-Agent
+    the session sends. Each host's robots.txt is fetched once; only requests to that host
+    wait for it.
+    """
+
+    def __init__(self, default: Optional[HostPolicy] = None, policies: Optional[Dict[str, HostPolicy]] = None,
+                 user_agent: Optional[str] = None):
+        self.default = default or HostPolicy()
+        self.policies = {host.lower(): policy for host, policy in (policies or {}).items()}
+        self.user_agent = user_agent
+        self._robots: Dict[str, Optional[RobotFileParser]] = {}
+        self._next_slot: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._robots_lock = threading.Lock()
+        self._robots_host_locks: Dict[str, threading.Lock] = {}
+
+    def policy(self, host: str) -> HostPolicy:
+        return self.policies.get(host.lower(), self.default)
+
+    def _robots_for(self, url: str, session: requests.Session) -> Optional[RobotFileParser]:
+        parts = urlsplit(url)
+        host = parts.netloc.lower()
+        with self._robots_lock:
+            if host in self._robots:
+                return self._robots[host]
+            host_lock = self._robots_host_locks.setdefault(host, threading.Lock())
+        with host_lock:
+            if host in self._robots:
+                return self._robots[host]
+            parser = None
+            try:
+                response = session.get(f"{parts.scheme}://{parts.netloc}/robots.txt", timeout=10)
+                if response.status_code == 200:
+                    parser = RobotFileParser()
+                    parser.parse(response.text.splitlines())
+                    parser.modified()
+            except requests.RequestException as e:
+                print(f"Could not read robots.txt of {host}: {e}")
+            with self._robots_lock:
+                self._robots[host] = parser
+            return parser
+
+    def _agent(self, session: requests.Session) -> str:
+        return self.user_agent or session.headers.get('User-Agent') or "*"
+
+    def delay_for(self, url: str, session: requests.Session) -> float:
+        host = urlsplit(url).netloc.lower()
+        policy = self.policy(host)
+        delay = policy.delay
+        if policy.respect_robots:
+            robots = self._robots_for(url, session)
+            crawl_delay = robots.crawl_delay(self._agent(session)) if robots else None
+            if crawl_delay:
+                delay = max(delay, float(crawl_delay))
+        return delay
+
+    def wait(self, url: str, session: requests.Session) -> None:
+        """Block until `url`'s host may receive another request.
+
+        Raises:
+            DisallowedByRobots: If robots.txt forbids the URL.
+        """
+        host = urlsplit(url).netloc.lower()
+        if self.policy(host).respect_robots:
+            robots = self._robots_for(url, session)
+            if robots and not robots.can_fetch(self._agent(session), url):
+                raise DisallowedByRobots(f"robots.txt disallows {url}")
+        delay = self.delay_for(url, session)
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + delay
+        if slot > now:
+            time.sleep(slot - now)
+
+def crawl_in_parallel(jobs: Dict[str, List[str]], crawl_link: Callable[[str, str], int],
+                      max_parallel: Optional[int] = None) -> Dict[str, int]:
+    """Crawl several publishers at once, the links of each publisher one after another.
+
+    Publishers live on different hosts, so running them side by side multiplies throughput
+    while the `PolitenessScheduler` keeps each host within its own budget.
+
+    Args:
+        jobs (Dict[str, List[str]]): Journal name -> listing links.
+        crawl_link (Callable[[str, str], int]): Called as `crawl_link(journal_name, link)`;
+            returns the number of PDFs downloaded.
+        max_parallel (Optional[int]): Publishers crawled at the same time (default: all).
+
+    Returns:
+        Dict[str, int]: PDFs downloaded per journal.
+    """
+    def crawl_publisher(journal_name: str) -> int:
+        total = 0
+        for link in jobs[journal_name]:
+            print(f"Scraping {link}")
+            try:
+                total += crawl_link(journal_name, link)
+                print(f"Completed scraping for {link}")
+            except Exception as e:
+                print(f"Error occurred while scraping {link}: {e}")
+                traceback.print_exc()
+        return total
+
+    if not jobs:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_parallel or len(jobs)) as executor:
+        futures = {journal_name: executor.submit(crawl_publisher, journal_name) for journal_name in jobs}
+        return {journal_name: future.result() for journal_name, future in futures.items()}
@@ -0,0 +1,146 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+# lxml is several times faster than the pure-Python html.parser backend.
+PARSER: str = "lxml"
+
+@dataclass(frozen=True)
+class ScraperSpec:
+    """Declarative description of how to crawl one publisher.
+
+    All selectors are CSS selectors (soupsieve syntax, so `:-soup-contains()` works).
+
+    Attributes:
+        name (str): Registry key; matches the `<name>_links` entries of `publishers_links`.
+        listing_selector (str): One article entry on a listing page.
+        pdf_link_selector (str): Link inside an entry. Points at the PDF, or at the article
+            page when `article_pdf_selector` is set.
+        open_access_selector (Optional[str]): Only entries containing a match are downloaded.
+        article_pdf_selector (Optional[str]): PDF link on the article page, for publishers
+            whose listing does not link the PDF directly.
+        next_page_selector (Optional[str]): The "next page" element; None for single-page listings.
+        next_page_attr (str): Attribute of the next-page element that holds the link or page number.
+        next_page_template (Optional[str]): Builds the next URL from the attribute value, with
+            `{base}` (listing URL without query) and `{value}` placeholders. If None the
+            attribute is joined onto the page URL.
+        pdf_url_rewrite (Optional[Callable[[str], str]]): Turns the found link into the PDF URL.
+    """
+    name: str
+    listing_selector: str
+    pdf_link_selector: str
+    open_access_selector: Optional[str] = None
+    article_pdf_selector: Optional[str] = None
+    next_page_selector: Optional[str] = None
+    next_page_attr: str = 'href'
+    next_page_template: Optional[str] = None
+    pdf_url_rewrite: Optional[Callable[[str], str]] = None
+
+SCRAPERS: Dict[str, ScraperSpec] = {}
+
+def register(spec: ScraperSpec) -> ScraperSpec:
+    SCRAPERS[spec.name] = spec
+    return spec
+
+def _aiche_pdf_url(url: str) -> str:
+    return url.replace('/epdf/', '/pdfdirect/') + "?download=true"
+
+def _peerj_pdf_url(url: str) -> str:
+    return url.rstrip('/') + ".pdf"
+
+register(ScraperSpec(
+    name='springer',
+    listing_selector='.content-card',
+    pdf_link_selector='a[href]',
+    article_pdf_selector='a:has(span:-soup-contains("Download PDF"))',
+    next_page_selector='a.next_page[rel~="next"]',
+))
+register(ScraperSpec(
+    name='rsc',
+    listing_selector='div.capsule.capsule--article',
+    pdf_link_selector='a.btn.btn--primary.btn--tiny',
+    next_page_selector='a.paging__btn.paging__btn--next[aria-disabled="false"]',
+    next_page_attr='data-pageno',
+    next_page_template='{base}?page={value}',
+))
+register(ScraperSpec(
+    name='acs',
+    listing_selector='.issue-item_footer',
+    pdf_link_selector='a[title="PDF"]',
+    open_access_selector='img[alt="Open Access"]',
+    article_pdf_selector='a.navbar-download[href]',
+))
+register(ScraperSpec(
+    name='nature',
+    listing_selector='li.app-article-list-row__item',
+    pdf_link_selector='a[data-article-pdf="true"][data-test="download-pdf"]',
+    open_access_selector='span.u-color-open-access',
+    next_page_selector='a.c-pagination__link[href]',
+))
+register(ScraperSpec(
+    name='peerj',
+    listing_selector='div.main-search-item-row',
+    pdf_link_selector='a[href]',
+    pdf_url_rewrite=_peerj_pdf_url,
+))
+register(ScraperSpec(
+    name='aiche',
+    listing_selector='li.search__item',
+    pdf_link_selector='a.pdf-download[href]',
+    open_access_selector='div.open-access',
+    next_page_selector='a.pagination__next[href]',
+    pdf_url_rewrite=_aiche_pdf_url,
+))
+register(ScraperSpec(
+    name='wiley',
+    listing_selector='li.search__item',
+    pdf_link_selector='a[href]:-soup-contains("PDF")',
+    next_page_selector='a.pagination__btn--next[href]',
+))
+
+def _next_page(spec: ScraperSpec, soup: BeautifulSoup, page_url: str) -> Optional[str]:
+    if not spec.next_page_selector:
+        return None
+    element = soup.select_one(spec.next_page_selector)
+    value = element.get(spec.next_page_attr) if element else None
+    if not value:
+        return None
+    if spec.next_page_template:
+        return spec.next_page_template.format(base=page_url.split('?')[0], value=value)
+    return urljoin(page_url, value)
+
+def parse_listing(spec_name: str, html: bytes, page_url: str, parser: str = PARSER) -> Tuple[List[str], Optional[str]]:
+    """Extract article links and the next page from a listing page.
+
+    Takes the spec by name and returns only strings, so it can run in a process pool.
+
+    Returns:
+        Tuple[List[str], Optional[str]]: Absolute links (PDF URLs, or article pages for
+        two-hop specs) and the URL of the next listing page.
+    """
+    spec = SCRAPERS[spec_name]
+    soup = BeautifulSoup(html, parser)
+    links = []
+    for entry in soup.select(spec.listing_selector):
+        if spec.open_access_selector and not entry.select_one(spec.open_access_selector):
+            continue
+        link_element = entry.select_one(spec.pdf_link_selector)
+        if not (link_element and link_element.get('href')):
+            continue
+        link = urljoin(page_url, link_element['href'])
+        if spec.pdf_url_rewrite and not spec.article_pdf_selector:
+            link = spec.pdf_url_rewrite(link)
+        links.append(link)
+    return links, _next_page(spec, soup, page_url)
+
+def parse_article(spec_name: str, html: bytes, page_url: str, parser: str = PARSER) -> Optional[str]:
+    """Find the PDF URL on an article page of a two-hop spec."""
+    spec = SCRAPERS[spec_name]
+    soup = BeautifulSoup(html, parser)
+    link_element = soup.select_one(spec.article_pdf_selector)
+    if not (link_element and link_element.get('href')):
+        return None
+    link = urljoin(page_url, link_element['href'])
+    return spec.pdf_url_rewrite(link) if spec.pdf_url_rewrite else link
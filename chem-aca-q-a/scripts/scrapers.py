@@ -1,282 +1,138 @@
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
 import requests
-import re
-from typing import Tuple, Optional
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor
-from requests.exceptions import ConnectionError, HTTPError
-import time
 
+from .fetch import Fetcher, get_fetcher
+from .frontier import CrawlFrontier, ListingCrawl, StopConditions
 from .pdf_utils import download_pdf
-
-def scrape_page_articles_springer(url: str, output_folder: str, csv_path:str, journal_name: str, vpn_index: int) -> Tuple[int, int]:
-    """Scrape articles from Springer's website and download PDFs of articles using concurrent futures for parallelization."""
-
-    current_url = url
-    count = 0
-
-    while current_url:
-        response = requests.get(current_url)
-        if response.status_code != 200:
-            print(f"Failed to retrieve the webpage. Status code: {response.status_code}")
-            break
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-        article_items = soup.select('.content-card')
-
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = []
-            for article_item in article_items:
-                article_page_link = article_item.find('a')['href']
-                article_response = requests.get(article_page_link)
-                article_soup = BeautifulSoup(article_response.content, 'html.parser')
-                pdf_link_element = article_soup.find('span', text='Download PDF').find_parent('a')
-
-                if pdf_link_element:
-                    pdf_url = pdf_link_element['href']
-                    print(f"Found PDF link: {pdf_url}")
-                    futures.append(executor.submit(download_pdf, pdf_url, output_folder, csv_path, journal_name, pdf_url))
-
-            for future in futures:
-                if future.result():
-                    count += 1
-                    print(f"Downloaded {count} PDFs")
-
-        # Pagination
-        next_page_link = soup.find('a', rel='next', class_='next_page')
-        current_url = next_page_link['href'] if next_page_link and 'href' in next_page_link.attrs else None
-
-    print(f"Finished downloading. Total PDFs downloaded: {count}")
-    return None, count, vpn_index
-
-def scrape_page_articles_rsc(url: str, output_folder: str, csv_path:str, journal_name: str, vpn_index: int) -> Tuple[Optional[str], int, int]:
-    """Scrape articles from RSC's website and download PDFs of articles using concurrent futures for parallelization."""
-
-    current_url = url
-    count = 0
-
-    while current_url:
-        response = requests.get(current_url)
-        print(response)
-        exit()
-        if response.status_code != 200:
-            print(f"Failed to retrieve the webpage. Status code: {response.status_code}")
-            break
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-        article_items = soup.find_all('div', class_='capsule capsule--article')
-
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = []
-            for article_item in article_items:
-                pdf_link_element = article_item.find('a', class_='btn btn--primary btn--tiny')
-                if pdf_link_element:
-                    pdf_url = pdf_link_element['href']
-                    print(f"Found PDF link: {pdf_url}")
-                    futures.append(executor.submit(download_pdf, pdf_url, output_folder, csv_path, journal_name, pdf_url))
-
-            for future in futures:
-                if future.result():
-                    count += 1
-                    print(f"Downloaded {count} PDFs")
-
-        # Pagination
-        next_page_link = soup.find('a', class_='paging__btn paging__btn--next', attrs={'aria-disabled': 'false'})
-        if next_page_link and 'data-pageno' in next_page_link.attrs:
-            next_page_no = next_page_link['data-pageno']
-            current_url = f"{url.split('?')[0]}?page={next_page_no}"
-        else:
-            break
-
-    print(f"Finished downloading. Total PDFs downloaded: {count}")
-    return None, count, vpn_index
-    
-def scrape_page_articles_acs(url: str, output_folder: str, csv_path:str, journal_name: str, vpn_index: int) -> Tuple[int, int]:
+from .scraper_specs import ScraperSpec, parse_article, parse_listing
+
+MAX_WORKERS: int = 5
+
+def _completed(value) -> Future:
+    future = Future()
+    future.set_result(value)
+    return future
+
+def _then(future: Future, fn: Callable[[Any], Future]) -> Future:
+    """Future of the future `fn(future.result())` returns, chained by callbacks so that no thread waits."""
+    chained = Future()
+
+    def relay(done: Future) -> None:
+        try:
+            chained.set_result(done.result())
+        except BaseException as e:
+            chained.set_exception(e)
+
+    def step(done: Future) -> None:
+        try:
+            fn(done.result()).add_done_callback(relay)
+        except BaseException as e:
+            chained.set_exception(e)
+
+    future.add_done_callback(step)
+    return chained
+
+def _parse(parse_pool: Optional[Executor], fn, *args) -> Future:
+    """Run a parse function in the parse pool, or inline if there is none."""
+    if parse_pool is None:
+        return _completed(fn(*args))
+    return parse_pool.submit(fn, *args)
+
+def _submit_article(spec: ScraperSpec, link: str, output_folder: str, csv_path: str, fetcher: Fetcher,
+                    executor: Executor, parse_pool: Optional[Executor]) -> Future:
+    """Future of downloading one article (True if a PDF was saved).
+
+    For two-hop specs the article page is fetched on the I/O pool, parsed for its PDF link
+    on the parse pool and the PDF then downloaded on the I/O pool again; the steps are
+    chained, so no I/O thread sits waiting for a parse. A failed request for the article
+    page fails the article, not the listing.
     """
-    Scrape open access articles from an ACS, navigate to PDF page, and download PDFs.
+    def download(pdf_url: str) -> bool:
+        print(f"Found PDF link: {pdf_url}")
+        return download_pdf(pdf_url, output_folder, csv_path, spec.name, spec.name, article_link=link, fetcher=fetcher)
+
+    def fetch_page() -> Optional[requests.Response]:
+        try:
+            return fetcher.get(link)
+        except requests.RequestException as e:
+            print(f"Failed to retrieve {link}: {e}")
+            return None
+
+    def fetched(article_response: Optional[requests.Response]) -> Future:
+        if article_response is None:
+            return _completed(False)
+        if article_response.status_code != 200:
+            print(f"Failed to retrieve {link}. Status code: {article_response.status_code}")
+            return _completed(False)
+        return _then(_parse(parse_pool, parse_article, spec.name, article_response.content, link), resolved)
+
+    def resolved(pdf_url: Optional[str]) -> Future:
+        if not pdf_url:
+            return _completed(False)
+        return executor.submit(download, pdf_url)
+
+    if not spec.article_pdf_selector:
+        return executor.submit(download, link)
+    return _then(executor.submit(fetch_page), fetched)
+
+def scrape(spec: ScraperSpec, url: str, output_folder: str, csv_path: str, fetcher: Optional[Fetcher] = None,
+           frontier: Optional[CrawlFrontier] = None, stop: Optional[StopConditions] = None,
+           parse_pool: Optional[Executor] = None) -> int:
+    """Walk a publisher listing described by `spec` and download the PDFs of its articles.
+
+    Network I/O (article pages and PDFs) runs on a thread pool, while HTML parsing runs on
+    `parse_pool` (typically a `ProcessPoolExecutor`) so that it neither holds the GIL nor
+    waits behind downloads. Only the listing page's parse is waited for here, as it gives
+    the links and the next page.
 
     Args:
-        url (str): The URL of the webpage.
-        journal_name (str): The name of the journal for logging purposes.
-        vpn_index (int): The index of the current VPN location.
-        vpn_locations (List[str]): List of VPN locations.
+        spec (ScraperSpec): How to crawl the publisher.
+        url (str): The first listing page.
+        output_folder (str): Folder for the extracted text files.
+        csv_path (str): Articles CSV; its DOI registry deduplicates papers.
+        fetcher (Optional[Fetcher]): Pooled HTTP client; defaults to the shared one.
+        frontier (Optional[CrawlFrontier]): Skips content seen by earlier crawls.
+        stop (Optional[StopConditions]): When to stop paging.
+        parse_pool (Optional[Executor]): Where to parse HTML; inline if None.
 
     Returns:
-        Tuple[int, int]: Updated count of downloaded PDFs and updated VPN index.
+        int: The number of downloaded PDFs.
     """
-    count = 0
-
-    page = requests.get(url)
-    if page.status_code == 200:
-        soup = BeautifulSoup(page.content, 'html.parser')
-        articles = soup.select('.issue-item_footer')
-
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = []
-            for article in articles:
-                open_access_img = article.find('img', alt="Open Access")
-                if open_access_img:
-                    pdf_link_element = article.find('a', title="PDF")
-                    if pdf_link_element:
-                        pdf_page_url = url + pdf_link_element['href']
-                        pdf_page = requests.get(pdf_page_url)
-                        if pdf_page.status_code == 200:
-                            pdf_soup = BeautifulSoup(pdf_page.content, 'html.parser')
-                            download_button = pdf_soup.find('a', class_='navbar-download')
-                            if download_button and 'href' in download_button.attrs:
-                                final_pdf_url = url + download_button['href']
-                                futures.append(executor.submit(download_pdf, final_pdf_url, output_folder, csv_path, journal_name, final_pdf_url))
-
-            for future in futures:
-                if future.result():
-                    count += 1
-                    print(f"Downloaded {count} PDFs")
-
-    else:
-        print(f"Failed to retrieve the webpage. Status code: {page.status_code}")
-
-    return count, vpn_index
-    
-def scrape_page_articles_nature(url: str, output_folder: str, csv_path:str, journal_name: str, base_url: str, vpn_index: int) -> Tuple[int, int]:
-    """Scrape articles from Nature's website and download PDFs of open-access articles using concurrent futures for parallelization."""
-
+    fetcher = fetcher or get_fetcher()
+    crawl = ListingCrawl(frontier, stop, spec.name)
     current_url = url
     count = 0
 
-    while current_url:
-        response = requests.get(current_url)
-        if response.status_code != 200:
-            print(f"Failed to retrieve the webpage. Status code: {response.status_code}")
-            break
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        while current_url:
+            response = crawl.fetch_page(fetcher, current_url)
+            if response.status_code == 304:
+                current_url = crawl.page_unchanged(current_url)
+                continue
+            if response.status_code != 200:
+                print(f"Failed to retrieve the webpage. Status code: {response.status_code}")
+                break
 
-        soup = BeautifulSoup(response.content, 'html.parser')
-        article_items = soup.select('li.app-article-list-row__item')
+            links, next_url = _parse(parse_pool, parse_listing, spec.name, response.content, current_url).result()
 
-        with ThreadPoolExecutor(max_workers=5) as executor:
             futures = []
-            for article_item in article_items:
-                if article_item.find('span', class_='u-color-open-access'):
-                    pdf_link_element = article_item.find('a', {'data-article-pdf': 'true', 'data-test': 'download-pdf'})
-                    if pdf_link_element:
-                        pdf_url = url + pdf_link_element['href']
-                        print(f"Found PDF link: {pdf_url}")
-                        futures.append(executor.submit(download_pdf, pdf_url, output_folder, csv_path, journal_name, current_url))
-
-            for future in futures:
-                if future.result():
+            for link in links:
+                if crawl.should_skip(link):
+                    continue
+                futures.append((link, _submit_article(spec, link, output_folder, csv_path, fetcher, executor, parse_pool)))
+
+            for link, future in futures:
+                ok = future.result()
+                crawl.article_done(link, ok)
+                if ok:
                     count += 1
                     print(f"Downloaded {count} PDFs")
 
-        # Pagination
-        next_page_link = soup.find('a', class_='c-pagination__link')
-        current_url = url + next_page_link['href'] if next_page_link and 'href' in next_page_link.attrs else None
+            if not crawl.page_done(current_url, response, next_url, len(links)):
+                break
+            current_url = next_url
 
     print(f"Finished downloading. Total PDFs downloaded: {count}")
-    return None, count, vpn_index
-
-def scrape_page_articles_peerj(url: str, output_folder: str, csv_path: str, journal_name: str, vpn_index: int) -> Tuple[Optional[str], int, int]:
-    """Scrape open access articles from PeerJ and download PDFs.
-
-    Args:
-        url (str): The URL of the webpage to start scraping from.
-        journal_name (str): The name of the journal for logging and CSV updates.
-        vpn_index (int): The index of the current VPN location.
-        vpn_locations (List[str]): List of VPN locations.
-
-    Returns:
-        Tuple[Optional[str], int, int]: The URL of the next page (if any), updated count of downloaded PDFs, and updated VPN index.
-    """
-    count = 0
-
-    page = requests.get(url)
-    if page.status_code == 200:
-        soup = BeautifulSoup(page.content, 'html.parser')
-        articles = soup.select('div.main-search-item-row')
-
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = []
-            for article in articles:
-                article_link_element = article.find('a', href=True)
-                if article_link_element:
-                    article_url = f"{url.rsplit('/', 1)[0]}{article_link_element['href']}"
-                    futures.append(executor.submit(download_pdf, article_url, output_folder, csv_path, journal_name, url))
-
-            for future in futures:
-                result = future.result()
-                if result:
-                    count += 1
-
-        next_page_button = soup.find('button', {'aria-label': 'Next page'})
-        if next_page_button:
-            next_page_url = None
-            return next_page_url, count, vpn_index
-        else:
-            return None, count, vpn_index
-    else:
-        print(f"Failed to retrieve the webpage. Status code: {page.status_code}")
-        return None, count, vpn_index
-    
-def scrape_page_articles_aiche(url: str, output_folder: str, csv_path: str, journal_name: str, vpn_index: int) -> Tuple[Optional[str], int, int]:
-    """Scrape articles from AICHE using concurrent futures for parallel downloads."""
-    current_url = url
-    count = 0
-    while current_url:
-        response = requests.get(current_url)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.content, 'html.parser')
-            articles = soup.select('li.search__item')
-
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                futures = []
-                for article in articles:
-                    open_access = article.find('div', class_='open-access')
-                    if open_access:
-                        title_link = article.find('a', href=True)
-                        if title_link:
-                            article_url = url + title_link['href']
-                            pdf_link_element = article.find('a', class_='pdf-download', href=True)
-                            if pdf_link_element:
-                                pdf_url = url + pdf_link_element['href'].replace('/epdf/', '/pdfdirect/') + "?download=true"
-                                futures.append(executor.submit(download_pdf, pdf_url, output_folder, csv_path, journal_name, url))
-
-                for future in futures:
-                    if future.result():
-                        count += 1
-
-            # Pagination
-            next_page_link = soup.find('a', class_='pagination__next', href=True)
-            current_url = url + next_page_link['href'] if next_page_link else None
-        else:
-            print(f"Failed to retrieve the webpage. Status code: {response.status_code}")
-            break
-
-    return None, count, vpn_index
-
-def scrape_page_articles_wiley(url: str, output_folder: str, csv_path: str, journal_name: str, vpn_index: int) -> Tuple[Optional[str], int, int]:
-    """Scrape open access articles from a Wiley journal webpage and download PDFs using concurrent futures for parallelization."""
-    count = 0
-    while url:
-        page = requests.get(url)
-        if page.status_code == 200:
-            soup = BeautifulSoup(page.content, 'html.parser')
-            articles = soup.select('li.search__item')
-
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                futures = []
-                for article in articles:
-                    pdf_link_element = article.find('a', href=True, text=re.compile("PDF"))
-                    if pdf_link_element:
-                        pdf_url = "https://chemistry-europe.onlinelibrary.wiley.com" + pdf_link_element['href']
-                        futures.append(executor.submit(download_pdf, pdf_url, output_folder, csv_path, journal_name, url))
-
-                for future in futures:
-                    if future.result():
-                        count += 1
-
-            # Pagination
-            next_page_link = soup.find('a', class_='pagination__btn--next', href=True)
-            url = next_page_link['href'] if next_page_link else None
-        else:
-            print(f"Failed to retrieve the webpage. Status code: {page.status_code}")
-            break
-
-    return None, count, vpn_index
\ No newline at end of file
+    return count
@@ -0,0 +1,191 @@
+"""Paired significance tests between models on shared questions.
+
+Every test here works on a boolean correctness matrix of shape (questions, models), as
+returned by `ResultsStore.correctness_matrix`, and is vectorised so that all resamples
+(and all model pairs) come out of one matrix product:
+
+- Bootstrap: a (resamples, questions) matrix of multinomial weights times the
+  correctness matrix gives the accuracy of every model in every resample.
+- Sign-flip permutation: a (permutations, questions) matrix of random +-1 signs times
+  the correctness matrix gives every permuted statistic. The test statistic is linear,
+  so the statistic of a pair is the difference of two columns.
+- McNemar: the discordant counts of all pairs are `X.T @ ~X`.
+
+    python -m scripts.significance --task mcq --output results/pairwise_significance.csv
+"""
+import argparse
+import csv
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.stats import binom
+
+def bootstrap_counts_ci(counts: np.ndarray, resamples: int = 10000, confidence: float = 0.95,
+                        seed: int = 0) -> np.ndarray:
+    """Bootstrap confidence intervals of the category counts of every model at once.
+
+    Resampling the answers of a model with replacement is a multinomial draw over its
+    categories, so the bootstrap needs only the counts and runs as a single
+    (resamples, models, categories) draw.
+
+    Args:
+        counts (np.ndarray): Shape (models, categories).
+        resamples (int): Bootstrap resamples.
+        confidence (float): Coverage of the interval.
+        seed (int): Seed of the random generator, so results are reproducible.
+
+    Returns:
+        np.ndarray: Shape (2, models, categories), lower and upper bounds in counts.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    n = counts.sum(axis=1)
+    probabilities = counts / np.maximum(n, 1)[:, None]
+    draws = np.random.default_rng(seed).multinomial(n, probabilities, size=(resamples, len(counts)))
+    alpha = (1 - confidence) / 2
+    return np.quantile(draws, [alpha, 1 - alpha], axis=0)
+
+def bootstrap_weights(n_questions: int, resamples: int, seed: int = 0) -> np.ndarray:
+    """(resamples, questions) matrix of how often each question is drawn in each resample."""
+    rng = np.random.default_rng(seed)
+    return rng.multinomial(n_questions, np.full(n_questions, 1 / n_questions), size=resamples).astype(np.float32)
+
+def bootstrap_accuracies(correct: np.ndarray, resamples: int = 10000, seed: int = 0) -> np.ndarray:
+    """Accuracy of every model in every paired bootstrap resample.
+
+    All models share the same resampled questions, which is what makes differences paired.
+
+    Args:
+        correct (np.ndarray): Boolean correctness, shape (questions, models).
+
+    Returns:
+        np.ndarray: Shape (resamples, models).
+    """
+    n_questions = correct.shape[0]
+    return bootstrap_weights(n_questions, resamples, seed) @ correct.astype(np.float32) / n_questions
+
+def paired_bootstrap(correct_a: np.ndarray, correct_b: np.ndarray, resamples: int = 10000,
+                     confidence: float = 0.95, seed: int = 0) -> Tuple[float, float, float]:
+    """Accuracy difference of model A over model B with a paired bootstrap confidence interval.
+
+    Returns:
+        Tuple[float, float, float]: The observed difference and its lower and upper bounds.
+    """
+    accuracies = bootstrap_accuracies(np.column_stack([correct_a, correct_b]), resamples, seed)
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(accuracies[:, 0] - accuracies[:, 1], [alpha, 1 - alpha])
+    return float(np.mean(correct_a) - np.mean(correct_b)), float(low), float(high)
+
+def mcnemar_exact(only_a: np.ndarray, only_b: np.ndarray) -> np.ndarray:
+    """Two-sided exact McNemar p-values from discordant counts. Works elementwise on arrays.
+
+    Args:
+        only_a: Questions model A got right and model B got wrong.
+        only_b: Questions model B got right and model A got wrong.
+    """
+    only_a = np.asarray(only_a)
+    only_b = np.asarray(only_b)
+    p_value = 2 * binom.cdf(np.minimum(only_a, only_b), only_a + only_b, 0.5)
+    return np.minimum(1.0, p_value)
+
+def mcnemar(correct_a: np.ndarray, correct_b: np.ndarray) -> float:
+    correct_a = np.asarray(correct_a, dtype=bool)
+    correct_b = np.asarray(correct_b, dtype=bool)
+    return float(mcnemar_exact(np.sum(correct_a & ~correct_b), np.sum(~correct_a & correct_b)))
+
+def sign_flips(n_questions: int, permutations: int, seed: int = 0) -> np.ndarray:
+    """(permutations, questions) matrix of random +-1 signs."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 2, size=(permutations, n_questions), dtype=np.int8).astype(np.float32) * 2 - 1
+
+def permutation_test(correct_a: np.ndarray, correct_b: np.ndarray, permutations: int = 10000, seed: int = 0) -> float:
+    """Two-sided paired permutation test of equal accuracy.
+
+    Under the null hypothesis the two answers to a question are exchangeable, so the
+    per-question difference has a random sign.
+    """
+    difference = np.asarray(correct_a, dtype=np.float32) - np.asarray(correct_b, dtype=np.float32)
+    permuted = sign_flips(len(difference), permutations, seed) @ difference
+    extreme = np.sum(np.abs(permuted) >= abs(difference.sum()) - 1e-6)
+    return float((extreme + 1) / (permutations + 1))
+
+def pairwise_tests(correct: np.ndarray, resamples: int = 10000, permutations: int = 10000,
+                   confidence: float = 0.95, seed: int = 0) -> Dict[str, np.ndarray]:
+    """Compare every pair of models.
+
+    The bootstrap and the permutation test each cost one matrix product for all pairs.
+    Per-pair quantiles and counts are then taken one row of models at a time, which keeps
+    memory at (resamples, models).
+
+    Args:
+        correct (np.ndarray): Boolean correctness, shape (questions, models).
+
+    Returns:
+        Dict[str, np.ndarray]: (models, models) matrices, entry [i, j] comparing model i
+        with model j: `difference` (accuracy of i minus j), `ci_low`, `ci_high`,
+        `mcnemar_p` and `permutation_p`.
+    """
+    correct = np.asarray(correct, dtype=bool)
+    n_questions, n_models = correct.shape
+    as_float = correct.astype(np.float32)
+
+    accuracies = bootstrap_weights(n_questions, resamples, seed) @ as_float / n_questions
+    permuted = sign_flips(n_questions, permutations, seed + 1) @ as_float
+    observed = as_float.sum(axis=0)
+    only_row = correct.T.astype(np.int64) @ (~correct).astype(np.int64)
+
+    alpha = (1 - confidence) / 2
+    results = {
+        'difference': (observed[:, None] - observed[None, :]) / max(n_questions, 1),
+        'ci_low': np.zeros((n_models, n_models)),
+        'ci_high': np.zeros((n_models, n_models)),
+        'mcnemar_p': mcnemar_exact(only_row, only_row.T),
+        'permutation_p': np.ones((n_models, n_models)),
+    }
+    for i in range(n_models):
+        differences = accuracies[:, [i]] - accuracies
+        results['ci_low'][i], results['ci_high'][i] = np.quantile(differences, [alpha, 1 - alpha], axis=0)
+        statistic = np.abs(permuted[:, [i]] - permuted)
+        extreme = np.sum(statistic >= np.abs(observed[i] - observed)[None, :] - 1e-6, axis=0)
+        results['permutation_p'][i] = (extreme + 1) / (permutations + 1)
+    np.fill_diagonal(results['permutation_p'], 1.0)
+    return results
+
+def write_pairwise_csv(path: str, models: Sequence[str], results: Dict[str, np.ndarray]) -> None:
+    """One row per ordered model pair."""
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['model_a', 'model_b'] + list(results))
+        for i, model_a in enumerate(models):
+            for j, model_b in enumerate(models):
+                if i != j:
+                    writer.writerow([model_a, model_b] + [f"{results[key][i, j]:.6g}" for key in results])
+
+def main(argv: Optional[List[str]] = None):
+    from .results_store import DEFAULT_DB_PATH, ResultsStore
+
+    parser = argparse.ArgumentParser(description="Pairwise significance tests between benchmarked models.")
+    parser.add_argument('--db', type=str, default=DEFAULT_DB_PATH, help='Path to the SQLite results store')
+    parser.add_argument('--task', type=str, choices=['mcq', 'binary'], default='mcq')
+    parser.add_argument('--models', type=str, nargs='+', help='Models to compare (default: all of the task)')
+    parser.add_argument('--resamples', type=int, default=10000, help='Bootstrap resamples')
+    parser.add_argument('--permutations', type=int, default=10000, help='Sign-flip permutations')
+    parser.add_argument('--alpha', type=float, default=0.05, help='Significance level of the printed verdicts')
+    parser.add_argument('--output', type=str, help='CSV file for the full pairwise table')
+    args = parser.parse_args(argv)
+
+    models, questions, correct = ResultsStore(args.db).correctness_matrix(args.task, args.models)
+    print(f"Comparing {len(models)} models on {len(questions)} shared questions")
+    results = pairwise_tests(correct, args.resamples, args.permutations, confidence=1 - args.alpha)
+
+    for i, model_a in enumerate(models):
+        for j in range(i + 1, len(models)):
+            verdict = "significant" if results['mcnemar_p'][i, j] < args.alpha else "n.s."
+            print(f"{model_a} vs {models[j]}: diff {results['difference'][i, j]:+.4f} "
+                  f"[{results['ci_low'][i, j]:+.4f}, {results['ci_high'][i, j]:+.4f}] "
+                  f"McNemar p={results['mcnemar_p'][i, j]:.3g} permutation p={results['permutation_p'][i, j]:.3g} {verdict}")
+    if args.output:
+        write_pairwise_csv(args.output, models, results)
+        print(f"Saved the pairwise table to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Per-answer serving measurements for the benchmark result files.
+
+Every result row of the benchmark scripts carries the columns of `TELEMETRY_FIELDS`:
+
+- `started_at`: wall-clock time (epoch seconds) the question was asked.
+- `queue_wait`: seconds before the request was served: the LLM client's concurrency cap,
+  pacing and retries, or the model server's lock on a shared pipeline (0 for a pipeline
+  in this process).
+- `latency`: seconds from then until the answer was back.
+- `prompt_tokens`, `completion_tokens`: tokens read and generated. For a zero-shot
+  pipeline the prompt tokens are those of every (premise, hypothesis) pair it scores.
+- `cost`: API charge in USD (0 for local pipelines and cached replies).
+- `cached`: whether the reply came from the LLM reply cache (no latency to speak of).
+- `model_revision`: the model that answered: the snapshot reported by the API (e.g.
+  `gpt-4-1106-preview`) or the Hub commit of a checkpoint.
+
+    result, telemetry = timed_call(classifier, prompt, candidate_labels=choices)
+    row = {'question_id': question_id, ..., **telemetry}
+    row = {'question_id': question_id, ..., **completion_telemetry(completion)}
+
+`python -m scripts.results_store report` turns them into throughput, latency
+distributions and cost per correct answer per model.
+"""
+import time
+from typing import Any, Dict, Tuple
+
+TELEMETRY_FIELDS = ['started_at', 'queue_wait', 'latency', 'prompt_tokens', 'completion_tokens', 'cost', 'cached',
+                    'model_revision']
+
+def completion_telemetry(completion) -> Dict[str, Any]:
+    """Telemetry of an `llm.Completion`."""
+    return {
+        'started_at': completion.started_at or None,
+        'queue_wait': completion.queue_wait,
+        'latency': completion.latency,
+        'prompt_tokens': completion.prompt_tokens,
+        'completion_tokens': completion.completion_tokens,
+        'cost': completion.cost,
+        'cached': completion.cached,
+        'model_revision': completion.model,
+    }
+
+def pipeline_revision(classifier) -> str:
+    """Hub commit of a pipeline's checkpoint, or its name or path if it was not downloaded."""
+    config = classifier.model.config
+    return getattr(config, '_commit_hash', None) or config.name_or_path
+
+def _token_count(tokenizer, text, text_pair=None) -> int:
+    return len(tokenizer(text, text_pair)['input_ids'])
+
+def pipeline_tokens(classifier, args: tuple, kwargs: Dict, result) -> Tuple[int, int]:
+    """(prompt, completion) tokens of one pipeline call, counted with its tokenizer.
+
+    Pre-tokenized prompts come from the token cache, so this is cheap for them.
+    """
+    tokenizer = classifier.tokenizer
+    task = getattr(classifier, 'task', '')
+    if task == 'zero-shot-classification':
+        template = kwargs.get('hypothesis_template', "This example is {}.")
+        labels = kwargs['candidate_labels']
+        return sum(_token_count(tokenizer, args[0], template.format(label)) for label in labels), 0
+    if task == 'question-answering':
+        return _token_count(tokenizer, kwargs['question'], kwargs['context']), 0
+    if task == 'text-generation':
+        prompt_tokens = _token_count(tokenizer, args[0])
+        # The generated text starts with the prompt unless return_full_text=False
+        generated = sum(_token_count(tokenizer, output['generated_text']) for output in result)
+        if kwargs.get('return_full_text', True):
+            generated -= prompt_tokens * len(result)
+        return prompt_tokens, max(generated, 0)
+    return 0, 0
+
+def timed_call(classifier, *args, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+    """Call a `transformers` pipeline (or a `RemotePipeline`) and measure the call.
+
+    Returns:
+        Tuple[Any, Dict[str, Any]]: The pipeline's output and the call's telemetry.
+    """
+    if hasattr(classifier, 'timed_call'):
+        return classifier.timed_call(*args, **kwargs)
+    started_at = time.time()
+    start = time.perf_counter()
+    result = classifier(*args, **kwargs)
+    latency = time.perf_counter() - start
+    prompt_tokens, completion_tokens = pipeline_tokens(classifier, args, kwargs, result)
+    return result, {
+        'started_at': started_at,
+        'queue_wait': 0.0,
+        'latency': latency,
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'cost': 0.0,
+        'cached': False,
+        'model_revision': pipeline_revision(classifier),
+    }
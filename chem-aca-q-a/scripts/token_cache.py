@@ -0,0 +1,235 @@
+"""Pre-tokenized prompt cache shared by all models with the same tokenizer.
+
+Each HuggingFace pipeline tokenizes its inputs on every call. Many benchmarked
+checkpoints share a tokenizer, and every run feeds the same prompts. This module does
+the following:
+
+1. Fingerprints a tokenizer by its vocabulary, normalisation and special-token settings,
+   not by its checkpoint name.
+2. Tokenizes the full list of inputs of a benchmark once per fingerprint. Token ids
+   (and token type ids) are stored flat in memory-mapped `.npy` files under
+   `cache/tokens/<fingerprint>/<inputs hash>/` (or under `$CHEM_QA_TOKEN_CACHE`), with
+   one offset per input.
+3. Wraps the tokenizer in `CachedTokenizer`, which the pipeline calls as usual. Known
+   inputs are looked up, then padded and masked with `tokenizer.pad`. Anything else
+   (unknown text, truncation that would cut, offset mappings, etc.) falls through to
+   the real tokenizer.
+
+Attention masks are not stored: unpadded sequences are all ones, and `pad` builds the
+mask of each batch.
+
+    inputs = [(prompt, "This example is true."), (prompt, "This example is false."), ...]
+    tokenizer = cached_tokenizer(AutoTokenizer.from_pretrained(model_name), inputs)
+    classifier = pipeline(modality, model=model_name, tokenizer=tokenizer, device=device)
+"""
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .file_lock import file_lock
+
+DEFAULT_CACHE_DIR = os.environ.get('CHEM_QA_TOKEN_CACHE', os.path.join(os.path.dirname(__file__), '..', 'cache', 'tokens'))
+BATCH_SIZE = 1024
+
+TokenizerInput = Union[str, Tuple[str, str]]
+
+# Tokenizer call options the cache can serve; any other option goes to the real tokenizer
+CACHEABLE_KWARGS = {'add_special_tokens', 'padding', 'truncation', 'max_length', 'pad_to_multiple_of',
+                    'return_tensors', 'return_attention_mask', 'return_token_type_ids', 'verbose'}
+
+# init_kwargs that name files rather than describe tokenization
+_PATH_KWARGS = {'name_or_path', 'vocab_file', 'merges_file', 'tokenizer_file', 'special_tokens_map_file',
+                'tokenizer_config_file', 'model_input_names', 'cache_dir', 'use_auth_token', 'token', '_commit_hash'}
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """Hash of everything that determines a tokenizer's output, independent of the checkpoint name."""
+    digest = hashlib.sha1(type(tokenizer).__name__.encode('utf-8'))
+    backend = getattr(tokenizer, 'backend_tokenizer', None)
+    if backend is not None:
+        digest.update(backend.to_str().encode('utf-8'))
+    else:
+        digest.update(json.dumps(sorted(tokenizer.get_vocab().items())).encode('utf-8'))
+    settings = {key: str(value) for key, value in getattr(tokenizer, 'init_kwargs', {}).items() if key not in _PATH_KWARGS}
+    settings['special_tokens'] = str(tokenizer.special_tokens_map)
+    digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def _input_key(item: TokenizerInput) -> str:
+    return item if isinstance(item, str) else f"{item[0]}\x00{item[1]}"
+
+def inputs_digest(inputs: Sequence[TokenizerInput]) -> str:
+    digest = hashlib.sha1()
+    for item in inputs:
+        digest.update(_input_key(item).encode('utf-8'))
+        digest.update(b'\x01')
+    return digest.hexdigest()[:16]
+
+def _tokenize(tokenizer, inputs: Sequence[TokenizerInput], add_special_tokens: bool) -> Dict[str, List[List[int]]]:
+    """Tokenize without padding or truncation, batching runs of plain texts and of pairs."""
+    encoded: Dict[str, List[List[int]]] = {'input_ids': [], 'token_type_ids': []}
+    start = 0
+    while start < len(inputs):
+        is_text = isinstance(inputs[start], str)
+        end = start
+        while end < len(inputs) and end - start < BATCH_SIZE and isinstance(inputs[end], str) == is_text:
+            end += 1
+        batch = inputs[start:end]
+        if is_text:
+            output = tokenizer(list(batch), add_special_tokens=add_special_tokens)
+        else:
+            output = tokenizer([item[0] for item in batch], [item[1] for item in batch], add_special_tokens=add_special_tokens)
+        encoded['input_ids'].extend(output['input_ids'])
+        encoded['token_type_ids'].extend(output.get('token_type_ids') or [])
+        start = end
+    return encoded
+
+def build_segment(tokenizer, inputs: Sequence[TokenizerInput], segment_dir: str, add_special_tokens: bool = True) -> None:
+    """Tokenize `inputs` and write them to `segment_dir` (atomically, via a temporary folder).
+
+    Processes that may build the same segment concurrently hold its lock file around the
+    build, as `CachedTokenizer.segment` does.
+    """
+    encoded = _tokenize(tokenizer, inputs, add_special_tokens)
+    lengths = np.array([len(ids) for ids in encoded['input_ids']], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+    tmp_dir = f"{segment_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    np.save(os.path.join(tmp_dir, 'offsets.npy'), offsets)
+    np.save(os.path.join(tmp_dir, 'input_ids.npy'),
+            np.fromiter((token for ids in encoded['input_ids'] for token in ids), dtype=np.int32, count=int(offsets[-1])))
+    if encoded['token_type_ids']:
+        np.save(os.path.join(tmp_dir, 'token_type_ids.npy'),
+                np.fromiter((token for ids in encoded['token_type_ids'] for token in ids), dtype=np.int8, count=int(offsets[-1])))
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump({'tokenizer': type(tokenizer).__name__, 'count': len(inputs), 'tokens': int(offsets[-1]),
+                   'add_special_tokens': add_special_tokens}, f, indent=4)
+
+    if os.path.exists(segment_dir):
+        shutil.rmtree(segment_dir)
+    os.makedirs(os.path.dirname(segment_dir), exist_ok=True)
+    os.replace(tmp_dir, segment_dir)
+
+class Segment:
+    """Memory-mapped token ids of one list of inputs, tokenized one way."""
+
+    def __init__(self, segment_dir: str):
+        self.offsets = np.load(os.path.join(segment_dir, 'offsets.npy'), mmap_mode='r')
+        self.input_ids = np.load(os.path.join(segment_dir, 'input_ids.npy'), mmap_mode='r')
+        type_path = os.path.join(segment_dir, 'token_type_ids.npy')
+        self.token_type_ids = np.load(type_path, mmap_mode='r') if os.path.exists(type_path) else None
+
+    def features(self, position: int) -> Dict[str, List[int]]:
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        features = {'input_ids': self.input_ids[start:end].tolist()}
+        if self.token_type_ids is not None:
+            features['token_type_ids'] = self.token_type_ids[start:end].tolist()
+        return features
+
+class CachedTokenizer:
+    """Drop-in tokenizer for pipelines that serves known inputs from a memory-mapped cache.
+
+    Inputs tokenized with and without special tokens are separate segments, each built the
+    first time a call asks for it (pipelines differ in which one they use). Attribute access
+    is delegated to the wrapped tokenizer, so decoding, special-token ids and padding
+    settings behave as before.
+    """
+
+    def __init__(self, tokenizer, inputs: Sequence[TokenizerInput], cache_dir: str = DEFAULT_CACHE_DIR):
+        self.tokenizer = tokenizer
+        self.inputs = inputs
+        self.fingerprint = tokenizer_fingerprint(tokenizer)
+        self.root = os.path.join(cache_dir, self.fingerprint, inputs_digest(inputs))
+        self.index = {_input_key(item): i for i, item in enumerate(inputs)}
+        self._segments: Dict[bool, Segment] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def segment(self, add_special_tokens: bool = True) -> Segment:
+        segment = self._segments.get(add_special_tokens)
+        if segment is None:
+            segment_dir = os.path.join(self.root, 'special' if add_special_tokens else 'plain')
+            # Benchmark processes started together would otherwise build (and replace) the same segment
+            with file_lock(f"{segment_dir}.lock"):
+                if not os.path.exists(os.path.join(segment_dir, 'meta.json')):
+                    print(f"Tokenizing {len(self.inputs)} inputs for tokenizer {self.fingerprint}")
+                    build_segment(self.tokenizer, self.inputs, segment_dir, add_special_tokens)
+                segment = self._segments[add_special_tokens] = Segment(segment_dir)
+        return segment
+
+    def __getattr__(self, name):
+        return getattr(self.tokenizer, name)
+
+    def __len__(self) -> int:
+        return len(self.tokenizer)
+
+    def _lookup(self, text, text_pair) -> Optional[Tuple[List[int], bool]]:
+        """Cache positions of the call's inputs and whether the call was batched, or None on a miss."""
+        if isinstance(text, str):
+            keys, batched = [text if text_pair is None else f"{text}\x00{text_pair}"], False
+        elif isinstance(text, (list, tuple)) and text_pair is None:
+            if not all(isinstance(item, str) or len(item) == 2 for item in text):
+                return None
+            keys = [item if isinstance(item, str) else f"{item[0]}\x00{item[1]}" for item in text]
+            batched = True
+        elif isinstance(text, (list, tuple)) and isinstance(text_pair, (list, tuple)):
+            keys, batched = [f"{a}\x00{b}" for a, b in zip(text, text_pair)], True
+        else:
+            return None
+        positions = [self.index.get(key) for key in keys]
+        if any(position is None for position in positions):
+            return None
+        return positions, batched
+
+    def _uncached(self, text, text_pair, kwargs):
+        self.misses += 1
+        if text_pair is None:
+            return self.tokenizer(text, **kwargs)
+        return self.tokenizer(text, text_pair, **kwargs)
+
+    def __call__(self, text=None, text_pair=None, **kwargs):
+        lookup = self._lookup(text, text_pair) if set(kwargs) <= CACHEABLE_KWARGS else None
+        if lookup is None:
+            return self._uncached(text, text_pair, kwargs)
+
+        positions, batched = lookup
+        segment = self.segment(bool(kwargs.get('add_special_tokens', True)))
+        features = [segment.features(position) for position in positions]
+        truncation = kwargs.get('truncation')
+        if truncation not in (None, False, 'do_not_truncate'):
+            limit = kwargs.get('max_length') or self.tokenizer.model_max_length
+            if any(len(feature['input_ids']) > limit for feature in features):
+                return self._uncached(text, text_pair, kwargs)
+        if kwargs.get('return_token_type_ids') is False:
+            for feature in features:
+                feature.pop('token_type_ids', None)
+
+        self.hits += 1
+        return_tensors = kwargs.get('return_tensors')
+        return self.tokenizer.pad(
+            features if batched or return_tensors else features[0],
+            padding=kwargs.get('padding', False),
+            max_length=kwargs.get('max_length'),
+            pad_to_multiple_of=kwargs.get('pad_to_multiple_of'),
+            return_attention_mask=kwargs.get('return_attention_mask'),
+            return_tensors=return_tensors,
+        )
+
+def cached_tokenizer(tokenizer, inputs: Sequence[TokenizerInput], cache_dir: str = DEFAULT_CACHE_DIR) -> CachedTokenizer:
+    """Wrap `tokenizer` with the cache of `inputs`, shared with every model whose tokenizer has
+    the same fingerprint.
+
+    Args:
+        tokenizer: A HuggingFace tokenizer.
+        inputs (Sequence[TokenizerInput]): Every text, or (text, text pair), the pipeline will be
+            called with. The order must be stable between runs for the cache to be reused.
+        cache_dir (str): Root folder of the token cache.
+    """
+    cached = CachedTokenizer(tokenizer, inputs, cache_dir)
+    if os.path.exists(cached.root):
+        print(f"Reusing cached tokens of tokenizer {cached.fingerprint}")
+    return cached
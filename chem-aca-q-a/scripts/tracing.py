@@ -0,0 +1,214 @@
+"""Spans and counters around the hot paths, exported as a Chrome trace and as Prometheus text.
+
+    from .tracing import count, span, traced
+
+    @traced("convert_pdf_to_text")
+    def convert_pdf_to_text(...): ...
+
+    with span("llm_request", provider="openai", model=model):
+        ...
+    count("llm_tokens", completion.prompt_tokens, kind="prompt", model=spec)
+
+Every span updates a latency histogram per (name, attributes), so attributes should have
+few distinct values (model, provider, endpoint), never question ids. Aggregates are
+always kept. They cost a lock and a few additions per span, which is cheap enough to
+leave on. Individual spans are only recorded when a trace file is requested:
+
+    CHEM_QA_TRACE=trace.json python -m scripts.benchmark_huggingface_binary
+        # open trace.json in chrome://tracing or https://ui.perfetto.dev
+    CHEM_QA_METRICS=metrics.prom python -m scripts.benchmark_huggingface_MCQ
+        # Prometheus text at exit, e.g. for node_exporter's textfile collector
+
+The annotation app serves the same text at /metrics (per worker process).
+
+`instrument_pipeline` splits a `transformers` pipeline call into tokenize, forward and
+postprocess spans.
+"""
+import atexit
+import bisect
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+TRACE_PATH = os.environ.get('CHEM_QA_TRACE')
+METRICS_PATH = os.environ.get('CHEM_QA_METRICS')
+# Spans kept for the trace file; the oldest are dropped beyond this
+TRACE_LIMIT = 1_000_000
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Registry:
+    """Span histograms, counters and (optionally) the raw spans of this process."""
+
+    def __init__(self, record: bool = False, limit: int = TRACE_LIMIT):
+        self.record = record
+        self.events: Deque[Tuple[str, int, int, int, Dict]] = deque(maxlen=limit)
+        self.histograms: Dict[Tuple[str, Labels], List] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, start_ns: int, duration_ns: int, attributes: Dict) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in attributes.items())))
+        seconds = duration_ns / 1e9
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # Bucket counts (the last one is +Inf), count, sum
+                histogram = self.histograms[key] = [[0] * (len(BUCKETS) + 1), 0, 0.0]
+            histogram[0][bisect.bisect_left(BUCKETS, seconds)] += 1
+            histogram[1] += 1
+            histogram[2] += seconds
+            if self.record:
+                self.events.append((name, start_ns, duration_ns, threading.get_ident(), attributes))
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def reset(self) -> None:
+        with self._lock:
+            self.events.clear()
+            self.histograms.clear()
+            self.counters.clear()
+
+    def chrome_trace(self) -> Dict:
+        """The recorded spans in the Chrome trace event format (complete events, times in µs)."""
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+        return {'traceEvents': [{'name': name, 'ph': 'X', 'ts': start / 1000, 'dur': duration / 1000, 'pid': pid,
+                                 'tid': tid, 'args': attributes} for name, start, duration, tid, attributes in events],
+                'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+    def prometheus_text(self) -> str:
+        """Histograms as `chem_qa_span_seconds` and counters as `chem_qa_<name>_total`."""
+        with self._lock:
+            histograms = {key: (list(buckets), n, total) for key, (buckets, n, total) in self.histograms.items()}
+            counters = dict(self.counters)
+        lines = []
+        if histograms:
+            lines += ["# HELP chem_qa_span_seconds Duration of instrumented operations.",
+                      "# TYPE chem_qa_span_seconds histogram"]
+        for (name, labels), (buckets, n, total) in sorted(histograms.items()):
+            labels = (('span', name),) + labels
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + (float('inf'),), buckets):
+                cumulative += bucket
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"chem_qa_span_seconds_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"chem_qa_span_seconds_sum{_format_labels(labels)} {total}")
+            lines.append(f"chem_qa_span_seconds_count{_format_labels(labels)} {n}")
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE chem_qa_{name}_total counter")
+            for (counter, labels), value in sorted(counters.items()):
+                if counter == name:
+                    lines.append(f"chem_qa_{name}_total{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escape = lambda value: value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels) + '}'
+
+registry = Registry(record=bool(TRACE_PATH))
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Dict]:
+    """Time the block as one span. The yielded dict takes attributes known only inside it.
+    A block that raises also counts in `span_errors`."""
+    start = time.perf_counter_ns()
+    try:
+        yield attributes
+    except BaseException:
+        registry.count('span_errors', span=name)
+        raise
+    finally:
+        registry.observe(name, start, time.perf_counter_ns() - start, attributes)
+
+def count(name: str, value: float = 1, **labels) -> None:
+    registry.count(name, value, **labels)
+
+def traced(name: str, *label_args: str) -> Callable:
+    """Decorator: run the function in a span, labelled with the named arguments' values."""
+    def decorate(fn: Callable) -> Callable:
+        signature = inspect.signature(fn) if label_args else None
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            attributes = {}
+            if signature:
+                bound = signature.bind_partial(*args, **kwargs)
+                bound.apply_defaults()
+                attributes = {arg: bound.arguments.get(arg) for arg in label_args}
+            with span(name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def _traced_generator(name: str, generator, attributes: Dict):
+    """Time each step of a generator (chunked pipelines tokenize lazily)."""
+    while True:
+        with span(name, **attributes):
+            try:
+                item = next(generator)
+            except StopIteration:
+                return
+        yield item
+
+_traced_classes: Dict[type, type] = {}
+
+def _traced_class(cls: type) -> type:
+    """A subclass of a pipeline class whose calls are spans (`__call__` is looked up on the class)."""
+    if cls not in _traced_classes:
+        def __call__(self, *args, **kwargs):
+            with span('pipeline', **self._trace_attributes):
+                return cls.__call__(self, *args, **kwargs)
+        _traced_classes[cls] = type(cls.__name__, (cls,), {'__call__': __call__, '__module__': cls.__module__})
+    return _traced_classes[cls]
+
+def instrument_pipeline(classifier, model: str):
+    """Time the calls of a `transformers` pipeline, and their tokenize, forward and
+    postprocess steps."""
+    attributes = {'model': model, 'task': getattr(classifier, 'task', '')}
+    classifier._trace_attributes = attributes
+    classifier.__class__ = _traced_class(type(classifier))
+    for method, name in {'preprocess': 'tokenize', '_forward': 'forward', 'postprocess': 'postprocess'}.items():
+        original = getattr(classifier, method, None)
+        if original is None:
+            continue
+        if inspect.isgeneratorfunction(original):
+            def wrapper(*args, _original=original, _name=name, **kwargs):
+                return _traced_generator(_name, _original(*args, **kwargs), attributes)
+        else:
+            def wrapper(*args, _original=original, _name=name, **kwargs):
+                with span(_name, **attributes):
+                    return _original(*args, **kwargs)
+        setattr(classifier, method, wrapper)
+    return classifier
+
+def _export() -> None:
+    if TRACE_PATH:
+        registry.write_chrome_trace(TRACE_PATH)
+    if METRICS_PATH:
+        registry.write_prometheus(METRICS_PATH)
+
+atexit.register(_export)